@@ -0,0 +1,105 @@
+import glob
+import importlib
+import logging
+import os
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from database.session import Base
+
+logger = logging.getLogger(__name__)
+
+
+def import_models():
+    """Import mọi module trong models/ để các bảng có trong Base.metadata"""
+    models_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models')
+    for file in glob.glob(os.path.join(models_dir, '*.py')):
+        name = os.path.splitext(os.path.basename(file))[0]
+        if name != '__init__':
+            importlib.import_module(f'models.{name}')
+
+
+def upgrade_schema(engine: Engine):
+    """
+    Đưa các bảng đã tồn tại về đúng định nghĩa model
+
+    create_all chỉ tạo bảng mới; với bảng đã có, hàm này thêm các cột cho phép NULL
+    và các chỉ mục còn thiếu. Chỉ mục UNIQUE đã được thay bằng bản có received_time
+    trên bảng phân vùng (services.partitions) được giữ nguyên; trên bảng không phân
+    vùng, bản thay thế được đổi lại thành chỉ mục của model. Có thể chạy lại nhiều lần.
+
+    Args:
+        engine: Engine kết nối database
+    """
+    from services.partitions import is_partitioned, widened_index_name
+
+    inspector = inspect(engine)
+    # Chỉ mục UNIQUE cần đổi lại từ bản có received_time: (bảng, chỉ mục, tên bản thay thế)
+    restore = []
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        with engine.begin() as connection:
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable:
+                    logger.warning(f"Không thể tự thêm cột NOT NULL {table.name}.{column.name}")
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                logger.info(f"Thêm cột {table.name}.{column.name} {column_type}")
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type} NULL"))
+            for index in table.indexes:
+                if index.name in indexes:
+                    continue
+                widened = widened_index_name(index.name)
+                if index.unique and widened in indexes:
+                    if not is_partitioned(connection, table.name):
+                        restore.append((table, index, widened))
+                    continue
+                logger.info(f"Tạo chỉ mục {index.name}")
+                index.create(connection)
+
+    for table, index, widened in restore:
+        try:
+            with engine.begin() as connection:
+                logger.info(f"Tạo chỉ mục {index.name} thay cho {widened}")
+                index.create(connection)
+                connection.execute(text(f"DROP INDEX {widened} ON {table.name}" if engine.dialect.name == 'mysql'
+                                        else f"DROP INDEX {widened}"))
+        except IntegrityError as e:
+            logger.error(f"Không tạo được chỉ mục {index.name} (có giá trị trùng lặp), giữ {widened}: {str(e)}")
+
+
+def migrate(engine: Engine):
+    """Tạo bảng mới, nâng cấp bảng cũ và chạy các bước điền dữ liệu cho cột mới"""
+    from services.email_ingest import backfill_content_hashes
+    from services.partitions import ensure_partitions, partitioning_enabled, upgrade_archive_tables
+    from database.session import SessionLocal
+
+    import_models()
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    upgrade_archive_tables(engine)
+    if partitioning_enabled():
+        ensure_partitions(engine)
+
+    db = SessionLocal()
+    try:
+        backfill_content_hashes(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # Tạo/nâng cấp bảng: python -m database.migrations
+    from database.session import engine
+
+    logging.basicConfig(level=logging.INFO)
+    migrate(engine)
+    print("Đã tạo/nâng cấp bảng database")
@@ -12,19 +12,25 @@ DB_HOST = os.getenv("MYSQL_HOST", "")
 DB_USER = os.getenv("MYSQL_USER", "")
 DB_PASSWORD = os.getenv("MYSQL_PASSWORD", "")
 DB_NAME = os.getenv("MYSQL_DATABASE", "")
-DB_PORT = int(os.getenv("MYSQL_PORT", ""))
+DB_PORT = int(os.getenv("MYSQL_PORT", "3306"))
 
-# Tạo URL kết nối
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Tạo URL kết nối (DATABASE_URL cho phép dùng database khác, ví dụ SQLite cục bộ khi benchmark)
+SQLALCHEMY_DATABASE_URL = (
+    os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+
+# SQLite: kết nối được dùng từ các thread của threadpool
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
 
 # Tạo engine kết nối đến database
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
+    connect_args=connect_args,
     pool_pre_ping=True,
     pool_recycle=3600,
     pool_timeout=30,
     max_overflow=10,
-    echo=True  # Để debug connection
+    echo=os.getenv("DATABASE_ECHO", "True").lower() == "true"  # Để debug connection
 )
 
 # Tạo session để tương tác với database
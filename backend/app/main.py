@@ -1,6 +1,8 @@
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import emails
+from routes import emails, jobs
+from utils.concurrency import configure_threadpool
 
 # Khởi tạo ứng dụng FastAPI
 app = FastAPI(
@@ -20,6 +22,22 @@ app.add_middleware(
 
 # Đăng ký các router
 app.include_router(emails.router, prefix="/api/emails", tags=["emails"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
+
+# Chạy các tác vụ nền (phân tích hàng loạt) trong suốt vòng đời ứng dụng
+@app.on_event("startup")
+def start_job_runner():
+    jobs.job_runner.start()
+
+# Các route truy cập database là hàm đồng bộ, FastAPI chạy chúng trong threadpool
+# thay vì trên event loop; giới hạn số thread cho phù hợp với pool kết nối database
+@app.on_event("startup")
+async def configure_threadpool_size():
+    configure_threadpool(int(os.getenv("THREADPOOL_SIZE", "40")))
+
+@app.on_event("shutdown")
+def stop_job_runner():
+    jobs.job_runner.stop()
 
 # Kiểm tra endpoint
 @app.get("/")
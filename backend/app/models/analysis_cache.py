@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, DateTime, JSON
+from sqlalchemy.sql import func
+from database.session import Base
+
+class AnalysisResultCache(Base):
+    """
+    Model cho bảng analysis_result_cache lưu kết quả phân tích theo mã băm nội dung,
+    dùng làm tầng cache bền vững cho các email trùng lặp trong cùng một chiến dịch
+    """
+    __tablename__ = 'analysis_result_cache'
+
+    # Mã băm của tiêu đề, nội dung, người gửi và phiên bản quy tắc
+    cache_key = Column(String(64), primary_key=True)
+    rules_version = Column(String(64), nullable=False, index=True)
+    result = Column(JSON, nullable=False)
+
+    created_at = Column(DateTime, default=func.now(), nullable=True)
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from database.session import Base
+
+class AnalysisCheckpoint(Base):
+    """
+    Model cho bảng analysis_checkpoints lưu vị trí của lượt phân tích hàng loạt đang
+    chạy, được cập nhật cùng transaction với mỗi lô để tiếp tục sau khi bị gián đoạn
+    """
+    __tablename__ = 'analysis_checkpoints'
+
+    name = Column(String(64), primary_key=True)
+    # id lớn nhất đã xử lý (email được duyệt theo id tăng dần)
+    last_id = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON, Index
 from sqlalchemy.sql import func
 from database.session import Base
 
@@ -7,6 +7,13 @@ class Email(Base):
     Model cho bảng incoming_emails để lưu trữ thông tin email và kết quả phân tích
     """
     __tablename__ = 'incoming_emails'
+    __table_args__ = (
+        # Danh sách email lọc theo danh mục, phân trang theo (received_time, id)
+        Index('ix_incoming_emails_category_received_time_id', 'category', 'received_time', 'id'),
+        # Chống trùng lặp khi nhập: mỗi Message-ID chỉ được lưu một lần (trên bảng
+        # phân vùng, services.partitions thay bằng chỉ mục (message_id, received_time))
+        Index('ux_incoming_emails_message_id', 'message_id', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(500), nullable=False)
@@ -15,6 +22,10 @@ class Email(Base):
     to_email = Column(String(255), nullable=False)
     received_time = Column(DateTime, nullable=False, index=True)
     
+    # Định danh để chống trùng lặp: Message-ID (nếu có) và dấu vân tay nội dung
+    message_id = Column(String(255), nullable=True)
+    content_hash = Column(String(32), nullable=True, index=True)
+    
     # Thông tin phân loại
     category = Column(String(50), default='unknown', nullable=True, index=True)
     category_id = Column(Integer, default=1, nullable=True)
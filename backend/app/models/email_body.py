@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from sqlalchemy.dialects.mysql import LONGBLOB
+from database.session import Base
+
+class EmailBody(Base):
+    """
+    Model cho bảng email_bodies lưu nội dung email đã nén, tách khỏi incoming_emails
+    để các truy vấn danh sách và thống kê chỉ đọc các cột nhỏ. Khóa chính gồm
+    received_time để bảng được phân vùng theo tháng giống incoming_emails.
+    """
+    __tablename__ = 'email_bodies'
+
+    email_id = Column(Integer, primary_key=True, autoincrement=False)
+    received_time = Column(DateTime, primary_key=True)
+    # Thuật toán nén: zstd, zlib hoặc none
+    codec = Column(String(10), nullable=False)
+    size = Column(Integer, nullable=False)  # Số byte UTF-8 trước khi nén
+    data = Column(LargeBinary().with_variant(LONGBLOB(), 'mysql'), nullable=False)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, Date
+from database.session import Base
+
+class EmailDailyStat(Base):
+    """
+    Model cho bảng email_daily_stats lưu số lượng email theo ngày nhận và danh mục,
+    được cập nhật cộng dồn khi thêm email mới hoặc khi email được phân loại lại
+    """
+    __tablename__ = 'email_daily_stats'
+
+    day = Column(Date, primary_key=True)
+    category = Column(String(50), primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
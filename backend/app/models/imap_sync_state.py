@@ -0,0 +1,18 @@
+from sqlalchemy import Column, BigInteger, String, DateTime
+from sqlalchemy.sql import func
+from database.session import Base
+
+class ImapSyncState(Base):
+    """
+    Model cho bảng imap_sync_states lưu vị trí đồng bộ IMAP của từng tài khoản và
+    thư mục, để mỗi lần đồng bộ chỉ lấy các email có UID lớn hơn last_uid
+    """
+    __tablename__ = 'imap_sync_states'
+
+    account = Column(String(255), primary_key=True)
+    folder = Column(String(255), primary_key=True)
+    # UID chỉ có giá trị khi UIDVALIDITY của thư mục không đổi
+    uidvalidity = Column(BigInteger, nullable=False)
+    last_uid = Column(BigInteger, nullable=False, default=0)
+
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), nullable=True)
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, JSON, Boolean
+from sqlalchemy.sql import func
+from database.session import Base
+
+class Job(Base):
+    """
+    Model cho bảng jobs làm hàng đợi tác vụ nền (ví dụ phân tích hàng loạt),
+    lưu trạng thái và tiến độ để tiếp tục được sau khi khởi động lại
+    """
+    __tablename__ = 'jobs'
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False, index=True)
+    # queued, running, completed, failed, cancelled
+    status = Column(String(20), nullable=False, default='queued', index=True)
+    params = Column(JSON, nullable=True)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    # Tiến độ
+    total = Column(Integer, nullable=True)
+    processed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    throughput = Column(Float, nullable=True)  # Số phần tử mỗi giây trong lần chạy hiện tại
+
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    worker = Column(String(100), nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    # Metadata
+    created_at = Column(DateTime, default=func.now(), nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
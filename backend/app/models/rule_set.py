@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Boolean
+from sqlalchemy.sql import func
+from database.session import Base
+
+class RuleSetRecord(Base):
+    """
+    Model cho bảng rule_sets lưu các phiên bản bộ quy tắc phân tích email.
+    Bản ghi đang kích hoạt có id lớn nhất được các worker tải và áp dụng.
+    """
+    __tablename__ = 'rule_sets'
+
+    id = Column(Integer, primary_key=True, index=True)
+    version = Column(String(64), nullable=False, unique=True)
+    # Dict quy tắc cùng định dạng DEFAULT_RULES, khóa còn thiếu lấy giá trị mặc định
+    rules = Column(JSON, nullable=False)
+    is_active = Column(Boolean, default=True, nullable=False, index=True)
+
+    created_at = Column(DateTime, default=func.now(), nullable=True)
@@ -1,97 +1,201 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime, timedelta
+from typing import List, Optional, Tuple, Union
 
+from database.session import SessionLocal, engine
 from dependencies.deps import get_db
-from schemas.email import EmailResponse, EmailAnalyzeRequest, EmailAnalyzeResponse, EmailStatsResponse, EmailBatchAnalyzeResponse
+from schemas.email import EmailResponse, EmailSummary, EmailPageResponse, EmailAnalyzeRequest, EmailAnalyzeResponse, EmailStatsResponse, EmailBatchAnalyzeResponse, EmailBulkResponse
 from models.email import Email
+from models.analysis_cache import AnalysisResultCache
+from services.analysis_cache import DatabaseCacheTier
+from routes.jobs import job_runner
+from services import batch_analysis, email_bodies, email_ingest, email_stats, partitions
 from services.email_analyzer import EmailAnalyzer
+from utils.concurrency import run_analysis
+from utils.json_response import FastJSONResponse
+from utils.pagination import InvalidCursor, decode_cursor, encode_cursor
+from utils.response_cache import ResponseCache
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 email_analyzer = EmailAnalyzer()
 
+# Tầng cache kết quả phân tích trong database, dùng chung giữa các worker
+if os.getenv("ANALYSIS_CACHE_PERSISTENT", "False").lower() == "true":
+    email_analyzer.result_cache.persistent = DatabaseCacheTier(SessionLocal, AnalysisResultCache)
+
+# Cache response của các endpoint dashboard thường xuyên polling (/stats, danh sách email)
+response_cache = ResponseCache.from_env()
+
+# Kiểm tra nguồn quy tắc định kỳ trong thread nền và tải lại khi có phiên bản mới
+email_analyzer.start_rule_reloader(float(os.getenv("RULES_RELOAD_INTERVAL", "0")))
+
 @router.get("/stats", response_model=EmailStatsResponse)
-async def get_email_stats(db: Session = Depends(get_db)):
+def get_email_stats(
+    request: Request,
+    days: int = Query(7, ge=1, le=366, description="Số ngày của khoảng xu hướng"),
+    bucket: int = Query(1, ge=1, le=366, description="Số ngày gộp trong mỗi điểm của xu hướng"),
+    db: Session = Depends(get_db)
+):
     """
     Lấy thống kê về email trong hệ thống.
     """
-    # Tính tổng số email
-    total = db.query(Email).count()
-    
-    # Tính số lượng email theo từng loại
-    categories = {}
-    for category_name in ["safe", "suspicious", "spam", "phishing", "unknown"]:
-        count = db.query(Email).filter(Email.category == category_name).count()
-        percentage = (count / total * 100) if total > 0 else 0
-        categories[category_name] = {
-            "count": count,
-            "percentage": round(percentage, 1)
-        }
-    
-    # Lấy xu hướng gần đây (7 ngày)
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    recent_emails = db.query(Email).filter(
-        Email.received_time >= seven_days_ago
-    ).order_by(Email.received_time).all()
-    
-    # Tính số lượng email theo ngày và phân loại
-    trend_data = []
-    dates = {}
-    
-    for email in recent_emails:
-        date_str = email.received_time.strftime("%Y-%m-%d")
-        if date_str not in dates:
-            dates[date_str] = {"date": date_str, "safe": 0, "suspicious": 0, "spam": 0, "phishing": 0, "unknown": 0}
-        dates[date_str][email.category] += 1
-    
-    trend_data = list(dates.values())
-    trend_data.sort(key=lambda x: x["date"])
-    
+    return response_cache.respond(
+        request, "stats", {"days": days, "bucket": bucket},
+        lambda: EmailStatsResponse(**email_stats.get_email_stats(db, days=days, bucket_days=bucket))
+    )
+
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """
+    Lấy thống kê tỷ lệ hit và dung lượng bộ nhớ của các cache phân tích.
+    """
+    return {
+        "rules_version": email_analyzer.rules_version,
+        "analysis_results": email_analyzer.result_cache.stats(),
+        "host_verdicts": email_analyzer.host_verdict_cache.stats(),
+        "responses": response_cache.stats()
+    }
+
+@router.post("/rules/reload")
+def reload_rules():
+    """
+    Tải lại bộ quy tắc phân tích nếu nguồn quy tắc có phiên bản mới.
+    """
+    try:
+        reloaded = email_analyzer.reload_rules()
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Lỗi khi tải lại quy tắc: {str(e)}"
+        )
     return {
-        "total": total,
-        "categories": categories,
-        "recent_trend": trend_data
+        "success": True,
+        "reloaded": reloaded,
+        "rules_version": email_analyzer.rules_version
     }
 
-@router.get("/", response_model=List[EmailResponse])
-async def get_emails(
+# Các trường của danh sách email: mặc định là các cột bảng inbox hiển thị, fields= chọn
+# tập con hoặc thêm suspicious_indicators; nội dung email chỉ có ở GET /api/emails/{id}
+LIST_FIELDS = (
+    "id", "title", "from_email", "to_email", "received_time", "category", "category_id",
+    "confidence_score", "level", "created_at", "suspicious_indicators"
+)
+DEFAULT_LIST_FIELDS = LIST_FIELDS[:-1]
+
+def parse_list_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """Chuẩn hóa tham số fields (phân tách bằng dấu phẩy) theo thứ tự của LIST_FIELDS"""
+    if not fields:
+        return DEFAULT_LIST_FIELDS
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(LIST_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Trường không hợp lệ: {', '.join(sorted(unknown))}. Nội dung email lấy qua GET /api/emails/{{id}}"
+        )
+    return tuple(name for name in LIST_FIELDS if name in requested)
+
+@router.get("/", response_model=Union[List[EmailSummary], EmailPageResponse])
+def get_emails(
+    request: Request,
     category: Optional[str] = None, 
     limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Chỉ để tương thích ngược, nên dùng cursor"),
+    cursor: Optional[str] = Query(None, description="Phân trang theo cursor: để trống cho trang đầu, sau đó dùng next_cursor của trang trước"),
+    fields: Optional[str] = Query(None, description=f"Các trường cần lấy, phân tách bằng dấu phẩy: {', '.join(LIST_FIELDS)}"),
     db: Session = Depends(get_db)
 ):
     """
-    Lấy danh sách email với bộ lọc tùy chọn.
-    """
-    query = db.query(Email)
+    Lấy danh sách email (dạng rút gọn) với bộ lọc tùy chọn.
     
-    # Áp dụng filter nếu có
-    if category and category != "all":
-        query = query.filter(Email.category == category)
+    Chỉ các cột được chọn được đọc từ database và mã hóa thẳng thành JSON, không
+    tải nội dung email; dùng GET /api/emails/{id} để xem chi tiết một email.
     
-    # Sắp xếp theo thời gian nhận, mới nhất đầu tiên
-    query = query.order_by(Email.received_time.desc())
+    Khi có tham số cursor, kết quả là {items, next_cursor} và các trang được lấy theo
+    vị trí (received_time, id) nên không bị lệch khi có email mới đến; nếu không,
+    kết quả là danh sách email phân trang theo offset như trước.
+    """
+    selected = parse_list_fields(fields)
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
-    # Phân trang
-    emails = query.offset(offset).limit(limit).all()
+    def load_emails():
+        # Luôn đọc id và received_time để sắp xếp và tạo cursor
+        columns = [getattr(Email, name) for name in selected if name not in ("id", "received_time")]
+        query = db.query(Email.id, Email.received_time, *columns)
+        
+        # Áp dụng filter nếu có
+        if category and category != "all":
+            query = query.filter(Email.category == category)
+        
+        # Sắp xếp theo thời gian nhận, mới nhất đầu tiên
+        query = query.order_by(Email.received_time.desc(), Email.id.desc())
+        
+        if cursor is None:
+            # Phân trang theo offset (tương thích ngược)
+            return [{name: row._mapping[name] for name in selected}
+                    for row in query.offset(offset).limit(limit).all()]
+        
+        # Phân trang theo cursor: quét theo chỉ mục từ vị trí cuối trang trước
+        if position is not None:
+            received_time, email_id = position
+            query = query.filter(or_(
+                Email.received_time < received_time,
+                and_(Email.received_time == received_time, Email.id < email_id)
+            ))
+        rows = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].received_time, rows[-1].id)
+        return {
+            "items": [{name: row._mapping[name] for name in selected} for row in rows],
+            "next_cursor": next_cursor
+        }
     
-    return emails
+    return response_cache.respond(
+        request, "emails",
+        {"category": category, "limit": limit, "offset": offset, "cursor": cursor, "fields": ",".join(selected)},
+        load_emails
+    )
+
+@router.get("/{email_id}", response_model=EmailResponse)
+def get_email(email_id: int, db: Session = Depends(get_db)):
+    """
+    Lấy chi tiết một email, gồm nội dung và chi tiết phân tích.
+    """
+    email = db.get(Email, email_id)
+    if email is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy email")
+    response = EmailResponse.from_orm(email)
+    # Nội dung nén được đọc từ email_bodies chỉ khi xem chi tiết
+    response.content = email_bodies.load_body(db, email)
+    return response
 
 @router.post("/analyze", response_model=EmailAnalyzeResponse)
 async def analyze_email(
     request: EmailAnalyzeRequest,
-    db: Session = Depends(get_db)
+    lazy: Optional[bool] = Query(None, description="Dừng sớm khi kết quả đã chắc chắn và giới hạn phần nội dung được quét, mặc định theo ANALYSIS_LAZY_MODE")
 ):
     """
     Phân tích một email và trả về kết quả phân tích.
     """
     try:
-        # Phân tích email
-        analysis = email_analyzer.analyze_email(
+        # Phân tích email trong executor riêng để không chặn event loop
+        analysis = await run_analysis(
+            email_analyzer.analyze_email,
             title=request.title,
             content=request.content,
-            sender=request.sender
+            sender=request.sender,
+            lazy=lazy
         )
         
         return {
@@ -105,54 +209,187 @@ async def analyze_email(
             "message": f"Lỗi khi phân tích email: {str(e)}"
         }
 
-@router.post("/analyze-batch", response_model=EmailBatchAnalyzeResponse)
-async def analyze_batch(
-    limit: Optional[int] = Query(None, description="Số lượng email muốn phân tích, để trống để phân tích tất cả"),
+@router.post("/bulk", response_model=EmailBulkResponse)
+async def bulk_ingest(
+    request: Request,
+    batch_size: Optional[int] = Query(None, ge=1, le=10000, description="Số email mỗi lệnh INSERT, mặc định theo BULK_INSERT_BATCH_SIZE"),
     db: Session = Depends(get_db)
 ):
     """
-    Phân tích hàng loạt email chưa được phân loại.
+    Nhập email hàng loạt từ body dạng NDJSON (mỗi dòng một EmailCreate) hoặc mảng JSON.
+    
+    Body được đọc dần theo luồng; mỗi khi đủ batch_size bản ghi, lô đó được phân
+    tích và ghi vào database trong threadpool trong khi lô tiếp theo đang được đọc.
+    Bản ghi lỗi được báo theo vị trí trong luồng mà không làm dừng việc nhập; email
+    đã có (trùng Message-ID hoặc nội dung) được bỏ qua mà không phân tích lại.
     """
+    batch_size = batch_size or email_ingest.default_batch_size()
+    parser = email_ingest.RecordStreamParser()
+    result = email_ingest.IngestResult()
+    batch = []
+    pending = None
+    
+    async def flush(records):
+        # Chỉ một lô được ghi tại một thời điểm vì các lô dùng chung session
+        nonlocal pending
+        if pending is not None:
+            await pending
+        pending = asyncio.ensure_future(
+            run_in_threadpool(email_ingest.insert_batch, db, email_analyzer, records, result)
+        )
+    
     try:
-        # Lấy các email chưa được phân loại
-        query = db.query(Email).filter(Email.category == "unknown")
+        async for chunk in request.stream():
+            batch.extend(parser.feed(chunk))
+            while len(batch) >= batch_size:
+                await flush(batch[:batch_size])
+                batch = batch[batch_size:]
+        batch.extend(parser.close())
+        if batch:
+            await flush(batch)
+        if pending is not None:
+            await pending
+    except Exception as e:
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])
+        raise HTTPException(
+            status_code=500,
+            detail=f"Lỗi khi nhập email hàng loạt: {str(e)}"
+        )
+    finally:
+        if result.inserted:
+            response_cache.invalidate()
+    
+    return {
+        "success": result.failed == 0,
+        "received": result.received,
+        "inserted": result.inserted,
+        "failed": result.failed,
+        "unscored": result.unscored,
+        "duplicates": result.duplicates,
+        "errors": result.errors,
+        "rules_version": result.rules_version,
+        "message": f"Đã nhập {result.inserted}/{result.received} email ({result.duplicates} email trùng lặp)"
+    }
+
+def run_analyze_batch_job(params, context):
+    """
+    Tác vụ nền phân tích các email chưa phân loại, báo cáo tiến độ sau mỗi lô
+    và dừng khi tác vụ bị hủy
+    """
+    db = SessionLocal()
+    try:
+        limit = params.get("limit")
+        remaining = batch_analysis.count_pending(db)
+        if limit is not None:
+            limit = max(limit - context.processed, 0)
+            remaining = min(remaining, limit)
+        context.set_total(context.processed + remaining)
         
-        # Giới hạn số lượng nếu có
-        if limit is not None and limit > 0:
-            query = query.limit(limit)
+        reported = {"processed": 0, "failed": 0}
         
-        emails = query.all()
-        count = 0
+        def chunk_committed(result):
+            # Làm mới cache response sau mỗi lô để dashboard thấy tiến độ
+            response_cache.invalidate()
+            processed = result.processed - reported["processed"]
+            failed = result.failed - reported["failed"]
+            reported.update(processed=result.processed, failed=result.failed)
+            return context.report(processed=processed, failed=failed)
         
-        # Phân tích từng email
-        for email in emails:
-            # Phân tích email
-            analysis = email_analyzer.analyze_email(
-                title=email.title,
-                content=email.content,
-                sender=email.from_email
+        result = batch_analysis.analyze_unknown_emails(db, email_analyzer, limit=limit, on_chunk=chunk_committed)
+        return {"rules_version": result.rules_version, "finished": result.finished}
+    finally:
+        db.close()
+
+job_runner.register("analyze-batch", run_analyze_batch_job)
+
+def run_retention_job(params, context):
+    """
+    Tác vụ nền định kỳ: tạo trước phân vùng cho các tháng tới và bỏ email quá hạn
+    lưu giữ (EMAIL_RETENTION_MONTHS)
+    """
+    if partitions.partitioning_enabled():
+        partitions.ensure_partitions(engine)
+    db = SessionLocal()
+    try:
+        result = partitions.apply_retention(engine, db, months=params.get("months"), mode=params.get("mode"))
+    finally:
+        db.close()
+    if result["emails_removed"]:
+        response_cache.invalidate()
+    context.report(processed=result["emails_removed"])
+    return result
+
+job_runner.register("retention", run_retention_job)
+if partitions.retention_months() > 0 or partitions.partitioning_enabled():
+    job_runner.schedule("retention", float(os.getenv("EMAIL_RETENTION_INTERVAL", "86400")))
+
+def run_stats_reconcile_job(params, context):
+    """
+    Tác vụ nền định kỳ: đối chiếu bảng tổng hợp thống kê với incoming_emails (email
+    ghi ngoài API) và dựng lại nếu lệch
+    """
+    db = SessionLocal()
+    try:
+        rebuilt = email_stats.reconcile_rollup(db)
+    finally:
+        db.close()
+    if rebuilt:
+        response_cache.invalidate()
+    return {"rebuilt": rebuilt}
+
+job_runner.register("stats-reconcile", run_stats_reconcile_job)
+if email_stats.rollup_enabled():
+    job_runner.schedule("stats-reconcile", float(os.getenv("EMAIL_STATS_RECONCILE_INTERVAL", "3600")))
+
+def run_analysis_cache_prune_job(params, context):
+    """
+    Tác vụ nền định kỳ: xóa khỏi analysis_result_cache các kết quả của phiên bản quy
+    tắc cũ và các kết quả quá hạn (ANALYSIS_CACHE_TTL)
+    """
+    persistent = email_analyzer.result_cache.persistent
+    if persistent is None:
+        return {"removed": 0}
+    removed = persistent.prune(email_analyzer.rules_version,
+                               max_age=float(params.get("max_age", os.getenv("ANALYSIS_CACHE_TTL", "2592000"))))
+    context.report(processed=removed)
+    return {"removed": removed, "rules_version": email_analyzer.rules_version}
+
+job_runner.register("analysis-cache-prune", run_analysis_cache_prune_job)
+if email_analyzer.result_cache.persistent is not None:
+    job_runner.schedule("analysis-cache-prune", float(os.getenv("ANALYSIS_CACHE_PRUNE_INTERVAL", "86400")))
+
+@router.post("/analyze-batch", response_model=EmailBatchAnalyzeResponse)
+def analyze_batch(
+    limit: Optional[int] = Query(None, description="Số lượng email muốn phân tích, để trống để phân tích tất cả"),
+    db: Session = Depends(get_db)
+):
+    """
+    Tạo tác vụ nền phân tích hàng loạt email chưa được phân loại.
+    
+    Theo dõi tiến độ hoặc hủy tác vụ qua /api/jobs/{job_id}. Nếu đã có tác vụ phân
+    tích hàng loạt đang chờ hoặc đang chạy, tác vụ đó được trả về thay vì tạo mới.
+    """
+    try:
+        job = job_runner.active_job(db, "analyze-batch")
+        if job is not None:
+            message = f"Tác vụ phân tích hàng loạt #{job.id} đang được xử lý"
+        else:
+            job = job_runner.enqueue(
+                db, "analyze-batch", {"limit": limit if limit is not None and limit > 0 else None}
             )
-            
-            # Cập nhật kết quả vào database
-            email.category = analysis["category"]
-            email.category_id = analysis["category_id"]
-            email.confidence_score = analysis["confidence_score"]
-            email.level = analysis["level"]
-            email.suspicious_indicators = analysis["suspicious_indicators"]
-            
-            count += 1
-        
-        # Lưu các thay đổi vào database
-        db.commit()
+            message = f"Đã tạo tác vụ phân tích hàng loạt #{job.id}"
         
         return {
             "success": True,
-            "processed_count": count,
-            "message": f"Đã phân tích thành công {count} email"
+            "processed_count": job.processed,
+            "message": message,
+            "job_id": job.id,
+            "status": job.status
         }
     except Exception as e:
         db.rollback()
         raise HTTPException(
             status_code=500,
-            detail=f"Lỗi khi phân tích hàng loạt: {str(e)}"
-        ) 
\ No newline at end of file
+            detail=f"Lỗi khi tạo tác vụ phân tích hàng loạt: {str(e)}"
+        ) 
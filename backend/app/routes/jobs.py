@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from database.session import SessionLocal
+from dependencies.deps import get_db
+from schemas.job import JobResponse
+from models.job import Job
+from services.job_runner import JobRunner, job_progress
+
+router = APIRouter()
+
+# Bộ chạy tác vụ nền dùng chung, các router khác đăng ký hàm xử lý cho từng loại tác vụ
+job_runner = JobRunner.from_env(SessionLocal)
+
+@router.get("/", response_model=List[JobResponse])
+def get_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Lấy danh sách tác vụ nền gần đây.
+    """
+    query = db.query(Job)
+    if status:
+        query = query.filter(Job.status == status)
+    jobs = query.order_by(Job.id.desc()).limit(limit).all()
+    return [job_progress(job) for job in jobs]
+
+@router.get("/{job_id}", response_model=JobResponse)
+def get_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Lấy trạng thái, tiến độ, tốc độ xử lý và thời gian dự kiến còn lại của tác vụ.
+    """
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy tác vụ")
+    return job_progress(job)
+
+@router.post("/{job_id}/cancel", response_model=JobResponse)
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Hủy tác vụ: tác vụ đang chờ bị hủy ngay, tác vụ đang chạy dừng sau lô hiện tại.
+    """
+    job = job_runner.cancel(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy tác vụ")
+    return job_progress(job)
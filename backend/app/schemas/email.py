@@ -9,6 +9,7 @@ class EmailBase(BaseModel):
     from_email: str
     to_email: str
     received_time: datetime
+    message_id: Optional[str] = Field(None, max_length=255)
 
 class EmailCreate(EmailBase):
     """Schema cho việc tạo mới email"""
@@ -22,6 +23,8 @@ class EmailAnalysis(BaseModel):
     level: str
     suspicious_indicators: Optional[Dict[str, Any]] = None
     recommendation: Optional[str] = None
+    rules_version: Optional[str] = None
+    short_circuited: Optional[bool] = None
 
 class EmailResponse(EmailBase):
     """Schema cho việc trả về thông tin email"""
@@ -36,6 +39,31 @@ class EmailResponse(EmailBase):
     class Config:
         orm_mode = True
 
+class EmailSummary(BaseModel):
+    """
+    Schema rút gọn cho danh sách email (không gồm nội dung và chi tiết phân tích).
+    Khi dùng tham số fields, mỗi phần tử chỉ gồm các trường được chọn.
+    """
+    id: int
+    title: Optional[str] = None
+    from_email: Optional[str] = None
+    to_email: Optional[str] = None
+    received_time: Optional[datetime] = None
+    category: Optional[str] = None
+    category_id: Optional[int] = None
+    confidence_score: Optional[float] = None
+    level: Optional[str] = None
+    created_at: Optional[datetime] = None
+    suspicious_indicators: Optional[Dict[str, Any]] = None
+
+    class Config:
+        orm_mode = True
+
+class EmailPageResponse(BaseModel):
+    """Một trang danh sách email khi phân trang theo cursor"""
+    items: List[EmailSummary]
+    next_cursor: Optional[str] = None
+
 class EmailBatchAnalyzeRequest(BaseModel):
     """Request để phân tích nhiều email cùng lúc"""
     limit: Optional[int] = None
@@ -57,6 +85,28 @@ class EmailBatchAnalyzeResponse(BaseModel):
     success: bool
     processed_count: int
     message: str
+    rules_version: Optional[str] = None
+    failed_count: Optional[int] = None
+    finished: Optional[bool] = None
+    job_id: Optional[int] = None
+    status: Optional[str] = None
+
+class EmailBulkError(BaseModel):
+    """Lỗi của một bản ghi khi nhập hàng loạt"""
+    index: int          # Vị trí bản ghi trong luồng (bắt đầu từ 0)
+    error: str
+
+class EmailBulkResponse(BaseModel):
+    """Response cho việc nhập email hàng loạt"""
+    success: bool
+    received: int
+    inserted: int
+    failed: int
+    unscored: int = 0   # Số email đã lưu nhưng chưa phân tích được (danh mục unknown)
+    duplicates: int = 0 # Số email đã có trong hệ thống (trùng Message-ID hoặc nội dung), bị bỏ qua
+    errors: List[EmailBulkError] = []
+    rules_version: Optional[str] = None
+    message: Optional[str] = None
 
 class EmailStatsResponse(BaseModel):
     """Response cho thống kê email"""
@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from typing import Optional, Dict, Any
+from datetime import datetime
+
+class JobResponse(BaseModel):
+    """Trạng thái và tiến độ của một tác vụ nền"""
+    id: int
+    kind: str
+    status: str
+    params: Optional[Dict[str, Any]] = None
+    total: Optional[int] = None
+    processed: int
+    failed: int
+    progress: Optional[float] = None        # Phần trăm hoàn thành
+    throughput: Optional[float] = None      # Số phần tử mỗi giây
+    eta_seconds: Optional[float] = None     # Thời gian dự kiến còn lại
+    cancel_requested: bool = False
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import insert, or_
+
+from utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def analysis_cache_key(title: str, content: str, sender: str, rules_version: str) -> str:
+    """
+    Tạo khóa cache cho một email
+
+    Tiêu đề và nội dung được băm nguyên văn vì kết quả phân tích phụ thuộc vào chữ
+    hoa/thường của URL; người gửi được chuẩn hóa vì chỉ domain (không phân biệt
+    hoa thường) ảnh hưởng đến kết quả. Các bản sao của cùng một chiến dịch spam
+    có nội dung giống hệt nhau nên vẫn dùng chung một khóa.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    for part in (rules_version, title or '', content or '', (sender or '').strip().lower()):
+        digest.update(part.encode('utf-8', errors='surrogatepass'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class DatabaseCacheTier:
+    """
+    Tầng cache bền vững trong database (bảng analysis_result_cache), dùng chung
+    giữa các worker và giữ được qua các lần khởi động lại
+    """
+    def __init__(self, session_factory: Callable, model):
+        """
+        Args:
+            session_factory: Hàm tạo session database (SessionLocal)
+            model: Model bảng cache (models.analysis_cache.AnalysisResultCache)
+        """
+        self.session_factory = session_factory
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """Lấy các kết quả đã lưu theo danh sách khóa bằng một truy vấn"""
+        if not keys:
+            return {}
+        db = self.session_factory()
+        try:
+            rows = db.query(self.model.cache_key, self.model.result).filter(
+                self.model.cache_key.in_(list(keys))
+            ).all()
+        except Exception as e:
+            logger.warning(f"Không thể đọc cache kết quả phân tích: {str(e)}")
+            return {}
+        finally:
+            db.close()
+
+        found = {key: result for key, result in rows}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, entries: Dict[str, Dict[str, Any]], rules_version: str):
+        """Lưu nhiều kết quả, bỏ qua các khóa đã tồn tại"""
+        if not entries:
+            return
+        db = self.session_factory()
+        try:
+            db.execute(
+                insert(self.model).prefix_with('IGNORE', dialect='mysql').prefix_with('OR IGNORE', dialect='sqlite'),
+                [{'cache_key': key, 'rules_version': rules_version, 'result': result}
+                 for key, result in entries.items()]
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Không thể ghi cache kết quả phân tích: {str(e)}")
+        finally:
+            db.close()
+
+    def prune(self, rules_version: str, max_age: Optional[float] = None, chunk_size: int = 1000) -> int:
+        """
+        Xóa theo từng lô các kết quả của phiên bản quy tắc khác (không bao giờ được
+        đọc lại vì phiên bản là một phần của khóa) và các kết quả quá hạn
+
+        Args:
+            rules_version: Phiên bản quy tắc đang áp dụng, kết quả của phiên bản này được giữ
+            max_age: Số giây giữ kết quả của phiên bản hiện tại (None hoặc 0 = không giới hạn)
+            chunk_size: Số dòng xóa trong mỗi transaction
+
+        Returns:
+            Số dòng đã xóa
+        """
+        stale = self.model.rules_version != rules_version
+        if max_age:
+            stale = or_(stale, self.model.created_at < datetime.now() - timedelta(seconds=max_age))
+        removed = 0
+        db = self.session_factory()
+        try:
+            while True:
+                keys = [key for (key,) in db.query(self.model.cache_key).filter(stale).limit(chunk_size).all()]
+                if not keys:
+                    break
+                db.query(self.model).filter(self.model.cache_key.in_(keys)).delete(synchronize_session=False)
+                db.commit()
+                removed += len(keys)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss của tầng database"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class AnalysisCache:
+    """
+    Cache kết quả phân tích email hai tầng: LRU trong process và (tùy chọn) database.
+
+    Tầng trong process lưu kết quả dạng JSON đã mã hóa: dung lượng bộ nhớ được đo
+    chính xác và mỗi lần đọc trả về một dict mới, không chia sẻ với lần gọi khác.
+    """
+    def __init__(self, maxsize: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 persistent: Optional[DatabaseCacheTier] = None):
+        self.memory = LRUCache(maxsize, max_bytes=max_bytes, sizeof=len)
+        self.persistent = persistent
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Tra cứu nhiều khóa, tầng database chỉ được hỏi cho các khóa không có trong bộ nhớ
+
+        Returns:
+            Danh sách kết quả theo thứ tự khóa, None với khóa chưa có trong cache
+        """
+        results: List[Optional[Dict[str, Any]]] = []
+        missing = []
+        for key in keys:
+            encoded = self.memory.get(key)
+            if encoded is None:
+                results.append(None)
+                missing.append(key)
+            else:
+                results.append(json.loads(encoded))
+
+        if missing and self.persistent is not None:
+            found = self.persistent.get_many(list(dict.fromkeys(missing)))
+            encoded_found = {key: json.dumps(result).encode('utf-8') for key, result in found.items()}
+            for key, encoded in encoded_found.items():
+                self.memory.set(key, encoded)
+            for index, key in enumerate(keys):
+                if results[index] is None and key in encoded_found:
+                    results[index] = json.loads(encoded_found[key])
+        return results
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Tra cứu một khóa"""
+        return self.get_many([key])[0]
+
+    def set_many(self, entries: Dict[str, Dict[str, Any]], rules_version: str):
+        """Lưu kết quả vào cả hai tầng"""
+        for key, result in entries.items():
+            self.memory.set(key, json.dumps(result).encode('utf-8'))
+        if self.persistent is not None:
+            self.persistent.set_many(entries, rules_version)
+
+    def set(self, key: str, result: Dict[str, Any], rules_version: str):
+        """Lưu một kết quả vào cả hai tầng"""
+        self.set_many({key: result}, rules_version)
+
+    def clear(self):
+        """Xóa tầng trong process (tầng database đã tách theo phiên bản quy tắc)"""
+        self.memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Tỷ lệ hit và dung lượng bộ nhớ của từng tầng"""
+        return {
+            'memory': self.memory.stats(),
+            'persistent': self.persistent.stats() if self.persistent is not None else None
+        }
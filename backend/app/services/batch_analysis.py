@@ -0,0 +1,136 @@
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from models.analysis_checkpoint import AnalysisCheckpoint
+from models.email import Email
+from services import email_bodies, email_stats
+from services.email_analyzer import EmailAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# Tên checkpoint của lượt phân tích các email chưa phân loại
+CHECKPOINT_NAME = 'analyze-batch'
+
+
+class BatchResult:
+    """Kết quả một lượt phân tích hàng loạt"""
+
+    def __init__(self, resumed_from: int):
+        self.resumed_from = resumed_from
+        self.processed = 0
+        self.failed = 0
+        self.finished = False
+        self.rules_version: Optional[str] = None
+
+
+def _analyze_rows(analyzer: EmailAnalyzer, rows, contents: Dict[int, str]) -> List[Optional[Dict[str, Any]]]:
+    """Phân tích một lô; nếu lô lỗi thì phân tích từng email để chỉ bỏ qua email lỗi"""
+    try:
+        return analyzer.analyze_many((row.title, contents[row.id], row.from_email) for row in rows)
+    except Exception as e:
+        logger.warning(f"Lỗi khi phân tích lô email, chuyển sang phân tích từng email: {str(e)}")
+
+    analyses = []
+    for row in rows:
+        try:
+            analyses.append(analyzer.analyze_email(row.title, contents[row.id], row.from_email))
+        except Exception as e:
+            logger.error(f"Lỗi khi phân tích email {row.id}: {str(e)}")
+            analyses.append(None)
+    return analyses
+
+
+def count_pending(db: Session) -> int:
+    """Số email chưa phân loại còn lại tính từ checkpoint hiện tại"""
+    checkpoint = db.get(AnalysisCheckpoint, CHECKPOINT_NAME)
+    last_id = checkpoint.last_id if checkpoint is not None else 0
+    return db.query(Email.id).filter(Email.category == "unknown", Email.id > last_id).count()
+
+
+def analyze_unknown_emails(db: Session, analyzer: EmailAnalyzer, limit: Optional[int] = None,
+                           chunk_size: Optional[int] = None,
+                           on_chunk: Optional[Callable[[BatchResult], bool]] = None) -> BatchResult:
+    """
+    Phân tích các email chưa được phân loại theo từng lô, tiếp tục từ checkpoint
+
+    Email được đọc theo id tăng dần (keyset), mỗi lần chỉ một lô và chỉ các cột cần
+    thiết, nên bộ nhớ không phụ thuộc số email tồn đọng. Kết quả của mỗi lô được ghi
+    bằng một lệnh UPDATE executemany và commit cùng checkpoint, nên khi bị gián đoạn
+    chỉ lô đang xử lý bị mất. Email lỗi được bỏ qua và thử lại ở lượt sau; checkpoint
+    bị xóa khi đã duyệt hết.
+
+    Args:
+        db: Session database
+        analyzer: EmailAnalyzer dùng để phân tích
+        limit: Số email tối đa cần phân tích trong lượt này, None để phân tích tất cả
+        chunk_size: Số email mỗi lô, mặc định theo ANALYZE_BATCH_CHUNK_SIZE
+        on_chunk: Hàm gọi sau mỗi lô đã commit; trả về False để dừng lượt phân tích
+
+    Returns:
+        BatchResult với số email đã xử lý, số email lỗi và trạng thái hoàn thành
+    """
+    chunk_size = chunk_size or int(os.getenv("ANALYZE_BATCH_CHUNK_SIZE", "500"))
+    checkpoint = db.get(AnalysisCheckpoint, CHECKPOINT_NAME)
+    last_id = checkpoint.last_id if checkpoint is not None else 0
+    previously_processed = checkpoint.processed if checkpoint is not None else 0
+    result = BatchResult(resumed_from=last_id)
+    result.rules_version = analyzer.rules_version
+
+    while limit is None or result.processed < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - result.processed)
+        rows = db.query(
+            Email.id, Email.title, Email.content, Email.from_email, Email.received_time
+        ).filter(
+            Email.category == "unknown", Email.id > last_id
+        ).order_by(Email.id).limit(size).all()
+        if not rows:
+            result.finished = True
+            break
+
+        # Nội dung nén trong email_bodies được đọc cho cả lô bằng một truy vấn
+        contents = email_bodies.load_bodies(db, ((row.id, row.received_time, row.content) for row in rows))
+        analyses = _analyze_rows(analyzer, rows, contents)
+        updates = []
+        changes = []
+        for row, analysis in zip(rows, analyses):
+            if analysis is None:
+                result.failed += 1
+                continue
+            updates.append({
+                'id': row.id,
+                'category': analysis["category"],
+                'category_id': analysis["category_id"],
+                'confidence_score': analysis["confidence_score"],
+                'level': analysis["level"],
+                'suspicious_indicators': analysis["suspicious_indicators"],
+            })
+            changes.append((row.received_time, "unknown", analysis["category"]))
+            result.rules_version = analysis.get("rules_version", result.rules_version)
+
+        last_id = rows[-1].id
+        try:
+            if updates:
+                db.execute(update(Email), updates)
+            # Cập nhật bảng thống kê theo ngày và checkpoint trong cùng transaction
+            email_stats.record_category_changes(db, changes)
+            db.merge(AnalysisCheckpoint(
+                name=CHECKPOINT_NAME, last_id=last_id,
+                processed=previously_processed + result.processed + len(updates)
+            ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        result.processed += len(updates)
+
+        if on_chunk is not None and on_chunk(result) is False:
+            break
+
+    if result.finished:
+        db.query(AnalysisCheckpoint).filter(AnalysisCheckpoint.name == CHECKPOINT_NAME).delete()
+        db.commit()
+    return result
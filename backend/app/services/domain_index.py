@@ -0,0 +1,211 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable, Iterator, List, Optional
+
+# Định dạng file chỉ mục: header (magic, số domain, số slot) + mảng slot 8 byte.
+# Mỗi slot chứa fingerprint 64-bit của một domain, 0 nghĩa là slot trống.
+_MAGIC = b'DOMIDX01'
+_HEADER = struct.Struct('<8sQQ')
+_SLOT = struct.Struct('<Q')
+
+
+def normalize_domain(value: str) -> str:
+    """
+    Chuẩn hóa host hoặc domain: bỏ userinfo, port, dấu chấm thừa, chữ thường.
+
+    Args:
+        value: Host, netloc hoặc một dòng domain trong blocklist
+
+    Returns:
+        Domain đã chuẩn hóa (có thể rỗng)
+    """
+    value = value.strip().lower()
+    if '@' in value:
+        value = value.rsplit('@', 1)[-1]
+    if value.startswith('['):
+        # Địa chỉ IPv6 dạng [::1]:443
+        return value[1:value.find(']')] if ']' in value else value[1:]
+    if ':' in value:
+        value = value.split(':', 1)[0]
+    if value.startswith('*.'):
+        value = value[2:]
+    return value.strip('.')
+
+
+def parent_domains(host: str) -> Iterator[str]:
+    """
+    Duyệt các domain cha của host theo thứ tự nhãn đảo ngược, từ TLD vào trong.
+
+    Ví dụ: "www.paypal.com" -> "com", "paypal.com", "www.paypal.com"
+    """
+    end = len(host)
+    position = host.rfind('.')
+    while position != -1:
+        yield host[position + 1:end]
+        position = host.rfind('.', 0, position)
+    if host:
+        yield host
+
+
+def _fingerprint(domain: str) -> int:
+    """Fingerprint 64-bit ổn định giữa các process (không dùng hash() của Python)"""
+    value = int.from_bytes(hashlib.blake2b(domain.encode('utf-8'), digest_size=8).digest(), 'little')
+    return value or 1
+
+
+def read_domain_list(path: str) -> Iterator[str]:
+    """
+    Đọc file danh sách domain dạng văn bản.
+
+    Hỗ trợ một domain mỗi dòng, dòng chú thích bắt đầu bằng "#" và định dạng file
+    hosts ("0.0.0.0 example.com"), là định dạng phổ biến của các feed blocklist.
+    """
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            domain = normalize_domain(line.split()[-1])
+            if domain:
+                yield domain
+
+
+class DomainFeed:
+    """
+    Bảng băm domain lưu trên đĩa, được ánh xạ bộ nhớ (mmap) khi đọc.
+
+    File chỉ chứa fingerprint nên gọn (~16 byte mỗi domain với hệ số tải 0.5).
+    Các worker cùng mở một file sẽ dùng chung các trang trong page cache của hệ
+    điều hành thay vì mỗi process giữ một bản sao danh sách hàng triệu domain.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count, self._slot_count = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            self._map.close()
+            raise ValueError(f"File chỉ mục domain không hợp lệ: {path}")
+        if _HEADER.size + self._slot_count * _SLOT.size > len(self._map):
+            self._map.close()
+            raise ValueError(f"File chỉ mục domain bị cắt cụt: {path}")
+        self._mask = self._slot_count - 1
+
+    @staticmethod
+    def build(domains: Iterable[str], path: str) -> int:
+        """
+        Tạo file chỉ mục từ danh sách domain
+
+        Args:
+            domains: Các domain cần đưa vào chỉ mục
+            path: Đường dẫn file đầu ra
+
+        Returns:
+            Số domain (không trùng lặp) đã ghi
+        """
+        fingerprints = {_fingerprint(d) for d in (normalize_domain(d) for d in domains) if d}
+
+        slot_count = 8
+        while slot_count < len(fingerprints) * 2:
+            slot_count *= 2
+        mask = slot_count - 1
+
+        slots = array('Q', bytes(slot_count * _SLOT.size))
+        for fp in fingerprints:
+            slot = fp & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = fp
+        if sys.byteorder != 'little':
+            slots.byteswap()
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, len(fingerprints), slot_count))
+            f.write(slots.tobytes())
+        # Thay thế nguyên tử để worker đang đọc file cũ không thấy file dở dang
+        os.replace(tmp_path, path)
+        return len(fingerprints)
+
+    def __contains__(self, domain: str) -> bool:
+        fp = _fingerprint(domain)
+        slot = fp & self._mask
+        while True:
+            value = _SLOT.unpack_from(self._map, _HEADER.size + slot * _SLOT.size)[0]
+            if value == fp:
+                return True
+            if value == 0:
+                return False
+            slot = (slot + 1) & self._mask
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        self._map.close()
+
+
+class DomainIndex:
+    """
+    Chỉ mục domain tra cứu theo nhãn đảo ngược.
+
+    Trả lời câu hỏi "host này hoặc một domain cha của nó có trong danh sách không"
+    với số phép tra cứu bằng số nhãn của host, không phụ thuộc kích thước danh
+    sách. Kết hợp danh sách nhỏ trong bộ nhớ với các DomainFeed lớn trên đĩa.
+    """
+
+    def __init__(self, domains: Iterable[str] = (), feeds: Iterable[DomainFeed] = ()):
+        self._domains = {d for d in (normalize_domain(d) for d in domains) if d}
+        self._feeds: List[DomainFeed] = list(feeds)
+
+    def add_feed(self, feed: DomainFeed):
+        """Thêm một feed domain lớn vào chỉ mục"""
+        self._feeds.append(feed)
+
+    def match(self, host: str) -> Optional[str]:
+        """
+        Tìm domain được liệt kê khớp với host
+
+        Args:
+            host: Host, netloc hoặc domain cần kiểm tra
+
+        Returns:
+            Domain cha (hoặc chính host) có trong danh sách, None nếu không có
+        """
+        host = normalize_domain(host)
+        for domain in parent_domains(host):
+            if domain in self._domains:
+                return domain
+            for feed in self._feeds:
+                if domain in feed:
+                    return domain
+        return None
+
+    def __contains__(self, host: str) -> bool:
+        return self.match(host) is not None
+
+    def __len__(self) -> int:
+        return len(self._domains) + sum(len(feed) for feed in self._feeds)
+
+
+def load_feeds(paths: str) -> List[DomainFeed]:
+    """
+    Mở các file chỉ mục domain từ chuỗi đường dẫn phân tách bởi dấu phẩy
+    (giá trị của biến môi trường), bỏ qua đường dẫn rỗng
+    """
+    return [DomainFeed(path.strip()) for path in paths.split(',') if path.strip()]
+
+
+if __name__ == "__main__":
+    # Biên dịch blocklist dạng văn bản thành file chỉ mục:
+    #   python -m services.domain_index blocklist.txt phishing_domains.idx
+    if len(sys.argv) != 3:
+        print("Cách dùng: python -m services.domain_index <blocklist.txt> <output.idx>")
+        sys.exit(1)
+    total = DomainFeed.build(read_domain_list(sys.argv[1]), sys.argv[2])
+    print(f"Đã ghi {total} domain vào {sys.argv[2]}")
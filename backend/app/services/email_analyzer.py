@@ -1,112 +1,331 @@
+import os
 import re
+import copy
 import json
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
 from urllib.parse import urlparse
-from typing import Dict, List, Any, Tuple, Optional
+from typing import Dict, Iterable, List, Any, Tuple, Optional, Union
+
+from services.analysis_cache import AnalysisCache, analysis_cache_key
+from services.domain_index import normalize_domain
+from services.html_extractor import HtmlContent, extract_html, looks_like_html
+from services.keyword_matcher import normalize_text
+from services.rule_set import (
+    DatabaseRuleSource, FileRuleSource, RuleSet, RuleSource, StaticRuleSource
+)
+from utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Các biểu thức chính quy được biên dịch một lần khi import module
+URL_PATTERN = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+NETLOC_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*://([^/?#]*)')
+IP_ADDRESS_PATTERN = re.compile(r'^(\d{1,3}\.){3}\d{1,3}$')
+
+# Một email đầu vào của analyze_many: tuple (title, content, sender) hoặc dict cùng khóa
+EmailInput = Union[Tuple[str, str, str], Dict[str, str]]
+
+# EmailAnalyzer riêng của mỗi process worker, tạo một lần bởi _init_worker
+_worker_analyzer = None
+
+
+def _init_worker(rules: Dict[str, Any], version: Optional[str]):
+    """Khởi tạo worker: biên dịch đúng bộ quy tắc của process cha một lần cho cả vòng đời process"""
+    global _worker_analyzer
+    _worker_analyzer = EmailAnalyzer(StaticRuleSource(rules, version))
+
+
+def _analyze_chunk(chunk: List[Tuple[str, str, str]]) -> List[Dict[str, Any]]:
+    """Phân tích một lô email trong process worker (cache kết quả do process cha quản lý)"""
+    return [_worker_analyzer._analyze_email(*item) for item in chunk]
+
+
+def _unpack_email(item: EmailInput) -> Tuple[str, str, str]:
+    if isinstance(item, dict):
+        return item.get('title', ''), item.get('content', ''), item.get('sender', '')
+    title, content, *rest = item
+    return title, content, rest[0] if rest else ''
+
+
+def rule_source_from_env() -> RuleSource:
+    """
+    Tạo nguồn quy tắc theo biến môi trường RULES_SOURCE:
+    "default" (quy tắc có sẵn), "file" (thư mục RULES_DIR) hoặc "database" (bảng rule_sets)
+    """
+    source = os.getenv("RULES_SOURCE", "default").lower()
+    if source == "file":
+        return FileRuleSource(os.getenv("RULES_DIR", "rules"))
+    if source == "database":
+        from database.session import SessionLocal
+        from models.rule_set import RuleSetRecord
+        return DatabaseRuleSource(SessionLocal, RuleSetRecord)
+    return StaticRuleSource()
 
 class EmailAnalyzer:
     """
     Service phân tích email để phát hiện phishing, spam, và các email đáng ngờ
+    
+    Quy tắc được biên dịch thành một RuleSet bất biến. Khi tải lại, RuleSet mới
+    được dựng xong rồi mới thay thế tham chiếu cũ, nên các lời gọi phân tích chỉ
+    đọc `self._rules` một lần và không bao giờ phải chờ khóa.
     """
-    def __init__(self):
+    def __init__(self, rule_source: Optional[RuleSource] = None):
+        self.rule_source = rule_source or rule_source_from_env()
+        self._source_version: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        self._reloader: Optional[threading.Thread] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_workers = 0
+        self._pool_rules: Optional[RuleSet] = None
+        # Số lời gọi analyze_many đang dùng mỗi pool: pool bị thay thế chỉ được dừng
+        # khi không còn lời gọi nào dùng
+        self._pool_lock = threading.Lock()
+        self._pool_users: Dict[ProcessPoolExecutor, int] = {}
+        
+        # Cache kết quả phân tích theo mã băm nội dung cho các email trùng lặp
+        self.result_cache = AnalysisCache(
+            maxsize=int(os.getenv("ANALYSIS_CACHE_SIZE", "10000")),
+            max_bytes=int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+        )
+        
+        # Chế độ đánh giá lười: kiểm tra theo thứ tự chi phí, dừng khi kết quả đã chắc chắn
+        # và chỉ quét phần đầu/cuối của nội dung rất dài
+        self.lazy = os.getenv("ANALYSIS_LAZY_MODE", "False").lower() == "true"
+        self.scan_budget = int(os.getenv("ANALYSIS_SCAN_BUDGET", str(256 * 1024)))
         self.load_rules()
+    
+    @property
+    def rules(self) -> RuleSet:
+        """Bộ quy tắc đang được áp dụng"""
+        return self._rules
+    
+    @property
+    def rules_version(self) -> str:
+        """Phiên bản bộ quy tắc đang được áp dụng"""
+        return self._rules.version
+    
+    @property
+    def host_verdict_cache(self) -> LRUCache:
+        """Cache kết quả kiểm tra theo host của bộ quy tắc hiện tại"""
+        return self._rules.host_verdict_cache
         
     def load_rules(self):
-        """Tải các quy tắc phân tích email"""
-        
-        # Các domain phishing phổ biến
-        self.phishing_domains = [
-            'secure-banking.com', 'account-verify.net', 'login-secure-portal.com',
-            'my-account-verify.com', 'secure-login-info.com', 'verification-account.com',
-            'paypal-secure.com', 'facebook-security.com', 'apple-id-secure.com',
-            'bank-secure-login.com', 'verify-account-now.com', 'secure-verify.xyz'
-        ]
-        
-        # Các domain hợp pháp
-        self.legitimate_domains = [
-            'google.com', 'facebook.com', 'microsoft.com', 'apple.com',
-            'amazon.com', 'paypal.com', 'netflix.com', 'gmail.com',
-            'outlook.com', 'yahoo.com', 'spotify.com', 'linkedin.com'
-        ]
-        
-        # Từ khóa spam tiếng Việt và tiếng Anh
-        self.spam_words = [
-            'free', 'miễn phí', 'urgent', 'khẩn cấp', 'lottery', 'xổ số', 'winner', 'trúng thưởng',
-            'million dollar', 'triệu đô', 'limited time', 'viagra', 'enlarge', 'cheap', 'rẻ', 
-            'discount', 'giảm giá', 'cash', 'tiền mặt', 'offer', 'ưu đãi', 'exclusive', 'độc quyền',
-            'congratulation', 'chúc mừng', 'prize', 'giải thưởng', 'win', 'chiến thắng',
-            'free money', 'tiền miễn phí', 'best offer', 'ưu đãi tốt nhất', 'best price', 'giá tốt nhất',
-            'act now', 'hành động ngay', 'limited offer', 'ưu đãi có hạn', 'only today', 'chỉ hôm nay',
-            'call now', 'gọi ngay', 'click here', 'nhấp vào đây', 'click below', 'nhấp vào bên dưới',
-            'unbelievable', 'không thể tin được', 'incredible', 'không thể tin', 'amazing', 'tuyệt vời',
-            'guarantee', 'đảm bảo', '100% free', '100% miễn phí', 'no cost', 'không tốn phí'
-        ]
-        
-        # Các cụm từ phishing phổ biến tiếng Việt và tiếng Anh
-        self.phishing_phrases = [
-            'verify your account', 'xác minh tài khoản', 
-            'confirm your password', 'xác nhận mật khẩu',
-            'update your payment', 'cập nhật thanh toán', 
-            'unusual activity', 'hoạt động bất thường',
-            'suspicious login', 'đăng nhập đáng ngờ', 
-            'account suspended', 'tài khoản bị đình chỉ',
-            'click here to verify', 'nhấp vào đây để xác minh',
-            'login to update', 'đăng nhập để cập nhật',
-            'confirm your identity', 'xác nhận danh tính của bạn',
-            'security alert', 'cảnh báo bảo mật',
-            'account will be terminated', 'tài khoản sẽ bị chấm dứt',
-            'verify now or lose access', 'xác minh ngay hoặc mất quyền truy cập',
-            'unauthorized purchase', 'giao dịch không được ủy quyền',
-            'verify billing information', 'xác minh thông tin thanh toán',
-            'update required', 'yêu cầu cập nhật',
-            'account verification required', 'yêu cầu xác minh tài khoản',
-            'your account has been limited', 'tài khoản của bạn đã bị giới hạn',
-            'payment declined', 'thanh toán bị từ chối',
-            'problem with your account', 'vấn đề với tài khoản của bạn',
-            'click to recover account', 'nhấp để khôi phục tài khoản'
-        ]
-        
-        # Từ khóa khẩn cấp
-        self.urgency_words = [
-            'urgent', 'khẩn cấp', 'immediately', 'ngay lập tức', 
-            'now', 'right now', 'ngay bây giờ', 'expiring', 'sắp hết hạn',
-            'today only', 'chỉ hôm nay', 'limited time', 'thời gian có hạn',
-            'deadline', 'hạn cuối', 'act fast', 'hành động nhanh',
-            'final notice', 'thông báo cuối cùng', 'last chance', 'cơ hội cuối',
-            'expires today', 'hết hạn hôm nay', 'don\'t delay', 'đừng trì hoãn',
-            'urgent action required', 'yêu cầu hành động khẩn cấp',
-            'time sensitive', 'nhạy cảm về thời gian',
-            'respond now', 'phản hồi ngay', 'immediate action', 'hành động ngay lập tức'
-        ]
-        
-        # TLDs đáng ngờ
-        self.suspicious_tlds = ['.xyz', '.tk', '.ml', '.ga', '.cf', '.gq', '.top', '.icu', '.work', '.info']
+        """Tải các quy tắc phân tích email từ nguồn quy tắc, biên dịch và áp dụng"""
+        with self._reload_lock:
+            source_version = self.rule_source.current_version()
+            rules, version = self.rule_source.fetch()
+            self._swap_rules(RuleSet(rules, version), source_version)
+    
+    def reload_rules(self) -> bool:
+        """
+        Tải lại quy tắc nếu nguồn đã có phiên bản mới
+        
+        Returns:
+            True nếu bộ quy tắc đã được thay thế
+        """
+        with self._reload_lock:
+            source_version = self.rule_source.current_version()
+            if source_version == self._source_version:
+                return False
+            rules, version = self.rule_source.fetch()
+            rule_set = RuleSet(rules, version)
+            self._swap_rules(rule_set, source_version)
+        logger.info(f"Đã tải bộ quy tắc phiên bản {rule_set.version}")
+        return True
+    
+    def _swap_rules(self, rule_set: RuleSet, source_version: Optional[str]):
+        """Thay thế bộ quy tắc bằng một phép gán tham chiếu duy nhất"""
+        self._rules = rule_set
+        self._source_version = source_version
+        
+        # Worker của process pool đang giữ bộ quy tắc cũ: tạo pool mới ở lần gọi sau
+        with self._pool_lock:
+            pool = self._retire_pool()
+        if pool is not None:
+            pool.shutdown(wait=False)
+    
+    def start_rule_reloader(self, interval: float):
+        """
+        Chạy thread nền kiểm tra nguồn quy tắc định kỳ và tải lại khi có phiên bản mới,
+        hoàn toàn ngoài luồng xử lý request
+        
+        Args:
+            interval: Số giây giữa hai lần kiểm tra
+        """
+        if self._reloader is not None or interval <= 0:
+            return
+        
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_rules()
+                except Exception as e:
+                    logger.error(f"Lỗi khi tải lại quy tắc: {str(e)}")
+        
+        self._reloader = threading.Thread(target=run, name="rule-reloader", daemon=True)
+        self._reloader.start()
 
-    def analyze_email(self, title: str, content: str, sender: str = '') -> Dict[str, Any]:
+    def analyze_email(self, title: str, content: str, sender: str = '',
+                      lazy: Optional[bool] = None) -> Dict[str, Any]:
         """
         Phân tích email dựa trên nội dung, tiêu đề và người gửi
         
+        Các bản sao giống hệt nhau (cùng chiến dịch spam/phishing) được trả về từ
+        cache kết quả thay vì tính lại.
+        
         Args:
             title: Tiêu đề email
             content: Nội dung email
             sender: Email người gửi
+            lazy: Dùng chế độ đánh giá lười (xem _analyze_email_lazy),
+                  mặc định theo ANALYSIS_LAZY_MODE
             
         Returns:
             Dict chứa kết quả phân tích
         """
+        if lazy is None:
+            lazy = self.lazy
+        
+        # Đọc tham chiếu bộ quy tắc một lần: tải lại quy tắc giữa chừng không ảnh hưởng lần gọi này
+        rules = self._rules
+        key = analysis_cache_key(title, content, sender,
+                                 f"{rules.fingerprint}:lazy:{self.scan_budget}" if lazy else rules.fingerprint)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        if lazy:
+            result = self._analyze_email_lazy(title, content, sender, rules)
+        else:
+            result = self._analyze_email(title, content, sender, rules)
+        self.result_cache.set(key, result, rules.version)
+        return result
+    
+    def _analyze_email(self, title: str, content: str, sender: str = '',
+                       rules: Optional[RuleSet] = None) -> Dict[str, Any]:
+        """
+        Tính kết quả phân tích email (không qua cache)
+        
+        Args:
+            title: Tiêu đề email
+            content: Nội dung email
+            sender: Email người gửi
+            rules: Bộ quy tắc áp dụng, mặc định là bộ quy tắc hiện tại
+            
+        Returns:
+            Dict chứa kết quả phân tích
+        """
+        rules = rules or self._rules
+        
+        # Email HTML: chỉ phân tích chữ hiển thị và các liên kết (kể cả href)
+        if looks_like_html(content):
+            html = extract_html(content)
+            content = html.text
+            urls = self._html_urls(html)
+        else:
+            urls = URL_PATTERN.findall(content)
         
         # Trích xuất các đặc trưng
-        url_count = len(re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', content))
-        has_urgency = any(word in (title + content).lower() for word in self.urgency_words)
-        has_suspicious_sender = self._check_suspicious_sender(sender)
+        url_count = len(urls)
+        has_suspicious_sender = self._check_suspicious_sender(sender, rules)
+        
+        # Quét từ khóa spam, phishing và khẩn cấp trong một lượt duy nhất
+        keyword_hits = rules.keyword_matcher.scan(normalize_text(title + content), normalized=True)
+        has_urgency = keyword_hits['urgency'].count > 0
         
         # Kiểm tra các dấu hiệu phishing phổ biến
-        contains_phishing_phrases = any(phrase in (title + content).lower() for phrase in self.phishing_phrases)
-        spam_word_count = sum(1 for word in self.spam_words if word in (title + content).lower())
+        contains_phishing_phrases = keyword_hits['phishing'].count > 0
+        spam_word_count = keyword_hits['spam'].count
         
         # Kiểm tra URL đáng ngờ
-        urls = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', content)
-        suspicious_urls = sum(1 for url in urls if self._is_suspicious_url(url))
+        suspicious_urls = sum(1 for url in urls if self._is_suspicious_url(url, rules))
+        
+        return self._build_result(rules, has_suspicious_sender, contains_phishing_phrases, spam_word_count,
+                                  url_count, suspicious_urls, has_urgency, short_circuited=False)
+    
+    def _analyze_email_lazy(self, title: str, content: str, sender: str,
+                            rules: RuleSet) -> Dict[str, Any]:
+        """
+        Tính kết quả phân tích email với chi phí có giới hạn
+        
+        Các kiểm tra chạy theo thứ tự chi phí tăng dần (người gửi, từ khóa, URL) và
+        dừng ngay khi danh mục và mức độ không thể thay đổi nữa. Với nội dung dài
+        hơn scan_budget ký tự, chỉ phần đầu và phần cuối (mỗi phần một nửa ngân sách)
+        được quét; email HTML chỉ được phân tích đến khi lấy đủ scan_budget ký tự
+        chữ hiển thị. Khi đó các chỉ số đáng ngờ chỉ phản ánh phần đã kiểm tra,
+        confidence_score là giá trị tối thiểu và kết quả có short_circuited = True.
         
+        Args:
+            title: Tiêu đề email
+            content: Nội dung email
+            sender: Email người gửi
+            rules: Bộ quy tắc áp dụng
+            
+        Returns:
+            Dict chứa kết quả phân tích
+        """
+        short_circuited = False
+        if looks_like_html(content):
+            # Parser dạng luồng dừng khi đã lấy đủ scan_budget ký tự chữ hiển thị
+            html = extract_html(content, max_text_chars=self.scan_budget or None)
+            content = html.text
+            urls = iter(self._html_urls(html))
+            short_circuited = html.truncated
+        else:
+            if self.scan_budget > 0 and len(content) > self.scan_budget:
+                half = self.scan_budget // 2
+                content = content[:half] + '\n' + content[-half:]
+                short_circuited = True
+            urls = (match.group() for match in URL_PATTERN.finditer(content))
+        
+        has_suspicious_sender = self._check_suspicious_sender(sender, rules)
+        
+        keyword_hits = rules.keyword_matcher.scan(normalize_text(title + content), normalized=True)
+        has_urgency = keyword_hits['urgency'].count > 0
+        contains_phishing_phrases = keyword_hits['phishing'].count > 0
+        spam_word_count = keyword_hits['spam'].count
+        
+        score = ((25 if has_suspicious_sender else 0) + (30 if contains_phishing_phrases else 0)
+                 + spam_word_count * 5 + (15 if has_urgency else 0))
+        
+        # Điểm chỉ có thể tăng: từ 75 điểm, hoặc khi có cụm từ lừa đảo kèm người gửi/URL
+        # đáng ngờ, kết quả luôn là phishing mức critical
+        url_count = 0
+        suspicious_urls = 0
+        if score >= 75 or (contains_phishing_phrases and has_suspicious_sender):
+            short_circuited = True
+        else:
+            for url in urls:
+                url_count += 1
+                if self._is_suspicious_url(url, rules):
+                    suspicious_urls += 1
+                    score += 30
+                    if score >= 75 or contains_phishing_phrases:
+                        short_circuited = short_circuited or next(urls, None) is not None
+                        break
+        
+        return self._build_result(rules, has_suspicious_sender, contains_phishing_phrases, spam_word_count,
+                                  url_count, suspicious_urls, has_urgency, short_circuited)
+    
+    def _html_urls(self, html: HtmlContent) -> List[str]:
+        """Các URL cần kiểm tra của email HTML: đích của liên kết và URL trong chữ hiển thị"""
+        return list(dict.fromkeys(chain((link.url for link in html.links), URL_PATTERN.findall(html.text))))
+    
+    def _build_result(self, rules: RuleSet, has_suspicious_sender: bool, contains_phishing_phrases: bool,
+                      spam_word_count: int, url_count: int, suspicious_urls: int, has_urgency: bool,
+                      short_circuited: bool) -> Dict[str, Any]:
+        """
+        Tính điểm, phân loại và tạo kết quả phân tích từ các đặc trưng đã trích xuất
+        
+        Returns:
+            Dict chứa kết quả phân tích
+        """
         # Sử dụng rule-based để tính điểm và phân loại
         score = 0
         
@@ -171,7 +390,7 @@ class EmailAnalyzer:
         # Tổng hợp các chỉ số đáng ngờ
         suspicious_indicators = {
             'urls_count': url_count,
-            'suspicious_urls': suspicious_urls if urls else 0,
+            'suspicious_urls': suspicious_urls,
             'urgency_indicators': has_urgency,
             'suspicious_sender': has_suspicious_sender,
             'spam_word_count': spam_word_count,
@@ -185,9 +404,144 @@ class EmailAnalyzer:
             'confidence_score': confidence_score,
             'level': level,
             'suspicious_indicators': suspicious_indicators,
-            'recommendation': self._get_recommendation(category)
+            'recommendation': self._get_recommendation(category),
+            'rules_version': rules.version,
+            'short_circuited': short_circuited
         }
     
+    def analyze_many(self, emails: Iterable[EmailInput], workers: Optional[int] = None,
+                     chunksize: int = 256) -> List[Dict[str, Any]]:
+        """
+        Phân tích nhiều email, chia lô và phân phối cho các process worker
+        
+        Mỗi worker tải quy tắc một lần và giữ cache kết quả theo host/domain suốt
+        vòng đời, nên chi phí kiểm tra URL và người gửi lặp lại được chia đều trên
+        cả lô. Cache kết quả được tra theo từng lô trước khi gửi cho worker, nên
+        email trùng lặp không bị phân tích lại. Lô nhỏ (không quá hai chunk) được
+        phân tích ngay trong process hiện tại để tránh chi phí truyền dữ liệu giữa
+        các process.
+        
+        Args:
+            emails: Các email dạng (title, content, sender) hoặc dict cùng khóa
+            workers: Số process worker, mặc định lấy từ ANALYZER_WORKERS hoặc số CPU;
+                     1 để phân tích tuần tự
+            chunksize: Số email trong mỗi lô gửi cho worker
+            
+        Returns:
+            Danh sách kết quả theo đúng thứ tự đầu vào, giống hệt analyze_email
+        """
+        if workers is None:
+            workers = int(os.getenv("ANALYZER_WORKERS", "0")) or os.cpu_count() or 1
+        
+        emails = iter(emails)
+        chunks = iter(lambda: list(islice(emails, chunksize)), [])
+        head = list(islice(chunks, 2))
+        
+        # Cả lô dùng một bộ quy tắc, kể cả khi quy tắc được tải lại giữa chừng
+        rules = self._rules
+        pool = None
+        if workers > 1 and len(head) == 2 and len(head[1]) == chunksize:
+            pool = self._acquire_pool(workers, rules)
+        
+        # Giới hạn số lô đang xử lý để không phải đọc hết đầu vào vào bộ nhớ
+        results = []
+        pending = deque()
+        try:
+            for chunk in chain(head, chunks):
+                while pending and len(pending) >= (workers * 2 if pool is not None else 1):
+                    results.extend(self._finish_chunk(rules, *pending.popleft()))
+                pending.append(self._start_chunk(rules, chunk, pool))
+            while pending:
+                results.extend(self._finish_chunk(rules, *pending.popleft()))
+        finally:
+            if pool is not None:
+                self._release_pool(pool)
+        return results
+    
+    def _start_chunk(self, rules: RuleSet, chunk: List[EmailInput], pool: Optional[ProcessPoolExecutor]):
+        """Tra cache cho một lô và bắt đầu phân tích các email chưa có kết quả"""
+        emails = [_unpack_email(item) for item in chunk]
+        keys = [analysis_cache_key(title, content, sender, rules.fingerprint)
+                for title, content, sender in emails]
+        results = self.result_cache.get_many(keys)
+        
+        # Email trùng lặp trong cùng một lô chỉ được phân tích một lần
+        todo: Dict[str, Tuple[str, str, str]] = {}
+        for key, email, result in zip(keys, emails, results):
+            if result is None and key not in todo:
+                todo[key] = email
+        
+        if pool is not None and todo:
+            analyses = pool.submit(_analyze_chunk, list(todo.values()))
+        else:
+            analyses = [self._analyze_email(*email, rules) for email in todo.values()]
+        return keys, results, list(todo), analyses
+    
+    def _finish_chunk(self, rules: RuleSet, keys: List[str], results: List[Optional[Dict[str, Any]]],
+                      todo_keys: List[str], analyses) -> List[Dict[str, Any]]:
+        """Ghép kết quả mới phân tích với kết quả từ cache và lưu lại vào cache"""
+        if not isinstance(analyses, list):
+            analyses = analyses.result()
+        fresh = dict(zip(todo_keys, analyses))
+        self.result_cache.set_many(fresh, rules.version)
+        
+        used = set()
+        for index, key in enumerate(keys):
+            if results[index] is None:
+                # Mỗi vị trí nhận một dict riêng, kể cả khi email bị trùng lặp
+                results[index] = fresh[key] if key not in used else copy.deepcopy(fresh[key])
+                used.add(key)
+        return results
+    
+    def _retire_pool(self) -> Optional[ProcessPoolExecutor]:
+        """
+        Bỏ pool hiện tại (gọi khi đang giữ _pool_lock)
+
+        Returns:
+            Pool cần dừng nếu không còn lời gọi nào dùng, None nếu pool sẽ được dừng
+            khi lời gọi cuối cùng trả lại (_release_pool)
+        """
+        pool, self._pool, self._pool_workers, self._pool_rules = self._pool, None, 0, None
+        if pool is None or self._pool_users.get(pool):
+            return None
+        self._pool_users.pop(pool, None)
+        return pool
+
+    def _acquire_pool(self, workers: int, rules: RuleSet) -> ProcessPoolExecutor:
+        """
+        Lấy process pool dùng chung, tạo mới nếu chưa có, số worker thay đổi hoặc
+        worker đang giữ bộ quy tắc khác; phải trả lại bằng _release_pool
+        """
+        retired = None
+        with self._pool_lock:
+            if self._pool is None or self._pool_workers != workers or self._pool_rules is not rules:
+                retired = self._retire_pool()
+                self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                 initargs=(rules.source_rules, rules.version))
+                self._pool_workers = workers
+                self._pool_rules = rules
+            pool = self._pool
+            self._pool_users[pool] = self._pool_users.get(pool, 0) + 1
+        if retired is not None:
+            retired.shutdown(wait=False)
+        return pool
+
+    def _release_pool(self, pool: ProcessPoolExecutor):
+        """Trả lại pool; pool đã bị thay thế được dừng khi lời gọi cuối cùng trả lại"""
+        with self._pool_lock:
+            self._pool_users[pool] -= 1
+            if self._pool_users[pool] or pool is self._pool:
+                return
+            del self._pool_users[pool]
+        pool.shutdown(wait=False)
+    
+    def close(self):
+        """Dừng process pool của analyze_many (nếu có; pool đang được dùng dừng sau lời gọi cuối)"""
+        with self._pool_lock:
+            pool = self._retire_pool()
+        if pool is not None:
+            pool.shutdown()
+    
     def verify_sender(self, sender: str) -> Dict[str, Any]:
         """
         Xác minh người gửi email có đáng tin hay không
@@ -201,10 +555,11 @@ class EmailAnalyzer:
         if not sender or '@' not in sender:
             return {'valid': False, 'reason': 'Định dạng email không hợp lệ', 'confidence_score': 50}
         
-        domain = sender.split('@')[-1]
+        rules = self._rules
+        domain = normalize_domain(sender.split('@')[-1])
         
         # Kiểm tra với các domain phishing đã biết
-        if any(phish_domain in domain for phish_domain in self.phishing_domains):
+        if rules.phishing_index.match(domain):
             return {
                 'valid': False,
                 'reason': 'Domain liên quan đến phishing',
@@ -212,7 +567,7 @@ class EmailAnalyzer:
             }
         
         # Kiểm tra với các domain hợp pháp đã biết
-        if any(legit_domain in domain for legit_domain in self.legitimate_domains):
+        if rules.legitimate_index.match(domain):
             return {
                 'valid': True,
                 'reason': 'Domain có vẻ hợp pháp',
@@ -220,7 +575,7 @@ class EmailAnalyzer:
             }
         
         # Kiểm tra TLDs đáng ngờ
-        if any(domain.endswith(tld) for tld in self.suspicious_tlds):
+        if rules.suspicious_tld_index.match(domain):
             return {
                 'valid': False,
                 'reason': 'Tên miền cấp cao nhất (TLD) đáng ngờ',
@@ -247,79 +602,112 @@ class EmailAnalyzer:
             return {'safe': False, 'reason': 'URL trống', 'confidence_score': 50}
         
         try:
-            parsed = urlparse(url)
-            domain = parsed.netloc
-            
-            # Kiểm tra TLDs đáng ngờ
-            if any(domain.endswith(tld) for tld in self.suspicious_tlds):
-                return {
-                    'safe': False,
-                    'reason': 'Tên miền cấp cao nhất đáng ngờ',
-                    'confidence_score': 80
-                }
+            rules = self._rules
+            domain = self._extract_host(url)
+            key = ('link', domain)
+            verdict = rules.host_verdict_cache.get(key)
+            if verdict is None:
+                verdict = self._check_link_host(domain, rules)
+                rules.host_verdict_cache.set(key, verdict)
+            return dict(verdict)
             
-            # Kiểm tra URL sử dụng địa chỉ IP
-            if re.match(r'^(\d{1,3}\.){3}\d{1,3}$', domain):
-                return {
-                    'safe': False,
-                    'reason': 'URL sử dụng địa chỉ IP thay vì tên miền',
-                    'confidence_score': 85
-                }
-            
-            # Kiểm tra URL rút gọn
-            shorteners = ['bit.ly', 'tinyurl.com', 'goo.gl', 't.co', 'is.gd', 'buff.ly', 'ow.ly', 'rebrand.ly', 'cutt.ly']
-            if any(shortener in domain for shortener in shorteners):
-                return {
-                    'safe': False,
-                    'reason': 'Sử dụng URL rút gọn có thể che giấu điểm đến thực sự',
-                    'confidence_score': 60
-                }
+        except Exception as e:
+            return {
+                'safe': False,
+                'reason': f'Lỗi khi phân tích URL: {str(e)}',
+                'confidence_score': 60
+            }
+    
+    def _extract_host(self, url: str) -> str:
+        """
+        Lấy host đã chuẩn hóa từ URL, tránh gọi urlparse cho các URL thông thường
+        
+        Args:
+            url: URL cần lấy host
             
-            # Kiểm tra các misspelling của các tên miền phổ biến
-            popular_domains = ['google', 'facebook', 'microsoft', 'apple', 'amazon', 'paypal', 'netflix']
-            for pop_domain in popular_domains:
-                if pop_domain in domain and pop_domain + '.com' != domain:
-                    return {
-                        'safe': False,
-                        'reason': f'Có thể là giả mạo của {pop_domain}.com',
-                        'confidence_score': 90
-                    }
+        Returns:
+            Host đã chuẩn hóa
+        """
+        match = NETLOC_PATTERN.match(url)
+        if match and '[' not in match.group(1) and ']' not in match.group(1):
+            return normalize_domain(match.group(1))
+        # URL không có scheme hoặc host IPv6: dùng urlparse để giữ nguyên cách kiểm tra
+        return normalize_domain(urlparse(url).netloc)
+    
+    def _check_link_host(self, domain: str, rules: RuleSet) -> Dict[str, Any]:
+        """
+        Kiểm tra host của một URL (phần tính toán của check_link, được cache theo host)
+        
+        Args:
+            domain: Host đã chuẩn hóa
+            rules: Bộ quy tắc áp dụng
             
-            # Kiểm tra với các domain phishing đã biết
-            if any(phish_domain in domain for phish_domain in self.phishing_domains):
+        Returns:
+            Dict chứa kết quả kiểm tra
+        """
+        # Kiểm tra TLDs đáng ngờ
+        if rules.suspicious_tld_index.match(domain):
+            return {
+                'safe': False,
+                'reason': 'Tên miền cấp cao nhất đáng ngờ',
+                'confidence_score': 80
+            }
+        
+        # Kiểm tra URL sử dụng địa chỉ IP
+        if IP_ADDRESS_PATTERN.match(domain):
+            return {
+                'safe': False,
+                'reason': 'URL sử dụng địa chỉ IP thay vì tên miền',
+                'confidence_score': 85
+            }
+        
+        # Kiểm tra URL rút gọn
+        if rules.shortener_index.match(domain):
+            return {
+                'safe': False,
+                'reason': 'Sử dụng URL rút gọn có thể che giấu điểm đến thực sự',
+                'confidence_score': 60
+            }
+        
+        # Kiểm tra các misspelling của các tên miền phổ biến
+        popular_domains = ['google', 'facebook', 'microsoft', 'apple', 'amazon', 'paypal', 'netflix']
+        for pop_domain in popular_domains:
+            if pop_domain in domain and pop_domain + '.com' != domain:
                 return {
                     'safe': False,
-                    'reason': 'Domain được biết đến là độc hại',
-                    'confidence_score': 95
-                }
-            
-            # Kiểm tra các domain hợp pháp
-            if any(legit_domain in domain for legit_domain in self.legitimate_domains):
-                return {
-                    'safe': True,
-                    'reason': 'Domain có vẻ an toàn',
-                    'confidence_score': 15
+                    'reason': f'Có thể là giả mạo của {pop_domain}.com',
+                    'confidence_score': 90
                 }
-                
+        
+        # Kiểm tra với các domain phishing đã biết
+        if rules.phishing_index.match(domain):
             return {
-                'safe': True,
-                'reason': 'URL không có dấu hiệu đáng ngờ rõ ràng nhưng cần thận trọng',
-                'confidence_score': 40
+                'safe': False,
+                'reason': 'Domain được biết đến là độc hại',
+                'confidence_score': 95
             }
-            
-        except Exception as e:
+        
+        # Kiểm tra các domain hợp pháp
+        if rules.legitimate_index.match(domain):
             return {
-                'safe': False,
-                'reason': f'Lỗi khi phân tích URL: {str(e)}',
-                'confidence_score': 60
+                'safe': True,
+                'reason': 'Domain có vẻ an toàn',
+                'confidence_score': 15
             }
+            
+        return {
+            'safe': True,
+            'reason': 'URL không có dấu hiệu đáng ngờ rõ ràng nhưng cần thận trọng',
+            'confidence_score': 40
+        }
     
-    def _check_suspicious_sender(self, sender: str) -> bool:
+    def _check_suspicious_sender(self, sender: str, rules: Optional[RuleSet] = None) -> bool:
         """
         Kiểm tra người gửi email có đáng ngờ không
         
         Args:
             sender: Email người gửi
+            rules: Bộ quy tắc áp dụng, mặc định là bộ quy tắc hiện tại
             
         Returns:
             True nếu người gửi đáng ngờ, ngược lại là False
@@ -327,97 +715,110 @@ class EmailAnalyzer:
         if not sender or '@' not in sender:
             return True
             
-        domain = sender.split('@')[-1].lower()
+        rules = rules or self._rules
+        domain = normalize_domain(sender.split('@')[-1])
+        
+        # Cùng một domain người gửi lặp lại rất nhiều trong một lô email
+        key = ('sender', domain)
+        verdict = rules.host_verdict_cache.get(key)
+        if verdict is None:
+            verdict = self._is_suspicious_sender_domain(domain, rules)
+            rules.host_verdict_cache.set(key, verdict)
+        return verdict
+    
+    def _is_suspicious_sender_domain(self, domain: str, rules: RuleSet) -> bool:
+        """
+        Kiểm tra domain người gửi có đáng ngờ không (được cache theo domain)
         
+        Args:
+            domain: Domain người gửi đã chuẩn hóa
+            rules: Bộ quy tắc áp dụng
+            
+        Returns:
+            True nếu domain đáng ngờ, ngược lại là False
+        """
         # Kiểm tra TLDs đáng ngờ
-        if any(domain.endswith(tld) for tld in self.suspicious_tlds):
+        if rules.suspicious_tld_index.match(domain):
             return True
             
         # Kiểm tra domain phishing
-        if any(phish_domain in domain for phish_domain in self.phishing_domains):
+        if rules.phishing_index.match(domain):
             return True
             
-        # Kiểm tra các misspelling và giả mạo của tên miền phổ biến
-        popular_domains = [
-            'google.com', 'gmail.com', 'outlook.com', 'yahoo.com', 
-            'microsoft.com', 'facebook.com', 'apple.com', 'amazon.com',
-            'paypal.com', 'netflix.com'
-        ]
-        
-        # Phát hiện các giả mạo như g00gle thay vì google, m1crosoft thay vì microsoft
-        for pop_domain in popular_domains:
-            base_name = pop_domain.split('.')[0]
-            # Nếu domain chứa tên miền phổ biến nhưng không chính xác là tên miền đó
-            if base_name in domain.lower() and pop_domain != domain:
-                # Kiểm tra thêm các thay thế số cho chữ (0 thay o, 1 thay i/l...)
-                if (base_name.replace('o', '0') in domain or
-                    base_name.replace('i', '1') in domain or
-                    base_name.replace('l', '1') in domain or
-                    base_name.replace('e', '3') in domain or
-                    base_name.replace('a', '4') in domain or
-                    base_name.replace('s', '5') in domain):
-                    return True
-                    
-                # Kiểm tra thêm các thêm gạch ngang hoặc ký tự đặc biệt
-                if f"-{base_name}" in domain or f"{base_name}-" in domain:
-                    return True
-                    
-                # Phát hiện misspelling nhẹ (thêm, bớt, hoặc thay thế 1-2 ký tự)
-                if len(set(base_name) - set(domain)) <= 2:
-                    return True
+        # Kiểm tra các misspelling và giả mạo của tên miền thương hiệu
+        # (g00gle thay vì google, m1crosoft thay vì microsoft, paypal-secure...)
+        if rules.lookalike_index.match(domain):
+            return True
                 
         return False
     
-    def _is_suspicious_url(self, url: str) -> bool:
+    def _is_suspicious_url(self, url: str, rules: Optional[RuleSet] = None) -> bool:
         """
         Kiểm tra URL có đáng ngờ không
         
         Args:
             url: URL cần kiểm tra
+            rules: Bộ quy tắc áp dụng, mặc định là bộ quy tắc hiện tại
             
         Returns:
             True nếu URL đáng ngờ, ngược lại là False
         """
         try:
-            parsed = urlparse(url)
-            domain = parsed.netloc
+            domain = self._extract_host(url)
+        except Exception:
+            return True  # Nếu không thể phân tích URL, coi là đáng ngờ
+        
+        rules = rules or self._rules
+        key = ('url', domain)
+        verdict = rules.host_verdict_cache.get(key)
+        if verdict is None:
+            verdict = self._is_suspicious_host(domain, rules)
+            rules.host_verdict_cache.set(key, verdict)
+        return verdict
+    
+    def _is_suspicious_host(self, domain: str, rules: RuleSet) -> bool:
+        """
+        Kiểm tra host của một URL có đáng ngờ không (được cache theo host)
+        
+        Args:
+            domain: Host đã chuẩn hóa
+            rules: Bộ quy tắc áp dụng
             
-            # Kiểm tra URL sử dụng địa chỉ IP
-            if re.match(r'^(\d{1,3}\.){3}\d{1,3}$', domain):
-                return True
-                
-            # Kiểm tra TLDs đáng ngờ
-            if any(domain.endswith(tld) for tld in self.suspicious_tlds):
-                return True
+        Returns:
+            True nếu host đáng ngờ, ngược lại là False
+        """
+        # Kiểm tra URL sử dụng địa chỉ IP
+        if IP_ADDRESS_PATTERN.match(domain):
+            return True
             
-            # Kiểm tra domain có chứa .xyz
-            if '.xyz' in domain:
-                return True
-                
-            # Kiểm tra URL rút gọn
-            shorteners = ['bit.ly', 'tinyurl.com', 'goo.gl', 't.co', 'is.gd', 'buff.ly', 'ow.ly']
-            if any(shortener in domain for shortener in shorteners):
-                return True
-                
-            # Kiểm tra domain phishing
-            if any(phish_domain in domain for phish_domain in self.phishing_domains):
-                return True
-                
-            # Kiểm tra các misspelling của tên miền phổ biến
-            popular_domains = ['google', 'facebook', 'microsoft', 'apple', 'amazon', 'paypal']
-            for pop_domain in popular_domains:
-                if pop_domain in domain and pop_domain + '.com' != domain:
-                    return True
+        # Kiểm tra TLDs đáng ngờ
+        if rules.suspicious_tld_index.match(domain):
+            return True
+        
+        # Kiểm tra domain có chứa .xyz
+        if '.xyz' in domain:
+            return True
             
-            # Kiểm tra domain có chứa 'secure', 'verify' hoặc 'account' cùng với đuôi không phổ biến
-            suspicious_words = ['secure', 'verify', 'account', 'login', 'banking']
-            if any(word in domain.lower() for word in suspicious_words) and not any(domain.endswith('.' + legit) for legit in ['com', 'org', 'net', 'edu', 'gov']):
-                return True
-                    
-            return False
+        # Kiểm tra URL rút gọn
+        if rules.shortener_index.match(domain):
+            return True
             
-        except Exception:
-            return True  # Nếu không thể phân tích URL, coi là đáng ngờ
+        # Kiểm tra domain phishing
+        if rules.phishing_index.match(domain):
+            return True
+            
+        # Kiểm tra các misspelling của tên miền phổ biến
+        popular_domains = ['google', 'facebook', 'microsoft', 'apple', 'amazon', 'paypal']
+        for pop_domain in popular_domains:
+            if pop_domain in domain and pop_domain + '.com' != domain:
+                return True
+        
+        # Kiểm tra domain có chứa 'secure', 'verify' hoặc 'account' cùng với đuôi không phổ biến
+        suspicious_words = ['secure', 'verify', 'account', 'login', 'banking']
+        if any(word in domain.lower() for word in suspicious_words) and not any(domain.endswith('.' + legit) for legit in ['com', 'org', 'net', 'edu', 'gov']):
+            return True
+                
+        return False
     
     def _get_recommendation(self, category: str) -> str:
         """
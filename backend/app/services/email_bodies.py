@@ -0,0 +1,168 @@
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import func, insert, tuple_, update
+from sqlalchemy.orm import Session
+
+from models.email import Email
+from models.email_body import EmailBody
+
+try:
+    import zstandard
+except ImportError:  # zstandard là tùy chọn, dùng zlib nếu chưa cài đặt
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Một email cần đọc nội dung: (id, thời gian nhận, nội dung lưu trong incoming_emails)
+BodyRef = Tuple[int, datetime, str]
+
+
+def body_codec() -> str:
+    """
+    Thuật toán nén nội dung email mới theo EMAIL_BODY_CODEC: zstd, zlib, none (lưu
+    nội dung trong incoming_emails như trước) hoặc auto (zstd nếu có, không thì zlib)
+    """
+    codec = os.getenv("EMAIL_BODY_CODEC", "auto").lower()
+    if codec == "auto":
+        return "zstd" if zstandard is not None else "zlib"
+    if codec == "zstd" and zstandard is None:
+        logger.warning("Chưa cài đặt zstandard, nén nội dung email bằng zlib")
+        return "zlib"
+    return codec
+
+
+def compress(text: str, codec: str) -> bytes:
+    data = text.encode('utf-8', errors='surrogatepass')
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    return data
+
+
+def decompress(data: bytes, codec: str) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Cần cài đặt zstandard để đọc nội dung email nén bằng zstd")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "zlib":
+        data = zlib.decompress(data)
+    return data.decode('utf-8', errors='surrogatepass')
+
+
+def store_bodies(db: Session, rows: Sequence[Dict], codec: Optional[str] = None):
+    """
+    Ghi nội dung của các email vừa thêm vào email_bodies (người gọi chịu trách nhiệm commit)
+
+    Args:
+        db: Session database
+        rows: Các dict có id, received_time và content
+        codec: Thuật toán nén, mặc định theo body_codec()
+    """
+    codec = codec or body_codec()
+    if not rows:
+        return
+    db.execute(insert(EmailBody.__table__), [
+        {
+            'email_id': row['id'],
+            'received_time': row['received_time'],
+            'codec': codec,
+            'size': len(row['content'].encode('utf-8', errors='surrogatepass')),
+            'data': compress(row['content'], codec),
+        }
+        for row in rows
+    ])
+
+
+def load_bodies(db: Session, refs: Iterable[BodyRef]) -> Dict[int, str]:
+    """
+    Đọc nội dung của nhiều email bằng một truy vấn
+
+    Email lưu nội dung trong incoming_emails (dữ liệu cũ hoặc EMAIL_BODY_CODEC=none)
+    dùng luôn giá trị đó; các email khác được đọc từ email_bodies theo
+    (email_id, received_time) để MySQL chỉ quét đúng phân vùng.
+
+    Returns:
+        Dict id -> nội dung email
+    """
+    bodies = {}
+    missing = []
+    for email_id, received_time, content in refs:
+        if content:
+            bodies[email_id] = content
+        else:
+            bodies[email_id] = ''
+            missing.append((email_id, received_time))
+    for start in range(0, len(missing), 500):
+        chunk = missing[start:start + 500]
+        rows = db.query(EmailBody.email_id, EmailBody.codec, EmailBody.data).filter(
+            tuple_(EmailBody.email_id, EmailBody.received_time).in_(chunk)
+        ).all()
+        for email_id, codec, data in rows:
+            bodies[email_id] = decompress(data, codec)
+    return bodies
+
+
+def load_body(db: Session, email: Email) -> str:
+    """Nội dung của một email (dùng cho trang chi tiết)"""
+    return load_bodies(db, [(email.id, email.received_time, email.content)])[email.id]
+
+
+def move_inline_bodies(db: Session, chunk_size: int = 500, codec: Optional[str] = None) -> int:
+    """
+    Chuyển nội dung của các email cũ từ incoming_emails sang email_bodies (đã nén)
+
+    Email được duyệt theo id tăng dần; mỗi lô được ghi vào email_bodies và xóa
+    khỏi incoming_emails trong cùng một transaction. Có thể dừng và chạy lại.
+
+    Returns:
+        Số email đã chuyển
+    """
+    codec = codec or body_codec()
+    if codec == "none":
+        return 0
+    last_id = 0
+    moved = 0
+    while True:
+        rows = db.query(Email.id, Email.received_time, Email.content).filter(
+            Email.id > last_id, Email.content != ''
+        ).order_by(Email.id).limit(chunk_size).all()
+        if not rows:
+            break
+        try:
+            store_bodies(db, [row._asdict() for row in rows], codec)
+            db.execute(update(Email), [{'id': row.id, 'content': ''} for row in rows])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        last_id = rows[-1].id
+        moved += len(rows)
+    if moved:
+        logger.info(f"Đã chuyển nội dung của {moved} email sang email_bodies")
+    return moved
+
+
+def storage_stats(db: Session) -> Dict[str, int]:
+    """Số email và tổng số byte trước/sau khi nén của email_bodies"""
+    count, size, stored = db.query(
+        func.count(EmailBody.email_id), func.sum(EmailBody.size), func.sum(func.length(EmailBody.data))
+    ).one()
+    return {'bodies': int(count or 0), 'raw_bytes': int(size or 0), 'stored_bytes': int(stored or 0)}
+
+
+if __name__ == "__main__":
+    # Chuyển nội dung email cũ sang bảng nén: python -m services.email_bodies
+    from database.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        print(f"Đã chuyển {move_inline_bodies(session)} email")
+        print(storage_stats(session))
+    finally:
+        session.close()
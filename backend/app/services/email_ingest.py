@@ -0,0 +1,450 @@
+import codecs
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+
+from models.email import Email
+from schemas.email import EmailCreate
+from services import email_bodies, email_stats
+from services.email_analyzer import EmailAnalyzer
+from utils.json_response import loads
+
+logger = logging.getLogger(__name__)
+
+# Số lỗi tối đa được trả về chi tiết trong một lần nhập
+MAX_REPORTED_ERRORS = 1000
+
+# Số giá trị tối đa trong một điều kiện IN khi kiểm tra email đã tồn tại
+LOOKUP_CHUNK_SIZE = 500
+
+# Kích thước tối đa của một bản ghi trong mảng JSON đang chờ đủ dữ liệu để giải mã
+MAX_RECORD_CHARS = 16 * 1024 * 1024
+
+# Các trường chuỗi bắt buộc của EmailCreate
+TEXT_FIELDS = ('title', 'content', 'from_email', 'to_email')
+
+# Lỗi database tạm thời (mất kết nối, deadlock, hết thời gian chờ khóa hoặc kết nối):
+# ghi lại sau có thể thành công
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError)
+
+# Một bản ghi đã đọc: (vị trí trong luồng, các cột của email hoặc None, thông báo lỗi hoặc None)
+ParsedRecord = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+def default_batch_size() -> int:
+    return int(os.getenv("BULK_INSERT_BATCH_SIZE", "1000"))
+
+
+def content_fingerprint(from_email: str, to_email: str, received_time: Any, title: str, content: str) -> str:
+    """
+    Dấu vân tay của email dùng để chống trùng lặp khi không có Message-ID
+
+    Thời gian nhận được đưa về dạng không múi giờ, chính xác đến giây như khi
+    lưu vào cột DATETIME, để email nhập lại và email đã lưu có cùng dấu vân tay.
+    """
+    if isinstance(received_time, datetime):
+        received_time = received_time.replace(tzinfo=None, microsecond=0).isoformat(sep=' ')
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (from_email, to_email, str(received_time), title, content):
+        digest.update(part.encode('utf-8', errors='surrogatepass'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def normalize_received_time(value: datetime) -> datetime:
+    """
+    Thời gian nhận như khi lưu vào cột DATETIME: giờ địa phương không múi giờ,
+    làm tròn đến giây như MySQL (0.5 giây trở lên được làm tròn lên)
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    if value.microsecond >= 500000:
+        value += timedelta(seconds=1)
+    return value.replace(microsecond=0)
+
+
+def _message_id(value: Any) -> Optional[str]:
+    """Chuẩn hóa Message-ID: bỏ khoảng trắng thừa, chuỗi rỗng thành None"""
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+class RecordStreamParser:
+    """
+    Đọc dần các bản ghi email từ một luồng byte dạng NDJSON (mỗi dòng một object)
+    hoặc một mảng JSON, nhận diện theo ký tự đầu tiên khác khoảng trắng.
+
+    Mỗi bản ghi được kiểm tra theo EmailCreate ngay khi đọc xong và trả về dưới dạng
+    dict các cột cần ghi; bản ghi lỗi
+    (JSON sai ở một dòng NDJSON, thiếu trường...) được trả về kèm thông báo lỗi mà
+    không làm dừng luồng. Với mảng JSON, lỗi cú pháp làm mất ranh giới giữa các
+    bản ghi nên phần còn lại của luồng bị bỏ qua.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._mode: Optional[str] = None  # 'ndjson' hoặc 'array'
+        self._index = 0
+        self._closed = False
+
+    def feed(self, data: bytes) -> List[ParsedRecord]:
+        """Thêm một đoạn dữ liệu, trả về các bản ghi đã đọc trọn vẹn"""
+        self._buffer += self._decoder.decode(data)
+        return self._drain(final=False)
+
+    def close(self) -> List[ParsedRecord]:
+        """Kết thúc luồng, trả về các bản ghi còn lại"""
+        self._buffer += self._decoder.decode(b'', final=True)
+        return self._drain(final=True)
+
+    def _record(self, value: Any = None, error: Optional[str] = None) -> ParsedRecord:
+        index = self._index
+        self._index += 1
+        if error is not None:
+            return index, None, error
+        if not isinstance(value, dict):
+            return index, None, "Bản ghi phải là một JSON object"
+        # Đường nhanh cho bản ghi chuẩn: các trường chuỗi và thời gian dạng ISO 8601
+        # (múi giờ và phần lẻ của giây được chuẩn hóa trong insert_batch cho cả hai đường)
+        try:
+            row = {name: value[name] for name in TEXT_FIELDS}
+            received_time = value['received_time']
+            message_id = value.get('message_id')
+            if (all(type(text) is str for text in row.values()) and type(received_time) is str
+                    and (message_id is None or (type(message_id) is str and len(message_id) <= 255))):
+                row['received_time'] = datetime.fromisoformat(received_time)
+                row['message_id'] = _message_id(message_id)
+                return index, row, None
+        except (KeyError, ValueError):
+            pass
+        # Các trường hợp khác (ép kiểu, thiếu trường...) kiểm tra theo EmailCreate
+        try:
+            row = EmailCreate(**value).dict()
+            row['message_id'] = _message_id(row['message_id'])
+            return index, row, None
+        except ValidationError as e:
+            fields = ', '.join('.'.join(str(part) for part in item['loc']) + ': ' + item['msg']
+                               for item in e.errors())
+            return index, None, f"Bản ghi không hợp lệ ({fields})"
+
+    def _drain(self, final: bool) -> List[ParsedRecord]:
+        if self._closed:
+            self._buffer = ''
+            return []
+        if self._mode is None:
+            # BOM đầu luồng được bỏ khỏi chính buffer: json không chấp nhận BOM
+            self._buffer = self._buffer.lstrip().lstrip('\ufeff').lstrip()
+            if not self._buffer:
+                return []
+            if self._buffer[0] == '[':
+                self._mode = 'array'
+                self._buffer = self._buffer[1:]
+            else:
+                self._mode = 'ndjson'
+        return self._drain_ndjson(final) if self._mode == 'ndjson' else self._drain_array(final)
+
+    def _drain_ndjson(self, final: bool) -> List[ParsedRecord]:
+        lines = self._buffer.split('\n')
+        self._buffer = '' if final else lines.pop()
+        records = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                value = loads(line)
+            except ValueError as e:
+                records.append(self._record(error=f"JSON không hợp lệ: {str(e)}"))
+            else:
+                records.append(self._record(value))
+        return records
+
+    def _drain_array(self, final: bool) -> List[ParsedRecord]:
+        records = []
+        buffer = self._buffer
+        position = 0
+        length = len(buffer)
+        while True:
+            # Bỏ qua khoảng trắng và dấu phẩy giữa các phần tử
+            while position < length and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position >= length:
+                break
+            if buffer[position] == ']':
+                self._closed = True
+                position = length
+                break
+            try:
+                value, position = self._json.raw_decode(buffer, position)
+            except ValueError as e:
+                if not final and length - position <= MAX_RECORD_CHARS:
+                    # Phần tử chưa nhận đủ, chờ thêm dữ liệu
+                    break
+                records.append(self._record(error=f"JSON không hợp lệ, dừng đọc phần còn lại của mảng: {str(e)}"))
+                self._closed = True
+                position = length
+                break
+            records.append(self._record(value))
+        self._buffer = buffer[position:]
+        return records
+
+
+class IngestResult:
+    """Kết quả một lần nhập email hàng loạt"""
+
+    def __init__(self):
+        self.received = 0
+        self.inserted = 0
+        self.failed = 0
+        self.unscored = 0
+        self.duplicates = 0
+        self.errors: List[Dict[str, Any]] = []
+        # Vị trí các bản ghi không ghi được do lỗi database tạm thời
+        self.retryable: List[int] = []
+        self.rules_version: Optional[str] = None
+
+    def add_error(self, index: int, error: str, retryable: bool = False):
+        self.failed += 1
+        if retryable:
+            self.retryable.append(index)
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"index": index, "error": error})
+
+
+def _analyze_batch(analyzer: EmailAnalyzer, rows: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """Phân tích một lô; nếu lô lỗi thì phân tích từng email, email lỗi nhận None"""
+    try:
+        return analyzer.analyze_many((row['title'], row['content'], row['from_email']) for row in rows)
+    except Exception as e:
+        logger.warning(f"Lỗi khi phân tích lô email nhập mới, chuyển sang phân tích từng email: {str(e)}")
+
+    analyses = []
+    for row in rows:
+        try:
+            analyses.append(analyzer.analyze_email(row['title'], row['content'], row['from_email']))
+        except Exception as e:
+            logger.error(f"Lỗi khi phân tích email nhập mới: {str(e)}")
+            analyses.append(None)
+    return analyses
+
+
+def _existing(db: Session, column, values) -> set:
+    """Các giá trị đã có trong cột (tra theo chỉ mục, từng nhóm LOOKUP_CHUNK_SIZE giá trị)"""
+    values = list(values)
+    found = set()
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[start:start + LOOKUP_CHUNK_SIZE]
+        found.update(value for (value,) in db.query(column).filter(column.in_(chunk)))
+    return found
+
+
+def _drop_duplicates(db: Session, candidates: List[Tuple[int, Dict[str, Any]]],
+                     result: IngestResult) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Bỏ các email đã có trong database hoặc lặp lại trong cùng lô, theo Message-ID
+    hoặc dấu vân tay nội dung
+    """
+    message_ids = _existing(db, Email.message_id, {row['message_id'] for _, row in candidates if row['message_id']})
+    hashes = _existing(db, Email.content_hash, {row['content_hash'] for _, row in candidates})
+    kept = []
+    for index, row in candidates:
+        if (row['message_id'] and row['message_id'] in message_ids) or row['content_hash'] in hashes:
+            result.duplicates += 1
+            continue
+        if row['message_id']:
+            message_ids.add(row['message_id'])
+        hashes.add(row['content_hash'])
+        kept.append((index, row))
+    return kept
+
+
+def _insert_emails(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Thêm một lô email (chưa commit), trả về id theo đúng thứ tự các dòng
+
+    Database có RETURNING cho executemany (SQLite, MariaDB) trả id trực tiếp. MySQL
+    thì thêm cả lô rồi tra id theo dấu vân tay nội dung, chỉ với các dấu vân tay chưa
+    có trong bảng và không lặp lại trong lô (dấu vân tay không phải khóa duy nhất);
+    các dòng còn lại được thêm riêng từng dòng để lấy id của chính dòng đó.
+    """
+    table = Email.__table__
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        inserted = db.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows)
+        return [email_id for (email_id,) in inserted]
+
+    counts = Counter(row['content_hash'] for row in rows)
+    taken = _existing(db, Email.content_hash, counts)
+    ids: List[Optional[int]] = [None] * len(rows)
+    batched = [index for index, row in enumerate(rows)
+               if counts[row['content_hash']] == 1 and row['content_hash'] not in taken]
+    if batched:
+        db.execute(insert(table), [rows[index] for index in batched])
+        hashes = [rows[index]['content_hash'] for index in batched]
+        found: Dict[str, int] = {}
+        for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+            chunk = hashes[start:start + LOOKUP_CHUNK_SIZE]
+            found.update({content_hash: email_id for email_id, content_hash in
+                          db.query(Email.id, Email.content_hash).filter(Email.content_hash.in_(chunk))})
+        for index in batched:
+            ids[index] = found[rows[index]['content_hash']]
+    for index, row in enumerate(rows):
+        if ids[index] is None:
+            ids[index] = db.execute(insert(table), row).inserted_primary_key[0]
+    return ids
+
+
+def _write_rows(db: Session, rows: List[Dict[str, Any]], codec: str):
+    """Ghi một lô email (chưa commit); nội dung được nén vào email_bodies trừ khi codec là none"""
+    if codec == "none":
+        db.execute(insert(Email.__table__), rows)
+        return
+    ids = _insert_emails(db, [{**row, 'content': ''} for row in rows])
+    email_bodies.store_bodies(db, [
+        {'id': email_id, 'received_time': row['received_time'], 'content': row['content']}
+        for email_id, row in zip(ids, rows)
+    ], codec)
+
+
+def insert_batch(db: Session, analyzer: EmailAnalyzer, records: List[ParsedRecord], result: IngestResult):
+    """
+    Phân tích và ghi một lô bản ghi đã đọc
+
+    Email đã có (trùng Message-ID hoặc dấu vân tay nội dung) được loại bằng hai truy
+    vấn theo chỉ mục cho cả lô, trước khi phân tích. Các email còn lại được chấm
+    điểm bằng analyze_many rồi ghi bằng một lệnh INSERT nhiều dòng (nội dung nén vào
+    email_bodies), cùng transaction với bảng thống kê theo ngày. Email không phân
+    tích được vẫn được lưu với danh mục unknown để analyze-batch xử lý sau. Nếu lô
+    không ghi được vì dữ liệu (không phải lỗi tạm thời), từng email được ghi lại
+    riêng để chỉ các email lỗi bị báo lỗi; lỗi tạm thời được báo cho mọi bản ghi
+    của lô và đánh dấu trong result.retryable.
+
+    Args:
+        db: Session database
+        analyzer: EmailAnalyzer dùng để chấm điểm
+        records: Các bản ghi từ RecordStreamParser
+        result: Kết quả được cộng dồn
+    """
+    candidates = []
+    for index, row, error in records:
+        result.received += 1
+        if row is None:
+            result.add_error(index, error)
+            continue
+        # Giá trị được lưu và dấu vân tay phải dùng cùng một thời gian trên mọi database
+        row['received_time'] = normalize_received_time(row['received_time'])
+        row['content_hash'] = content_fingerprint(
+            row['from_email'], row['to_email'], row['received_time'], row['title'], row['content']
+        )
+        candidates.append((index, row))
+    candidates = _drop_duplicates(db, candidates, result)
+    if not candidates:
+        return
+
+    analyses = _analyze_batch(analyzer, [row for _, row in candidates])
+    for (_, row), analysis in zip(candidates, analyses):
+        if analysis is None:
+            result.unscored += 1
+            # Mọi dòng của lô phải có cùng các cột: INSERT executemany lấy danh sách
+            # cột từ dòng đầu tiên
+            row.update(category='unknown', category_id=1, confidence_score=0.0, level='',
+                       suspicious_indicators=None)
+        else:
+            row.update(
+                category=analysis["category"],
+                category_id=analysis["category_id"],
+                confidence_score=analysis["confidence_score"],
+                level=analysis["level"],
+                suspicious_indicators=analysis["suspicious_indicators"]
+            )
+            result.rules_version = analysis.get("rules_version", result.rules_version)
+
+    codec = email_bodies.body_codec()
+    for attempt in range(2):
+        rows = [row for _, row in candidates]
+        try:
+            # INSERT dạng Core (executemany) trên bảng, không qua bulk insert của ORM
+            _write_rows(db, rows, codec)
+            email_stats.record_category_changes(db, [(row["received_time"], None, row["category"]) for row in rows])
+            db.commit()
+        except IntegrityError as e:
+            db.rollback()
+            if attempt == 0:
+                # Một request khác vừa ghi cùng Message-ID: kiểm tra lại rồi ghi phần còn lại
+                candidates = _drop_duplicates(db, candidates, result)
+                if not candidates:
+                    return
+                continue
+            error = e
+        except Exception as e:
+            db.rollback()
+            error = e
+        else:
+            result.inserted += len(rows)
+            return
+        break
+
+    if len(candidates) > 1 and not isinstance(error, TRANSIENT_ERRORS):
+        # Thường chỉ một vài email có dữ liệu không ghi được: ghi lại từng email
+        logger.warning(f"Lỗi khi ghi lô email nhập mới, ghi lại từng email: {str(error)}")
+        for index, row in candidates:
+            try:
+                _write_rows(db, [row], codec)
+                email_stats.record_category_changes(db, [(row["received_time"], None, row["category"])])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                result.add_error(index, f"Lỗi khi ghi vào database: {str(e)}", isinstance(e, TRANSIENT_ERRORS))
+            else:
+                result.inserted += 1
+        return
+
+    # Lô lỗi được báo cho từng bản ghi, các lô sau vẫn được ghi tiếp
+    logger.error(f"Lỗi khi ghi lô email nhập mới: {str(error)}")
+    for index, _ in candidates:
+        result.add_error(index, f"Lỗi khi ghi vào database: {str(error)}", isinstance(error, TRANSIENT_ERRORS))
+
+
+def backfill_content_hashes(db: Session, chunk_size: int = 1000) -> int:
+    """
+    Tính dấu vân tay nội dung cho các email lưu trước khi có cột content_hash
+
+    Returns:
+        Số email đã cập nhật
+    """
+    last_id = 0
+    updated = 0
+    while True:
+        rows = db.query(
+            Email.id, Email.from_email, Email.to_email, Email.received_time, Email.title, Email.content
+        ).filter(
+            Email.content_hash.is_(None), Email.id > last_id
+        ).order_by(Email.id).limit(chunk_size).all()
+        if not rows:
+            break
+        contents = email_bodies.load_bodies(db, ((row.id, row.received_time, row.content) for row in rows))
+        db.execute(update(Email), [
+            {'id': row.id, 'content_hash': content_fingerprint(
+                row.from_email, row.to_email, row.received_time, row.title, contents[row.id]
+            )}
+            for row in rows
+        ])
+        db.commit()
+        last_id = rows[-1].id
+        updated += len(rows)
+    if updated:
+        logger.info(f"Đã tính dấu vân tay nội dung cho {updated} email")
+    return updated
@@ -0,0 +1,283 @@
+import logging
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models.email import Email
+from models.email_stats import EmailDailyStat
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ["safe", "suspicious", "spam", "phishing", "unknown"]
+
+# Một thay đổi số lượng: (ngày nhận, danh mục cũ hoặc None nếu là email mới, danh mục mới)
+CategoryChange = Tuple[Union[date, datetime], Optional[str], str]
+
+# Bảng tổng hợp đã được đối chiếu với incoming_emails trong process này hay chưa
+_rollup_verified = False
+
+# Chỉ một lần dựng lại bảng tổng hợp tại một thời điểm (giữa các process: GET_LOCK trên MySQL)
+_rebuild_lock = threading.Lock()
+REBUILD_LOCK_NAME = "email_daily_stats_rebuild"
+REBUILD_LOCK_TIMEOUT = 60
+
+
+def rollup_enabled() -> bool:
+    return os.getenv("EMAIL_STATS_ROLLUP", "True").lower() == "true"
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        # Ngày của giá trị như khi được lưu vào cột DATETIME (xem
+        # email_ingest.normalize_received_time): giờ địa phương, làm tròn đến giây
+        if value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        if value.microsecond >= 500000:
+            value += timedelta(seconds=1)
+        return value.date()
+    if isinstance(value, date):
+        return value
+    # SQLite trả về DATE(...) dạng chuỗi
+    return date.fromisoformat(str(value)[:10])
+
+
+def record_category_changes(db: Session, changes: Iterable[CategoryChange]):
+    """
+    Cập nhật cộng dồn bảng tổng hợp trong cùng transaction với thay đổi email
+    (người gọi chịu trách nhiệm commit)
+
+    Args:
+        db: Session database
+        changes: Các thay đổi (ngày nhận, danh mục cũ, danh mục mới); danh mục cũ
+                 là None với email mới được thêm
+    """
+    if not rollup_enabled():
+        return
+
+    deltas: Counter = Counter()
+    for received, old_category, new_category in changes:
+        day = _as_date(received)
+        new_category = new_category or 'unknown'
+        if old_category is not None:
+            old_category = old_category or 'unknown'
+            if old_category == new_category:
+                continue
+            deltas[(day, old_category)] -= 1
+        deltas[(day, new_category)] += 1
+
+    rows = [{'day': day, 'category': category, 'count': delta}
+            for (day, category), delta in deltas.items() if delta]
+    if not rows:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_insert(EmailDailyStat).values(rows)
+        stmt = stmt.on_duplicate_key_update(count=EmailDailyStat.count + stmt.inserted['count'])
+        db.execute(stmt)
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(EmailDailyStat).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'category'],
+            set_={'count': EmailDailyStat.count + stmt.excluded['count']}
+        )
+        db.execute(stmt)
+    else:
+        for row in rows:
+            stat = db.get(EmailDailyStat, (row['day'], row['category']))
+            if stat is None:
+                db.add(EmailDailyStat(**row))
+            else:
+                stat.count += row['count']
+
+
+@contextmanager
+def _rebuild_serialized(db: Session) -> Iterator[bool]:
+    """
+    Giữ khóa dựng lại bảng tổng hợp; trả về False nếu không lấy được khóa trong
+    REBUILD_LOCK_TIMEOUT giây. Khóa MySQL được giữ trên một kết nối riêng vì session
+    có thể trả kết nối về pool khi commit.
+    """
+    with _rebuild_lock:
+        bind = db.get_bind()
+        if bind.dialect.name != 'mysql':
+            yield True
+            return
+        with bind.connect() as connection:
+            acquired = connection.execute(text("SELECT GET_LOCK(:name, :timeout)"),
+                                          {"name": REBUILD_LOCK_NAME, "timeout": REBUILD_LOCK_TIMEOUT}).scalar()
+            try:
+                yield bool(acquired)
+            finally:
+                if acquired:
+                    connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": REBUILD_LOCK_NAME})
+
+
+def _rebuild(db: Session):
+    day = func.date(Email.received_time)
+    category = func.coalesce(Email.category, 'unknown')
+    db.execute(delete(EmailDailyStat))
+    db.execute(insert(EmailDailyStat).from_select(
+        ['day', 'category', 'count'],
+        select(day, category, func.count()).group_by(day, category)
+    ))
+    db.commit()
+
+
+def rebuild_rollup(db: Session):
+    """Dựng lại toàn bộ bảng tổng hợp từ incoming_emails bằng một truy vấn GROUP BY"""
+    with _rebuild_serialized(db) as acquired:
+        if not acquired:
+            raise TimeoutError("Bảng email_daily_stats đang được dựng lại bởi process khác")
+        _rebuild(db)
+
+
+def _rollup_matches(db: Session, full: bool) -> bool:
+    """
+    Bảng tổng hợp có khớp incoming_emails không: so tổng số email, hoặc với full
+    so từng (ngày, danh mục) bằng một truy vấn GROUP BY trên incoming_emails
+    """
+    if not full:
+        rolled_up = db.query(func.coalesce(func.sum(EmailDailyStat.count), 0)).scalar()
+        return int(rolled_up) == db.query(func.count(Email.id)).scalar()
+    day = func.date(Email.received_time)
+    category = func.coalesce(Email.category, 'unknown')
+    actual = {(_as_date(row_day), row_category): int(count)
+              for row_day, row_category, count in db.query(day, category, func.count()).group_by(day, category)}
+    stored = {(_as_date(row_day), row_category): int(count)
+              for row_day, row_category, count in db.query(
+                  EmailDailyStat.day, EmailDailyStat.category, EmailDailyStat.count
+              ).filter(EmailDailyStat.count != 0)}
+    return actual == stored
+
+
+def reconcile_rollup(db: Session, full: bool = True) -> bool:
+    """
+    Đối chiếu bảng tổng hợp với incoming_emails và dựng lại nếu lệch (bảng mới tạo,
+    email ghi ngoài API như migration hoặc SQL thủ công...)
+
+    Việc đối chiếu được làm lại sau khi lấy khóa, nên khi nhiều worker cùng phát
+    hiện lệch, bảng chỉ được dựng lại một lần.
+
+    Args:
+        db: Session database
+        full: So từng (ngày, danh mục) thay vì chỉ tổng số email
+
+    Returns:
+        True nếu bảng đã được dựng lại
+    """
+    with _rebuild_serialized(db) as acquired:
+        if not acquired:
+            logger.warning("Bảng email_daily_stats đang được dựng lại bởi process khác, bỏ qua")
+            return False
+        if _rollup_matches(db, full):
+            db.rollback()
+            return False
+        logger.info("Bảng email_daily_stats lệch với incoming_emails, dựng lại")
+        _rebuild(db)
+        return True
+
+
+def ensure_rollup(db: Session):
+    """
+    Đối chiếu nhanh (tổng số email) bảng tổng hợp với incoming_emails một lần cho
+    mỗi process; đối chiếu đầy đủ chạy định kỳ bằng tác vụ nền stats-reconcile
+    """
+    global _rollup_verified
+    if _rollup_verified:
+        return
+    reconcile_rollup(db, full=False)
+    _rollup_verified = True
+
+
+def _daily_counts(db: Session, since: Optional[date]) -> List[Tuple[date, str, int]]:
+    """Số lượng email theo (ngày, danh mục) từ ngày `since`, None để lấy toàn bộ"""
+    if rollup_enabled():
+        ensure_rollup(db)
+        query = db.query(EmailDailyStat.day, EmailDailyStat.category, EmailDailyStat.count).filter(
+            EmailDailyStat.count != 0
+        )
+        if since is not None:
+            query = query.filter(EmailDailyStat.day >= since)
+        rows = query.all()
+    else:
+        # Không dùng bảng tổng hợp: một truy vấn GROUP BY, không tải nội dung email
+        day = func.date(Email.received_time)
+        category = func.coalesce(Email.category, 'unknown')
+        query = db.query(day, category, func.count())
+        if since is not None:
+            query = query.filter(Email.received_time >= datetime.combine(since, datetime.min.time()))
+        rows = query.group_by(day, category).all()
+    return [(_as_date(row_day), row_category, int(count)) for row_day, row_category, count in rows]
+
+
+def _category_totals(db: Session) -> Dict[str, int]:
+    if rollup_enabled():
+        ensure_rollup(db)
+        rows = db.query(EmailDailyStat.category, func.sum(EmailDailyStat.count)).group_by(
+            EmailDailyStat.category
+        ).all()
+    else:
+        category = func.coalesce(Email.category, 'unknown')
+        rows = db.query(category, func.count()).group_by(category).all()
+    return {row_category: int(count or 0) for row_category, count in rows}
+
+
+def get_email_stats(db: Session, days: int = 7, bucket_days: int = 1) -> Dict[str, Any]:
+    """
+    Thống kê email theo danh mục và xu hướng gần đây
+
+    Chi phí tỷ lệ với số ngày x số danh mục thay vì số email.
+
+    Args:
+        db: Session database
+        days: Số ngày của khoảng xu hướng
+        bucket_days: Số ngày gộp trong mỗi điểm của xu hướng
+
+    Returns:
+        Dict gồm total, categories và recent_trend (chỉ gồm các khoảng có email)
+    """
+    totals = _category_totals(db)
+    total = sum(totals.values())
+    categories = {}
+    for category_name in CATEGORIES:
+        count = totals.get(category_name, 0)
+        percentage = (count / total * 100) if total > 0 else 0
+        categories[category_name] = {
+            "count": count,
+            "percentage": round(percentage, 1)
+        }
+
+    start = (datetime.now() - timedelta(days=days)).date()
+    buckets: Dict[date, Dict[str, Any]] = {}
+    for day, category, count in _daily_counts(db, start):
+        bucket = start + timedelta(days=(day - start).days // bucket_days * bucket_days)
+        if bucket not in buckets:
+            buckets[bucket] = {"date": bucket.strftime("%Y-%m-%d"), **{name: 0 for name in CATEGORIES}}
+        buckets[bucket][category] = buckets[bucket].get(category, 0) + count
+
+    return {
+        "total": total,
+        "categories": categories,
+        "recent_trend": [buckets[bucket] for bucket in sorted(buckets)]
+    }
+
+
+if __name__ == "__main__":
+    # Dựng lại bảng tổng hợp: python -m services.email_stats
+    from database.session import SessionLocal
+
+    session = SessionLocal()
+    try:
+        rebuild_rollup(session)
+        print("Đã dựng lại bảng email_daily_stats")
+    finally:
+        session.close()
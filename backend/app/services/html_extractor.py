@@ -0,0 +1,122 @@
+import html as html_lib
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+# Nhận diện nội dung HTML: chỉ kiểm tra phần đầu nội dung để chi phí không phụ thuộc độ dài
+HTML_SNIFF_PATTERN = re.compile(
+    r'<(?:!doctype\s+html|html|head|body|div|p|a\s|table|span|br|img|font|td)\b', re.IGNORECASE
+)
+HTML_SNIFF_CHARS = 4096
+
+# Giá trị thuộc tính có thể chứa ">" nên phần thuộc tính được khớp theo từng chuỗi trích dẫn
+_ATTRS = r'''(?:[^>"']|"[^"]*"|'[^']*')*'''
+
+# Một lượt quét bỏ qua markup: chú thích, khối không hiển thị (script, style...),
+# thẻ mở/đóng và khai báo (<!DOCTYPE ...>). Chữ hiển thị là phần nằm giữa các lần khớp.
+TOKEN_PATTERN = re.compile(
+    r'<!--.*?(?:-->|\Z)'
+    r'|<(?P<skip>script|style|title|noscript|template|svg)\b' + _ATTRS + r'>.*?(?:</(?P=skip)\s*>|\Z)'
+    r'|<(?P<close>/)?(?P<tag>[a-zA-Z][a-zA-Z0-9]*)(?P<attrs>' + _ATTRS + r')>'
+    r'|<![^>]*>',
+    re.DOTALL | re.IGNORECASE
+)
+HREF_PATTERN = re.compile(r'''\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''', re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Thẻ khối: chèn khoảng trắng để chữ của hai khối liền nhau không bị dính vào nhau
+BLOCK_TAGS = {
+    'p', 'div', 'br', 'tr', 'td', 'th', 'li', 'ul', 'ol', 'table', 'section', 'article',
+    'header', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'hr', 'center'
+}
+
+# Các scheme của liên kết được chuyển cho bước kiểm tra URL
+LINK_SCHEMES = ('http://', 'https://')
+
+
+class HtmlLink(NamedTuple):
+    """Một liên kết trong email HTML"""
+    url: str    # Giá trị thuộc tính href
+    text: str   # Chữ hiển thị của liên kết (anchor text)
+
+
+class HtmlContent(NamedTuple):
+    """Kết quả trích xuất nội dung từ email HTML"""
+    text: str               # Chữ hiển thị, đã gộp khoảng trắng
+    links: List[HtmlLink]   # Các liên kết http(s), không trùng lặp, theo thứ tự xuất hiện
+    truncated: bool         # True nếu dừng sớm do vượt giới hạn ký tự
+
+
+def looks_like_html(content: str) -> bool:
+    """Kiểm tra nhanh nội dung có phải HTML không"""
+    return '<' in content and HTML_SNIFF_PATTERN.search(content, 0, HTML_SNIFF_CHARS) is not None
+
+
+def _decode(text: str) -> str:
+    return html_lib.unescape(text) if '&' in text else text
+
+
+def extract_html(html: str, max_text_chars: Optional[int] = None, max_links: int = 1000) -> HtmlContent:
+    """
+    Trích xuất chữ hiển thị và liên kết từ nội dung HTML trong một lượt quét
+
+    Không dựng cây DOM: markup được bỏ qua bằng biểu thức chính quy, chỉ thuộc tính
+    href của thẻ <a> được đọc. Bộ nhớ sử dụng bị giới hạn bởi max_text_chars và
+    max_links, không phụ thuộc độ dài HTML.
+
+    Args:
+        html: Nội dung HTML
+        max_text_chars: Số ký tự chữ tối đa cần lấy; khi đạt giới hạn, phần HTML
+                        còn lại không được quét
+        max_links: Số liên kết tối đa được giữ lại
+
+    Returns:
+        HtmlContent gồm chữ hiển thị, các liên kết và cờ truncated
+    """
+    parts: List[str] = []
+    text_chars = 0
+    links: Dict[str, str] = {}
+    href: Optional[str] = None
+    anchor_start = 0
+    truncated = False
+    position = 0
+
+    def close_anchor():
+        if href is not None and href.lower().startswith(LINK_SCHEMES) and (href in links or len(links) < max_links):
+            text = WHITESPACE_PATTERN.sub(' ', ''.join(parts[anchor_start:])).strip()
+            # Giữ chữ hiển thị đầu tiên không rỗng của mỗi liên kết
+            if not links.get(href):
+                links[href] = text
+
+    for match in TOKEN_PATTERN.finditer(html):
+        if match.start() > position:
+            data = _decode(html[position:match.start()])
+            parts.append(data)
+            text_chars += len(data)
+            if max_text_chars is not None and text_chars >= max_text_chars:
+                truncated = True
+                break
+        position = match.end()
+
+        tag = match.group('tag')
+        if tag is None:
+            continue
+        tag = tag.lower()
+        if tag == 'a':
+            close_anchor()
+            href = None
+            if not match.group('close'):
+                found = HREF_PATTERN.search(match.group('attrs'))
+                if found:
+                    href = _decode(next(value for value in found.groups() if value is not None)).strip()
+                    anchor_start = len(parts)
+        elif tag in BLOCK_TAGS:
+            parts.append(' ')
+    else:
+        if position < len(html):
+            parts.append(_decode(html[position:]))
+    close_anchor()
+
+    text = WHITESPACE_PATTERN.sub(' ', ''.join(parts)).strip()
+    if max_text_chars is not None:
+        text = text[:max_text_chars]
+    return HtmlContent(text, [HtmlLink(url, text) for url, text in links.items()], truncated)
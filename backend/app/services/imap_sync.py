@@ -0,0 +1,217 @@
+import imaplib
+import logging
+import os
+import threading
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from models.imap_sync_state import ImapSyncState
+from services import email_ingest
+from services.email_analyzer import EmailAnalyzer
+from utils.email_monitor import EmailMonitor, SyncCheckpoint
+
+logger = logging.getLogger(__name__)
+
+
+def load_checkpoint(db: Session, account: str, folder: str) -> Optional[SyncCheckpoint]:
+    """Checkpoint đã lưu của một tài khoản và thư mục (None nếu chưa đồng bộ lần nào)"""
+    state = db.get(ImapSyncState, (account, folder))
+    if state is None:
+        return None
+    return SyncCheckpoint(state.uidvalidity, state.last_uid)
+
+
+def save_checkpoint(db: Session, account: str, folder: str, checkpoint: SyncCheckpoint):
+    db.merge(ImapSyncState(account=account, folder=folder,
+                           uidvalidity=checkpoint.uidvalidity, last_uid=checkpoint.last_uid))
+    db.commit()
+
+
+def _received_time(value: str) -> datetime:
+    """Thời gian nhận từ header Date, đổi về giờ địa phương không múi giờ như cột received_time"""
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return datetime.now().replace(microsecond=0)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def to_records(emails_data: List[Dict[str, Any]]) -> List[email_ingest.ParsedRecord]:
+    """Đổi email lấy từ EmailMonitor sang bản ghi của email_ingest.insert_batch"""
+    records = []
+    for index, email_data in enumerate(emails_data):
+        message_id = email_data.get("message_id")
+        records.append((index, {
+            # Cắt theo độ dài cột của incoming_emails
+            'title': email_data["subject"][:500],
+            'content': email_data["body"] or "",
+            'from_email': email_data["from"][:255],
+            'to_email': email_data["to"][:255],
+            'received_time': _received_time(email_data["date"]),
+            'message_id': message_id if message_id and len(message_id) <= 255 else None,
+        }, None))
+    return records
+
+
+def sync_folder(db: Session, analyzer: EmailAnalyzer, monitor: EmailMonitor,
+                folder: str = "INBOX", limit: int = 0) -> Dict[str, Any]:
+    """
+    Đồng bộ tăng dần một thư mục IMAP: lấy email mới từ checkpoint, phân tích và lưu
+
+    Checkpoint chỉ được ghi sau khi các email đã được lưu; nếu lần đồng bộ bị gián
+    đoạn, lần sau lấy lại cùng các email và chúng bị loại như email trùng lặp. Email
+    database từ chối vĩnh viễn (dữ liệu không ghi được) bị bỏ qua và ghi log để thư
+    mục không bị kẹt; khi có lỗi database tạm thời, checkpoint chỉ tiến tới ngay
+    trước email đầu tiên chưa ghi được để lần sau lấy lại từ đó.
+
+    Args:
+        db: Session database
+        analyzer: EmailAnalyzer dùng để chấm điểm
+        monitor: Kết nối IMAP của tài khoản
+        folder: Thư mục IMAP
+        limit: Số email tối đa mỗi lần (0 = không giới hạn)
+
+    Returns:
+        Dict gồm số email lấy về, đã lưu, trùng lặp, lỗi (retryable: lỗi tạm thời) và UID
+        lớn nhất đã đồng bộ
+    """
+    account = monitor.email_address
+    checkpoint = load_checkpoint(db, account, folder)
+    sync = monitor.sync(folder, checkpoint, limit=limit)
+
+    result = email_ingest.IngestResult()
+    records = to_records(sync.emails)
+    batch_size = email_ingest.default_batch_size()
+    for start in range(0, len(records), batch_size):
+        email_ingest.insert_batch(db, analyzer, records[start:start + batch_size], result)
+
+    new_checkpoint = sync.checkpoint
+    if result.failed:
+        retryable = [int(sync.emails[index]["id"]) for index in result.retryable]
+        skipped = result.failed - len(retryable)
+        if skipped:
+            logger.error(f"Bỏ qua {skipped} email của {account}/{folder} không lưu được: {result.errors[:1]}")
+        if retryable:
+            # Lỗi tạm thời: lấy lại từ email đầu tiên chưa ghi được ở lần sau
+            logger.warning(f"Không lưu được {len(retryable)} email của {account}/{folder}, thử lại ở lần sau")
+            new_checkpoint = SyncCheckpoint(new_checkpoint.uidvalidity, min(retryable) - 1)
+    if new_checkpoint != checkpoint:
+        save_checkpoint(db, account, folder, new_checkpoint)
+    return {
+        "account": account,
+        "folder": folder,
+        "fetched": len(sync.emails),
+        "inserted": result.inserted,
+        "duplicates": result.duplicates,
+        "failed": result.failed,
+        "retryable": len(result.retryable),
+        "full_resync": sync.full_resync,
+        "last_uid": new_checkpoint.last_uid,
+    }
+
+
+class FolderWatcher:
+    """
+    Theo dõi liên tục một thư mục IMAP và nhập email mới gần như ngay lập tức.
+
+    Sau mỗi lần đồng bộ, watcher chờ bằng IDLE và đồng bộ lại ngay khi server báo
+    có email mới; IDLE được gửi lại sau idle_timeout giây, trước khi server đóng
+    phiên IDLE (tối đa 30 phút theo RFC 2177). Với server không hỗ trợ IDLE, thư
+    mục được đồng bộ mỗi poll_interval giây. Khi mất kết nối hoặc không lưu được
+    email, watcher thử lại sau 1, 2, 4... giây, tối đa max_backoff giây.
+    """
+
+    def __init__(self, monitor: EmailMonitor, analyzer: EmailAnalyzer,
+                 session_factory: Callable[[], Session], folder: str = "INBOX",
+                 idle_timeout: float = 1500.0, poll_interval: float = 60.0,
+                 max_backoff: float = 300.0, limit: int = 0):
+        self.monitor = monitor
+        self.analyzer = analyzer
+        self.session_factory = session_factory
+        self.folder = folder
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.limit = limit
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    def sync_once(self) -> Dict[str, Any]:
+        db = self.session_factory()
+        try:
+            self.last_result = sync_folder(db, self.analyzer, self.monitor, self.folder, self.limit)
+        finally:
+            db.close()
+        if self.last_result["fetched"]:
+            logger.info(f"Đồng bộ {self.monitor.email_address}/{self.folder}: {self.last_result}")
+        return self.last_result
+
+    def wait_for_mail(self, stop: threading.Event):
+        """Chờ đến khi có thể có email mới: IDLE nếu server hỗ trợ, không thì chờ poll_interval"""
+        if self.monitor.supports_idle():
+            self.monitor.idle(self.idle_timeout, stop)
+        else:
+            stop.wait(self.poll_interval)
+
+    def run(self, stop: threading.Event):
+        """Vòng lặp đồng bộ cho đến khi stop được đặt"""
+        backoff = 1.0
+        while not stop.is_set():
+            try:
+                self.sync_once()
+                if self.last_result["failed"]:
+                    # Không lưu được một số email (thường do database): chờ rồi mới
+                    # đồng bộ lại, lâu dần nếu vẫn lỗi
+                    stop.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                backoff = 1.0
+                # Còn email chưa lấy hết (limit): đồng bộ tiếp thay vì chờ
+                if not self.limit or self.last_result["fetched"] < self.limit:
+                    self.wait_for_mail(stop)
+            except (imaplib.IMAP4.error, OSError) as e:
+                logger.warning(f"Mất kết nối IMAP {self.monitor.email_address}: {str(e)}, "
+                               f"kết nối lại sau {backoff:.0f} giây")
+                self.monitor.disconnect()
+                stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            except Exception:
+                logger.exception(f"Lỗi khi đồng bộ {self.monitor.email_address}/{self.folder}")
+                stop.wait(self.poll_interval)
+        self.monitor.disconnect()
+
+    @classmethod
+    def from_env(cls, analyzer: EmailAnalyzer, session_factory: Callable[[], Session]) -> 'FolderWatcher':
+        monitor = EmailMonitor(
+            os.getenv("IMAP_EMAIL", ""),
+            os.getenv("IMAP_PASSWORD", ""),
+            imap_server=os.getenv("IMAP_SERVER", "imap.gmail.com"),
+            imap_port=int(os.getenv("IMAP_PORT", "993")),
+            use_ssl=os.getenv("IMAP_USE_SSL", "True").lower() == "true",
+            max_part_bytes=int(os.getenv("IMAP_MAX_PART_BYTES", "262144")),
+        )
+        return cls(
+            monitor, analyzer, session_factory,
+            folder=os.getenv("IMAP_FOLDER", "INBOX"),
+            idle_timeout=float(os.getenv("IMAP_IDLE_TIMEOUT", "1500")),
+            poll_interval=float(os.getenv("IMAP_POLL_INTERVAL", "60")),
+            max_backoff=float(os.getenv("IMAP_MAX_BACKOFF", "300")),
+            limit=int(os.getenv("IMAP_SYNC_LIMIT", "500")),
+        )
+
+
+if __name__ == "__main__":
+    # Theo dõi hộp thư cấu hình trong IMAP_*: python -m services.imap_sync
+    import signal
+
+    from database.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    FolderWatcher.from_env(EmailAnalyzer(), SessionLocal).run(stop_event)
@@ -0,0 +1,337 @@
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from models.job import Job
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class JobCancelled(Exception):
+    """Tác vụ bị hủy theo yêu cầu"""
+
+
+class JobContext:
+    """Kênh báo cáo tiến độ của một tác vụ đang chạy, đồng thời kiểm tra yêu cầu hủy"""
+
+    def __init__(self, runner: 'JobRunner', job_id: int, worker: str, processed: int, failed: int):
+        self.runner = runner
+        self.job_id = job_id
+        self.worker = worker
+        self.processed = processed
+        self.failed = failed
+        self.cancelled = False
+        self._run_processed = 0
+        self._started = time.monotonic()
+
+    def set_total(self, total: int):
+        """Ghi tổng số phần tử cần xử lý (dùng để tính ETA)"""
+        self.runner._update(self.job_id, self.worker, total=total)
+
+    def report(self, processed: int = 0, failed: int = 0) -> bool:
+        """
+        Cộng dồn tiến độ và cập nhật heartbeat
+
+        Args:
+            processed: Số phần tử vừa xử lý xong
+            failed: Số phần tử vừa lỗi
+
+        Returns:
+            False nếu tác vụ đã được yêu cầu hủy hoặc đã thuộc về worker khác
+        """
+        self.processed += processed
+        self.failed += failed
+        self._run_processed += processed
+        elapsed = time.monotonic() - self._started
+        self.cancelled = self.runner._update(
+            self.job_id, self.worker, processed=self.processed, failed=self.failed,
+            throughput=round(self._run_processed / elapsed, 2) if elapsed > 0 else None
+        )
+        return not self.cancelled
+
+
+# Hàm xử lý tác vụ: (tham số, context) -> kết quả dạng JSON
+JobHandler = Callable[[Dict[str, Any], JobContext], Optional[Dict[str, Any]]]
+
+
+class JobRunner:
+    """
+    Bộ chạy tác vụ nền dùng bảng jobs làm hàng đợi.
+
+    Mỗi process chạy một số thread worker cố định, lấy tác vụ bằng UPDATE có điều
+    kiện status = 'queued' nên một tác vụ chỉ được một worker nhận, kể cả khi có
+    nhiều process. Tác vụ đang chạy mà không cập nhật heartbeat quá stale_after giây
+    (process bị dừng đột ngột) được đưa lại vào hàng đợi; trong lúc chạy, một thread
+    riêng cập nhật heartbeat mỗi stale_after / 3 giây, không phụ thuộc vào việc hàm xử
+    lý có báo cáo tiến độ hay không. Cập nhật tiến độ và kết quả của một lần chạy chỉ
+    được ghi khi tác vụ vẫn thuộc về thread đã nhận nó. Tác vụ định kỳ (schedule)
+    được worker tạo khi tác vụ cùng loại gần nhất trong bảng jobs đã quá hạn.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], workers: int = 1,
+                 poll_interval: float = 2.0, stale_after: float = 300.0):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.heartbeat_interval = stale_after / 3
+        self.handlers: Dict[str, JobHandler] = {}
+        self.schedules: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._schedule_lock = threading.Lock()
+        self._next_schedule_check: Dict[str, float] = {}
+
+    @classmethod
+    def from_env(cls, session_factory: Callable[[], Session]) -> 'JobRunner':
+        return cls(
+            session_factory,
+            workers=int(os.getenv("JOB_WORKERS", "1")),
+            poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "2")),
+            stale_after=float(os.getenv("JOB_STALE_SECONDS", "300")),
+        )
+
+    def register(self, kind: str, handler: JobHandler):
+        """Đăng ký hàm xử lý cho một loại tác vụ"""
+        self.handlers[kind] = handler
+
+    def schedule(self, kind: str, interval: float, params: Optional[Dict[str, Any]] = None):
+        """
+        Chạy một loại tác vụ định kỳ
+
+        Args:
+            kind: Loại tác vụ (phải được đăng ký bằng register)
+            interval: Số giây tối thiểu giữa hai lần tạo tác vụ
+            params: Tham số của mỗi tác vụ được tạo
+        """
+        self.schedules[kind] = (interval, params or {})
+        self._next_schedule_check[kind] = 0.0
+
+    def enqueue(self, db: Session, kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        """Thêm tác vụ vào hàng đợi"""
+        job = Job(kind=kind, status='queued', params=params or {}, processed=0, failed=0)
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+        self._wakeup.set()
+        return job
+
+    def active_job(self, db: Session, kind: str) -> Optional[Job]:
+        """Tác vụ cùng loại đang chờ hoặc đang chạy (nếu có)"""
+        return db.query(Job).filter(Job.kind == kind, Job.status.in_(ACTIVE_STATUSES)).order_by(Job.id).first()
+
+    def cancel(self, db: Session, job_id: int) -> Optional[Job]:
+        """
+        Hủy tác vụ: tác vụ đang chờ bị hủy ngay, tác vụ đang chạy dừng sau khi
+        xong phần việc hiện tại
+        """
+        now = datetime.now()
+        db.execute(update(Job).where(Job.id == job_id, Job.status == 'queued').values(
+            status='cancelled', cancel_requested=True, finished_at=now
+        ))
+        db.execute(update(Job).where(Job.id == job_id, Job.status == 'running').values(cancel_requested=True))
+        db.commit()
+        return db.get(Job, job_id, populate_existing=True)
+
+    def start(self):
+        """Khởi động các thread worker"""
+        if self._threads or self.workers <= 0:
+            return
+        self._stop.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0):
+        """Dừng các thread worker (tác vụ đang chạy được tiếp tục sau khi khởi động lại)"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._enqueue_scheduled()
+                job_id = self._claim()
+            except Exception as e:
+                logger.error(f"Lỗi khi lấy tác vụ từ hàng đợi: {str(e)}")
+                job_id = None
+            if job_id is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job_id, self._claimant())
+
+    def _enqueue_scheduled(self):
+        """Tạo các tác vụ định kỳ đến hạn; bảng jobs là nguồn sự thật chung cho mọi process"""
+        if not self.schedules or not self._schedule_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            for kind, (interval, params) in self.schedules.items():
+                if self._next_schedule_check[kind] > now:
+                    continue
+                self._next_schedule_check[kind] = now + min(interval, 60.0)
+                db = self.session_factory()
+                try:
+                    latest = db.query(func.max(Job.created_at)).filter(Job.kind == kind).scalar()
+                    if latest is not None and latest > datetime.now() - timedelta(seconds=interval):
+                        continue
+                    if self.active_job(db, kind) is None:
+                        logger.info(f"Tạo tác vụ định kỳ {kind}")
+                        self.enqueue(db, kind, params)
+                finally:
+                    db.close()
+        finally:
+            self._schedule_lock.release()
+
+    def _claimant(self) -> str:
+        """Giá trị jobs.worker khi thread hiện tại nhận tác vụ (host:pid/tên thread)"""
+        return f"{self.worker_name}/{threading.current_thread().name}"[-100:]
+
+    def _claim(self) -> Optional[int]:
+        """Nhận một tác vụ đang chờ, đưa lại các tác vụ mất heartbeat vào hàng đợi"""
+        db = self.session_factory()
+        try:
+            now = datetime.now()
+            stale = db.execute(update(Job).where(
+                Job.status == 'running', Job.heartbeat_at < now - timedelta(seconds=self.stale_after)
+            ).values(status='queued', worker=None))
+            if stale.rowcount:
+                logger.warning(f"Đưa lại {stale.rowcount} tác vụ bị gián đoạn vào hàng đợi")
+            db.commit()
+
+            candidates = db.query(Job.id).filter(
+                Job.status == 'queued', Job.kind.in_(list(self.handlers))
+            ).order_by(Job.id).limit(5).all()
+            for (job_id,) in candidates:
+                claimed = db.execute(update(Job).where(Job.id == job_id, Job.status == 'queued').values(
+                    status='running', worker=self._claimant(), started_at=now, heartbeat_at=now
+                ))
+                db.commit()
+                if claimed.rowcount == 1:
+                    return job_id
+            return None
+        finally:
+            db.close()
+
+    def _update(self, job_id: int, worker: str, **values) -> bool:
+        """
+        Cập nhật tiến độ và heartbeat của tác vụ do worker đang chạy
+
+        Returns:
+            True nếu tác vụ đã được yêu cầu hủy hoặc không còn thuộc về worker
+            (đã bị đưa lại vào hàng đợi và được worker khác nhận)
+        """
+        db = self.session_factory()
+        try:
+            updated = db.execute(update(Job).where(
+                Job.id == job_id, Job.worker == worker, Job.status == 'running'
+            ).values(heartbeat_at=datetime.now(), **values))
+            db.commit()
+            if updated.rowcount != 1:
+                return True
+            return bool(db.query(Job.cancel_requested).filter(Job.id == job_id).scalar())
+        finally:
+            db.close()
+
+    def _finish(self, job_id: int, worker: str, status: str, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None) -> bool:
+        """Ghi kết quả lần chạy; trả về False nếu tác vụ đã thuộc về worker khác"""
+        db = self.session_factory()
+        try:
+            updated = db.execute(update(Job).where(
+                Job.id == job_id, Job.worker == worker, Job.status == 'running'
+            ).values(
+                status=status, result=result, error=error, finished_at=datetime.now(), heartbeat_at=datetime.now()
+            ))
+            db.commit()
+        finally:
+            db.close()
+        if updated.rowcount != 1:
+            logger.warning(f"Tác vụ {job_id} đã được worker khác nhận lại, bỏ kết quả của {worker}")
+            return False
+        return True
+
+    def _heartbeat(self, job_id: int, worker: str, done: threading.Event):
+        """Cập nhật heartbeat định kỳ cho đến khi lần chạy kết thúc"""
+        while not done.wait(self.heartbeat_interval):
+            try:
+                self._update(job_id, worker)
+            except Exception as e:
+                logger.error(f"Lỗi khi cập nhật heartbeat tác vụ {job_id}: {str(e)}")
+
+    def _run(self, job_id: int, worker: str):
+        db = self.session_factory()
+        try:
+            job = db.get(Job, job_id)
+            kind, params, processed, failed = job.kind, dict(job.params or {}), job.processed, job.failed
+        finally:
+            db.close()
+
+        context = JobContext(self, job_id, worker, processed, failed)
+        # Heartbeat không phụ thuộc vào tiến độ: tác vụ dài không báo cáo (retention,
+        # dựng lại thống kê...) không bị coi là mất và chạy lần thứ hai song song
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, worker, done),
+                                     name=f"job-heartbeat-{job_id}", daemon=True)
+        heartbeat.start()
+        logger.info(f"Bắt đầu tác vụ {job_id} ({kind})")
+        try:
+            result = self.handlers[kind](params, context)
+        except JobCancelled:
+            outcome = ('cancelled', None, None)
+        except Exception as e:
+            logger.exception(f"Tác vụ {job_id} ({kind}) lỗi")
+            outcome = ('failed', None, str(e))
+        else:
+            outcome = ('cancelled' if context.cancelled else 'completed', result, None)
+        finally:
+            done.set()
+            heartbeat.join()
+        self._finish(job_id, worker, *outcome)
+        logger.info(f"Kết thúc tác vụ {job_id} ({kind})")
+
+
+def job_progress(job: Job) -> Dict[str, Any]:
+    """Trạng thái, tiến độ, tốc độ xử lý và thời gian dự kiến còn lại của tác vụ"""
+    eta_seconds = None
+    if job.status == 'running' and job.total is not None and job.throughput:
+        eta_seconds = round(max(job.total - job.processed, 0) / job.throughput, 1)
+    progress = None
+    if job.total:
+        progress = round(min(job.processed / job.total, 1.0) * 100, 1)
+    elif job.status == 'completed':
+        progress = 100.0
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "params": job.params,
+        "total": job.total,
+        "processed": job.processed,
+        "failed": job.failed,
+        "progress": progress,
+        "throughput": job.throughput,
+        "eta_seconds": eta_seconds,
+        "cancel_requested": job.cancel_requested,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
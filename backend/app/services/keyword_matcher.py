@@ -0,0 +1,127 @@
+import re
+import unicodedata
+from typing import Any, Dict, List, Tuple, Iterable, NamedTuple
+
+
+def normalize_text(text: str) -> str:
+    """
+    Chuẩn hóa văn bản trước khi so khớp: chữ thường và dạng Unicode NFC.
+
+    Tiếng Việt có thể được gửi ở dạng tổ hợp (NFD, ví dụ "e" + dấu mũ + dấu sắc)
+    hoặc dựng sẵn (NFC, "ế"). Đưa về NFC để một mẫu duy nhất khớp cả hai dạng.
+    """
+    text = text.lower()
+    if not unicodedata.is_normalized('NFC', text):
+        text = unicodedata.normalize('NFC', text)
+    return text
+
+
+class KeywordHits(NamedTuple):
+    """Kết quả so khớp của một nhóm từ khóa"""
+    count: int
+    terms: List[str]
+
+
+class KeywordMatcher:
+    """
+    Bộ so khớp nhiều mẫu được biên dịch một lần, quét văn bản một lượt duy nhất.
+
+    Tất cả từ khóa của mọi nhóm (spam, phishing, urgency...) được gộp vào một trie
+    và biên dịch thành một regex duy nhất, tương đương một automaton Aho-Corasick
+    nhưng chạy trong engine C của `re`. Tại mỗi vị trí regex trả về mẫu dài nhất
+    bắt đầu ở đó; các mẫu ngắn hơn là tiền tố của nó được suy ra từ bảng tính sẵn.
+    Nhờ vậy tập từ khóa tìm được trùng khớp hoàn toàn với phép kiểm tra
+    `word in text` cho từng từ, kể cả khi các từ khóa chồng lấn nhau.
+    """
+
+    def __init__(self, families: Dict[str, Iterable[str]]):
+        """
+        Args:
+            families: Dict ánh xạ tên nhóm -> danh sách từ khóa của nhóm đó
+        """
+        self.families = {name: [normalize_text(term) for term in terms]
+                         for name, terms in families.items()}
+
+        # Mỗi mẫu ánh xạ tới các vị trí (nhóm, chỉ số) của nó trong danh sách gốc,
+        # để từ khóa trùng lặp trong một danh sách vẫn được đếm như cũ.
+        entries: Dict[str, List[Tuple[str, int]]] = {}
+        self._always = set()
+        for name, terms in self.families.items():
+            for index, term in enumerate(terms):
+                if term:
+                    entries.setdefault(term, []).append((name, index))
+                else:
+                    # Chuỗi rỗng luôn "có trong" văn bản, giống `'' in text`
+                    self._always.add((name, index))
+
+        # Với mỗi mẫu, tính sẵn mọi mẫu là tiền tố của nó (kể cả chính nó)
+        self._expansions: Dict[str, Tuple[Tuple[str, int], ...]] = {}
+        for term in entries:
+            expanded = []
+            for end in range(1, len(term) + 1):
+                expanded.extend(entries.get(term[:end], ()))
+            self._expansions[term] = tuple(expanded)
+
+        self._pattern = re.compile(self._build_trie_pattern(entries)) if entries else None
+
+    @staticmethod
+    def _build_trie_pattern(terms: Iterable[str]) -> str:
+        """Biên dịch danh sách mẫu thành regex dạng trie, ưu tiên mẫu dài nhất"""
+        trie: Dict[str, Any] = {}
+        for term in terms:
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def render(node: Dict[str, Any]) -> str:
+            branches = [re.escape(char) + render(child)
+                        for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            if '' in node:
+                # Một mẫu kết thúc tại nút này: phần tiếp theo là tùy chọn (greedy)
+                return '(?:' + body + ')?'
+            return body
+
+        return render(trie)
+
+    def scan(self, text: str, normalized: bool = False) -> Dict[str, KeywordHits]:
+        """
+        Quét văn bản một lượt và trả về số lượng cùng danh sách từ khóa khớp theo nhóm
+
+        Args:
+            text: Văn bản cần quét
+            normalized: True nếu văn bản đã qua normalize_text
+
+        Returns:
+            Dict tên nhóm -> KeywordHits(count, terms) theo thứ tự của danh sách gốc
+        """
+        if not normalized:
+            text = normalize_text(text)
+
+        found = set(self._always)
+        if self._pattern is not None:
+            search = self._pattern.search
+            seen_terms = set()
+            position = 0
+            match = search(text, position)
+            while match is not None:
+                term = match.group()
+                if term not in seen_terms:
+                    seen_terms.add(term)
+                    found.update(self._expansions[term])
+                # Tiếp tục từ ký tự kế tiếp để không bỏ sót các mẫu chồng lấn
+                position = match.start() + 1
+                match = search(text, position)
+
+        indexes: Dict[str, List[int]] = {name: [] for name in self.families}
+        for name, index in found:
+            indexes[name].append(index)
+
+        results = {}
+        for name, matched in indexes.items():
+            terms = self.families[name]
+            results[name] = KeywordHits(len(matched), [terms[index] for index in sorted(matched)])
+        return results
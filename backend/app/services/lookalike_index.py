@@ -0,0 +1,209 @@
+import unicodedata
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from services.domain_index import DomainIndex, normalize_domain
+from services.keyword_matcher import KeywordMatcher
+
+# Ký tự dễ nhầm lẫn được quy về một dạng chuẩn (chữ số, ký hiệu, chữ Cyrillic/Hy Lạp)
+HOMOGLYPHS = {
+    '0': 'o', 'ο': 'o', 'о': 'o',
+    '1': 'l', 'i': 'l', '|': 'l', '!': 'l', 'ı': 'l', 'і': 'l', 'ӏ': 'l',
+    '3': 'e', 'е': 'e', 'є': 'e',
+    '4': 'a', '@': 'a', 'а': 'a', 'α': 'a',
+    '5': 's', '$': 's', 'ѕ': 's',
+    '7': 't', '8': 'b', '9': 'g',
+    'р': 'p', 'ρ': 'p', 'с': 'c', 'х': 'x', 'у': 'y', 'к': 'k', 'ν': 'v', 'ԁ': 'd',
+}
+# Cặp ký tự trông giống một ký tự khác khi hiển thị
+HOMOGLYPH_SEQUENCES = [('rn', 'm'), ('vv', 'w')]
+
+# Nhãn cấp hai phổ biến dưới ccTLD (ví dụ .com.vn, .co.uk)
+SECOND_LEVEL_LABELS = {'com', 'co', 'net', 'org', 'gov', 'edu', 'ac'}
+
+# Độ dài tối thiểu của tên thương hiệu để tìm khi nó nằm bên trong tên miền khác
+MIN_EMBEDDED_LENGTH = 4
+
+
+def fold_homoglyphs(text: str) -> str:
+    """
+    Quy một chuỗi về dạng "khung xương" để so sánh các ký tự dễ nhầm lẫn
+
+    Ví dụ: "PаyPa1" (chữ а Cyrillic, số 1) -> "paypal"; "rnicrosoft" -> "mlcrosoft"
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(HOMOGLYPHS.get(char, char) for char in text if not unicodedata.combining(char))
+    for sequence, replacement in HOMOGLYPH_SEQUENCES:
+        text = text.replace(sequence, replacement)
+    return text
+
+
+def registrable_labels(domain: str) -> List[str]:
+    """
+    Lấy các nhãn của domain, bỏ phần đuôi công khai (TLD và nhãn cấp hai của ccTLD)
+
+    Ví dụ: "login.paypal.com" -> ["login", "paypal"]; "vietcombank.com.vn" -> ["vietcombank"]
+    """
+    labels = [label for label in domain.split('.') if label]
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL_LABELS:
+        return labels[:-2]
+    return labels[:-1] if len(labels) > 1 else labels
+
+
+def max_distance(length: int) -> int:
+    """Khoảng cách chỉnh sửa cho phép theo độ dài tên, tránh báo nhầm với tên ngắn"""
+    if length <= 5:
+        return 0
+    if length <= 9:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Khoảng cách Damerau-Levenshtein (optimal string alignment), dừng sớm khi vượt limit
+
+    Returns:
+        Khoảng cách, hoặc limit + 1 nếu lớn hơn limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+def deletions(text: str, depth: int) -> Set[str]:
+    """Tập các chuỗi thu được khi xóa tối đa `depth` ký tự (kể cả chuỗi gốc)"""
+    result = {text}
+    frontier = {text}
+    for _ in range(depth):
+        frontier = {word[:i] + word[i + 1:] for word in frontier if len(word) > 1 for i in range(len(word))}
+        result |= frontier
+    return result
+
+
+class LookalikeMatch(NamedTuple):
+    """Kết quả phát hiện domain giả mạo"""
+    brand: str      # Domain thương hiệu bị giả mạo
+    token: str      # Phần tên trong domain người gửi gây khớp
+    kind: str       # 'brand', 'homoglyph', 'embedded' hoặc 'typo'
+    distance: int   # Khoảng cách chỉnh sửa sau khi quy đổi ký tự
+
+
+class LookalikeIndex:
+    """
+    Chỉ mục phát hiện domain giả mạo thương hiệu, dựng sẵn một lần khi tải quy tắc.
+
+    Gồm ba cấu trúc trên tên thương hiệu đã quy đổi ký tự dễ nhầm lẫn:
+    - map khóa đã quy đổi -> thương hiệu (g00gle, раypal Cyrillic...)
+    - bộ so khớp nhiều mẫu tìm tên thương hiệu nằm trong tên miền khác (paypal-secure)
+    - lân cận xóa ký tự (kiểu SymSpell) cho lỗi chính tả với khoảng cách chỉnh sửa <= 2
+
+    Chi phí một lần kiểm tra chỉ phụ thuộc độ dài domain, không phụ thuộc số
+    thương hiệu được bảo vệ.
+    """
+
+    def __init__(self, brand_domains: Iterable[str]):
+        """
+        Args:
+            brand_domains: Các domain thương hiệu/đối tác cần bảo vệ (ví dụ "paypal.com")
+        """
+        brand_domains = [normalize_domain(d) for d in brand_domains]
+        self.brand_domains = DomainIndex(brand_domains)
+        self._keys: Dict[str, Set[str]] = {}
+        self._deletions: Dict[str, Set[str]] = {}
+
+        for brand in set(brand_domains):
+            labels = registrable_labels(brand)
+            if not labels:
+                continue
+            key = fold_homoglyphs(labels[-1])
+            self._keys.setdefault(key, set()).add(brand)
+            for variant in deletions(key, max_distance(len(key))):
+                self._deletions.setdefault(variant, set()).add(key)
+
+        self._max_key_length = max((len(key) for key in self._keys), default=0)
+        self._embedded = KeywordMatcher({
+            'brands': [key for key in self._keys if len(key) >= MIN_EMBEDDED_LENGTH]
+        })
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def match(self, domain: str) -> Optional[LookalikeMatch]:
+        """
+        Kiểm tra domain có giả mạo một thương hiệu được bảo vệ hay không
+
+        Args:
+            domain: Domain người gửi
+
+        Returns:
+            LookalikeMatch nếu domain giống một thương hiệu mà không thuộc thương hiệu đó,
+            ngược lại là None
+        """
+        domain = normalize_domain(domain)
+        if not domain or self.brand_domains.match(domain):
+            return None
+
+        labels = []
+        for label in registrable_labels(domain):
+            if label.startswith('xn--'):
+                try:
+                    label = label.encode('ascii').decode('idna')
+                except UnicodeError:
+                    pass
+            labels.append(label)
+
+        tokens = []
+        for label in labels:
+            tokens.append(label)
+            if '-' in label:
+                tokens.extend(part for part in label.split('-') if part)
+                tokens.append(label.replace('-', ''))
+
+        for token in tokens:
+            key = fold_homoglyphs(token)
+            brands = self._keys.get(key)
+            if brands:
+                # So với tên gốc của thương hiệu: bản thân tên có thể chứa ký tự bị quy đổi (i -> l)
+                kind = 'brand' if any(registrable_labels(brand)[-1] == token for brand in brands) else 'homoglyph'
+                return LookalikeMatch(min(brands), token, kind, 0)
+
+        for token in tokens:
+            key = fold_homoglyphs(token)
+            hits = self._embedded.scan(key, normalized=True)['brands']
+            if hits.count:
+                brand_key = max(hits.terms, key=len)
+                return LookalikeMatch(min(self._keys[brand_key]), token, 'embedded', 0)
+
+        for token in tokens:
+            key = fold_homoglyphs(token)
+            if len(key) < 5 or len(key) > self._max_key_length + 2:
+                # Không thương hiệu nào nằm trong khoảng cách chỉnh sửa cho phép
+                continue
+            # Trả về thương hiệu gần nhất: tìm thương hiệu cách một lần sửa trước (chỉ
+            # cần xóa một ký tự của token), rồi mới đến các thương hiệu cách hai lần sửa
+            for depth in (1, 2) if len(key) >= 8 else (1,):
+                best = None
+                candidates = set()
+                for variant in deletions(key, depth):
+                    candidates.update(self._deletions.get(variant, ()))
+                for brand_key in candidates:
+                    limit = min(max_distance(len(brand_key)), depth)
+                    distance = edit_distance(key, brand_key, limit)
+                    if distance <= limit and (best is None or (distance, brand_key) < best):
+                        best = (distance, brand_key)
+                if best is not None:
+                    return LookalikeMatch(min(self._keys[best[1]]), token, 'typo', best[0])
+        return None
@@ -0,0 +1,328 @@
+import imaplib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from services.email_analyzer import EmailAnalyzer
+from services.imap_sync import sync_folder
+from utils.email_monitor import EmailMonitor
+
+logger = logging.getLogger(__name__)
+
+
+class ImapAccount(NamedTuple):
+    """Một hộp thư cần theo dõi"""
+    email: str
+    password: str
+    server: str = "imap.gmail.com"
+    port: int = 993
+    use_ssl: bool = True
+    folders: Tuple[str, ...] = ("INBOX",)
+
+
+def load_accounts(path: str) -> List[ImapAccount]:
+    """
+    Đọc danh sách hộp thư từ file JSON: một mảng các object có email, password và
+    tùy chọn server, port, use_ssl, folders
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        items = json.load(f)
+    accounts = []
+    for item in items:
+        item = dict(item)
+        item['folders'] = tuple(item.get('folders') or ("INBOX",))
+        accounts.append(ImapAccount(**item))
+    return accounts
+
+
+def accounts_from_env() -> List[ImapAccount]:
+    """Các hộp thư trong IMAP_ACCOUNTS_FILE, hoặc hộp thư duy nhất cấu hình bằng IMAP_EMAIL"""
+    path = os.getenv("IMAP_ACCOUNTS_FILE", "")
+    if path:
+        return load_accounts(path)
+    if os.getenv("IMAP_EMAIL"):
+        return [ImapAccount(
+            os.getenv("IMAP_EMAIL", ""),
+            os.getenv("IMAP_PASSWORD", ""),
+            server=os.getenv("IMAP_SERVER", "imap.gmail.com"),
+            port=int(os.getenv("IMAP_PORT", "993")),
+            use_ssl=os.getenv("IMAP_USE_SSL", "True").lower() == "true",
+            folders=(os.getenv("IMAP_FOLDER", "INBOX"),),
+        )]
+    return []
+
+
+class AccountHealth:
+    """Tình trạng đồng bộ của một hộp thư"""
+
+    def __init__(self):
+        self.status = 'pending'  # pending, ok, degraded (không lưu được email) hoặc error
+        self.consecutive_failures = 0
+        self.last_success: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.fetched = 0
+        self.inserted = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "consecutive_failures": self.consecutive_failures,
+            "last_success": self.last_success.isoformat() if self.last_success else None,
+            "last_error": self.last_error,
+            "fetched": self.fetched,
+            "inserted": self.inserted,
+        }
+
+
+class _Task(NamedTuple):
+    due: float
+    seq: int
+    account: ImapAccount
+    folder: str
+
+
+class MailboxMonitorService:
+    """
+    Dịch vụ theo dõi nhiều hộp thư và thư mục với số kết nối IMAP giới hạn.
+
+    Mỗi thư mục là một tác vụ đồng bộ tăng dần (services.imap_sync.sync_folder) được
+    lên lịch lại sau poll_interval giây. max_connections thread worker lấy tác vụ đến
+    hạn sớm nhất (cùng hạn thì tác vụ chờ lâu hơn trước), nên khi quá tải mọi hộp thư
+    bị trễ như nhau thay vì có hộp thư bị bỏ đói. Một hộp thư chỉ được đồng bộ bởi
+    một worker tại một thời điểm.
+
+    Kết nối đã đăng nhập được giữ lại để dùng cho lần đồng bộ sau; tổng số kết nối
+    mở không vượt quá max_connections và số kết nối tới mỗi server không vượt quá
+    max_connections_per_server, kết nối rảnh lâu nhất bị đóng khi cần chỗ. Hộp thư
+    lỗi liên tiếp (lỗi IMAP hoặc không lưu được email) được thử lại sau 1, 2, 4...
+    giây, tối đa max_backoff giây.
+    """
+
+    def __init__(self, accounts: Sequence[ImapAccount], analyzer: EmailAnalyzer,
+                 session_factory: Callable[[], Session], max_connections: int = 20,
+                 max_connections_per_server: int = 10, poll_interval: float = 60.0,
+                 max_backoff: float = 300.0, limit: int = 500, fetch_batch_size: int = 100,
+                 max_part_bytes: int = 262144):
+        self.analyzer = analyzer
+        self.session_factory = session_factory
+        self.max_connections = max_connections
+        self.max_connections_per_server = max_connections_per_server
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.limit = limit
+        self.fetch_batch_size = fetch_batch_size
+        self.max_part_bytes = max_part_bytes
+        self.health: Dict[str, AccountHealth] = {account.email: AccountHealth() for account in accounts}
+
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._seq = 0
+        self._tasks: List[_Task] = []
+        self._busy = set()
+        # Kết nối rảnh theo hộp thư, theo thứ tự dùng gần nhất
+        self._idle: 'OrderedDict[str, EmailMonitor]' = OrderedDict()
+        self._open_per_server: Counter = Counter()
+        self._open_total = 0
+        now = time.monotonic()
+        for account in accounts:
+            for folder in account.folders:
+                self._schedule(account, folder, now)
+
+    @classmethod
+    def from_env(cls, analyzer: EmailAnalyzer, session_factory: Callable[[], Session]) -> 'MailboxMonitorService':
+        return cls(
+            accounts_from_env(), analyzer, session_factory,
+            max_connections=int(os.getenv("IMAP_MAX_CONNECTIONS", "20")),
+            max_connections_per_server=int(os.getenv("IMAP_MAX_CONNECTIONS_PER_SERVER", "10")),
+            poll_interval=float(os.getenv("IMAP_POLL_INTERVAL", "60")),
+            max_backoff=float(os.getenv("IMAP_MAX_BACKOFF", "300")),
+            limit=int(os.getenv("IMAP_SYNC_LIMIT", "500")),
+            max_part_bytes=int(os.getenv("IMAP_MAX_PART_BYTES", "262144")),
+        )
+
+    def start(self):
+        """Khởi động các thread worker"""
+        if self._threads:
+            return
+        self._stop.clear()
+        for index in range(self.max_connections):
+            thread = threading.Thread(target=self._work, name=f"imap-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 30.0):
+        """Dừng các worker sau lần đồng bộ đang chạy và đóng các kết nối"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        with self._cond:
+            idle, self._idle = list(self._idle.values()), OrderedDict()
+        for monitor in idle:
+            monitor.disconnect()
+
+    def health_report(self) -> Dict[str, Dict[str, Any]]:
+        with self._cond:
+            return {email: health.as_dict() for email, health in self.health.items()}
+
+    def _schedule(self, account: ImapAccount, folder: str, due: float):
+        self._seq += 1
+        self._tasks.append(_Task(due, self._seq, account, folder))
+
+    def _reserve(self, account: ImapAccount) -> Optional[Tuple[Optional[EmailMonitor], Optional[EmailMonitor]]]:
+        """
+        Giữ một kết nối cho hộp thư (gọi khi đang giữ _cond)
+
+        Returns:
+            (kết nối rảnh của hộp thư hoặc None để mở mới, kết nối bị đóng để lấy chỗ),
+            None nếu không còn chỗ
+        """
+        monitor = self._idle.pop(account.email, None)
+        if monitor is not None:
+            return monitor, None
+        server_full = self._open_per_server[account.server] >= self.max_connections_per_server
+        if not server_full and self._open_total < self.max_connections:
+            self._open_per_server[account.server] += 1
+            self._open_total += 1
+            return None, None
+        # Đóng kết nối rảnh lâu nhất (cùng server nếu server đã đủ kết nối)
+        for email, candidate in self._idle.items():
+            if not server_full or candidate.imap_server == account.server:
+                del self._idle[email]
+                self._open_per_server[candidate.imap_server] -= 1
+                self._open_per_server[account.server] += 1
+                return None, candidate
+        return None
+
+    def _next_task(self) -> Optional[Tuple[_Task, Optional[EmailMonitor], Optional[EmailMonitor]]]:
+        with self._cond:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                for task in sorted(self._tasks):
+                    if task.due > now:
+                        break
+                    if task.account.email in self._busy:
+                        continue
+                    reserved = self._reserve(task.account)
+                    if reserved is None:
+                        continue
+                    self._tasks.remove(task)
+                    self._busy.add(task.account.email)
+                    return (task,) + reserved
+                upcoming = [task.due for task in self._tasks if task.due > now]
+                self._cond.wait(min(upcoming) - now if upcoming else None)
+        return None
+
+    def _connect(self, account: ImapAccount) -> EmailMonitor:
+        return EmailMonitor(account.email, account.password, imap_server=account.server,
+                            imap_port=account.port, use_ssl=account.use_ssl,
+                            fetch_batch_size=self.fetch_batch_size, max_part_bytes=self.max_part_bytes)
+
+    def _sync(self, task: _Task, monitor: EmailMonitor, reused: bool) -> Dict[str, Any]:
+        db = self.session_factory()
+        try:
+            try:
+                return sync_folder(db, self.analyzer, monitor, task.folder, self.limit)
+            except (imaplib.IMAP4.error, OSError):
+                if not reused:
+                    raise
+                # Kết nối rảnh có thể đã bị server đóng: thử lại với kết nối mới
+                monitor.disconnect()
+                return sync_folder(db, self.analyzer, monitor, task.folder, self.limit)
+        finally:
+            db.close()
+
+    def _work(self):
+        while True:
+            reserved = self._next_task()
+            if reserved is None:
+                return
+            task, monitor, evicted = reserved
+            if evicted is not None:
+                evicted.disconnect()
+            reused = monitor is not None
+            monitor = monitor or self._connect(task.account)
+
+            error = None
+            result = None
+            try:
+                result = self._sync(task, monitor, reused)
+            except Exception as e:
+                error = e
+                if not isinstance(e, (imaplib.IMAP4.error, OSError)):
+                    logger.exception(f"Lỗi khi đồng bộ {task.account.email}/{task.folder}")
+                monitor.disconnect()
+            self._finish(task, monitor, result, error)
+
+    def _finish(self, task: _Task, monitor: EmailMonitor, result: Optional[Dict[str, Any]],
+                error: Optional[Exception]):
+        now = time.monotonic()
+        with self._cond:
+            health = self.health[task.account.email]
+            self._busy.discard(task.account.email)
+            if monitor.connected:
+                self._idle[task.account.email] = monitor
+            else:
+                self._open_per_server[task.account.server] -= 1
+                self._open_total -= 1
+
+            if result is not None:
+                health.fetched += result["fetched"]
+                health.inserted += result["inserted"]
+            if error is None and not result["failed"]:
+                health.status = 'ok'
+                health.consecutive_failures = 0
+                health.last_success = datetime.now()
+                # Còn email chưa lấy hết (limit): đưa lại vào hàng đợi ngay, sau các tác vụ đang chờ
+                more = self.limit and result["fetched"] >= self.limit
+                self._schedule(task.account, task.folder, now if more else now + self.poll_interval)
+            else:
+                # Lỗi IMAP hoặc không lưu được một số email: thử lại sau thời gian chờ tăng dần
+                health.consecutive_failures += 1
+                if error is None:
+                    health.status = 'degraded'
+                    health.last_error = f"Không lưu được {result['failed']} email"
+                else:
+                    health.status = 'error'
+                    health.last_error = str(error)
+                backoff = min(2.0 ** (health.consecutive_failures - 1), self.max_backoff)
+                logger.warning(f"Lỗi đồng bộ {task.account.email}/{task.folder}: {health.last_error}, "
+                               f"thử lại sau {backoff:.0f} giây")
+                self._schedule(task.account, task.folder, now + backoff)
+            self._cond.notify_all()
+
+    def run(self, stop: threading.Event, report_interval: float = 300.0):
+        """Chạy dịch vụ cho đến khi stop được đặt, ghi log tình trạng các hộp thư định kỳ"""
+        self.start()
+        try:
+            while not stop.wait(report_interval):
+                statuses = Counter(health["status"] for health in self.health_report().values())
+                logger.info(f"Tình trạng hộp thư: {dict(statuses)}, "
+                            f"{self._open_total}/{self.max_connections} kết nối")
+        finally:
+            self.stop()
+
+
+if __name__ == "__main__":
+    # Theo dõi các hộp thư trong IMAP_ACCOUNTS_FILE: python -m services.mailbox_monitor
+    import signal
+
+    from database.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    service = MailboxMonitorService.from_env(EmailAnalyzer(), SessionLocal)
+    logger.info(f"Theo dõi {len(service.health)} hộp thư với tối đa {service.max_connections} kết nối")
+    service.run(stop_event)
@@ -0,0 +1,290 @@
+import logging
+import os
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from models.email import Email
+from models.email_body import EmailBody
+from models.email_stats import EmailDailyStat
+
+logger = logging.getLogger(__name__)
+
+# Các bảng được phân vùng theo tháng của received_time
+PARTITIONED_TABLES = ('incoming_emails', 'email_bodies')
+
+PARTITION_NAME = re.compile(r'^p(\d{4})(\d{2})$')
+
+
+def partitioning_enabled() -> bool:
+    return os.getenv("EMAIL_PARTITIONING", "False").lower() == "true"
+
+
+def retention_months() -> int:
+    """Số tháng email được giữ lại (0 = giữ vĩnh viễn)"""
+    return int(os.getenv("EMAIL_RETENTION_MONTHS", "0"))
+
+
+def _month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_definition(month: date) -> str:
+    return (f"PARTITION p{month:%Y%m} VALUES LESS THAN "
+            f"(TO_DAYS('{_add_months(month, 1).isoformat()}'))")
+
+
+def _months(first: date, last: date) -> List[date]:
+    months = []
+    month = first
+    while month <= last:
+        months.append(month)
+        month = _add_months(month, 1)
+    return months
+
+
+def _partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def list_partitions(connection: Connection, table: str) -> List[str]:
+    """Tên các phân vùng của bảng (MySQL), danh sách rỗng nếu bảng chưa được phân vùng"""
+    rows = connection.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"table": table})
+    return [name for (name,) in rows]
+
+
+def is_partitioned(connection: Connection, table: str) -> bool:
+    return connection.dialect.name == 'mysql' and bool(list_partitions(connection, table))
+
+
+def widened_index_name(name: str) -> str:
+    """Tên chỉ mục UNIQUE thay thế (thêm received_time) khi bảng được phân vùng"""
+    return f"{name}_received_time"
+
+
+def _convert(connection: Connection, table: str, last: date):
+    """Chuyển một bảng chưa phân vùng sang phân vùng RANGE theo tháng"""
+    inspector = inspect(connection)
+
+    # MySQL yêu cầu khóa chính và mọi chỉ mục UNIQUE chứa cột phân vùng
+    primary_key = inspector.get_pk_constraint(table)['constrained_columns']
+    if 'received_time' not in primary_key:
+        columns = ', '.join(primary_key + ['received_time'])
+        connection.execute(text(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY ({columns})"))
+    for index in inspector.get_indexes(table):
+        if index.get('unique') and 'received_time' not in index['column_names']:
+            # Chỉ còn duy nhất theo (các cột, received_time): ví dụ cùng Message-ID với
+            # thời gian nhận khác nhau không còn bị database chặn
+            widened = widened_index_name(index['name'])
+            columns = ', '.join(index['column_names'] + ['received_time'])
+            logger.warning(f"Thay chỉ mục UNIQUE {index['name']} bằng {widened} ({columns})")
+            connection.execute(text(
+                f"ALTER TABLE {table} DROP INDEX {index['name']}, ADD UNIQUE INDEX {widened} ({columns})"
+            ))
+
+    oldest = connection.execute(text(f"SELECT MIN(received_time) FROM {table}")).scalar()
+    first = _month_start(oldest.date() if oldest is not None else date.today())
+    definitions = [_partition_definition(month) for month in _months(first, last)]
+    definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    logger.info(f"Phân vùng bảng {table} theo tháng từ {first:%Y-%m} đến {last:%Y-%m}")
+    connection.execute(text(
+        f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS(received_time)) ({', '.join(definitions)})"
+    ))
+
+
+def _extend(connection: Connection, table: str, partitions: List[str], last: date):
+    """Tạo trước các phân vùng cho các tháng sắp tới bằng cách tách phân vùng pmax"""
+    months = [month for month in map(_partition_month, partitions) if month is not None]
+    first = _add_months(max(months), 1) if months else _month_start(date.today())
+    definitions = [_partition_definition(month) for month in _months(first, last)]
+    if not definitions:
+        return
+    logger.info(f"Thêm {len(definitions)} phân vùng cho bảng {table}")
+    if 'pmax' in partitions:
+        definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        connection.execute(text(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({', '.join(definitions)})"))
+    else:
+        connection.execute(text(f"ALTER TABLE {table} ADD PARTITION ({', '.join(definitions)})"))
+
+
+def ensure_partitions(engine: Engine, months_ahead: Optional[int] = None) -> bool:
+    """
+    Phân vùng incoming_emails và email_bodies theo tháng của received_time (chỉ MySQL)
+
+    Bảng chưa phân vùng được chuyển đổi (khóa chính đổi thành (id, received_time),
+    chỉ mục UNIQUE được thêm received_time, xem widened_index_name);
+    với bảng lớn đây là một lệnh ALTER TABLE chạy lâu, nên thực hiện trong giờ bảo
+    trì. Bảng đã phân vùng được tạo thêm phân vùng cho months_ahead tháng tới.
+
+    Returns:
+        True nếu database hỗ trợ phân vùng
+    """
+    if engine.dialect.name != 'mysql':
+        logger.info("Chỉ MySQL hỗ trợ phân vùng bảng, bỏ qua")
+        return False
+    if months_ahead is None:
+        months_ahead = int(os.getenv("EMAIL_PARTITION_MONTHS_AHEAD", "3"))
+    last = _add_months(_month_start(date.today()), months_ahead)
+    with engine.begin() as connection:
+        for table in PARTITIONED_TABLES:
+            partitions = list_partitions(connection, table)
+            if partitions:
+                _extend(connection, table, partitions, last)
+            else:
+                _convert(connection, table, last)
+    return True
+
+
+def _drop_partitions(connection: Connection, table: str, cutoff: date, archive: bool) -> Tuple[int, int]:
+    """Bỏ các phân vùng cũ hơn cutoff; với archive, dữ liệu được chuyển sang bảng lưu trữ riêng"""
+    old = [name for name in list_partitions(connection, table)
+           if (_partition_month(name) or cutoff) < cutoff]
+    rows = 0
+    for name in old:
+        rows += connection.execute(text(f"SELECT COUNT(*) FROM {table} PARTITION ({name})")).scalar()
+        if archive:
+            # Đổi phân vùng với một bảng rỗng cùng cấu trúc: chỉ thay metadata, không sao chép dữ liệu
+            archive_table = f"{table}_archive_{name}"
+            if not inspect(connection).has_table(archive_table):
+                connection.execute(text(f"CREATE TABLE {archive_table} LIKE {table}"))
+                connection.execute(text(f"ALTER TABLE {archive_table} REMOVE PARTITIONING"))
+            connection.execute(text(f"ALTER TABLE {table} EXCHANGE PARTITION {name} WITH TABLE {archive_table}"))
+    if old:
+        connection.execute(text(f"ALTER TABLE {table} DROP PARTITION {', '.join(old)}"))
+    return len(old), rows
+
+
+def sync_archive_columns(connection: Connection, table: str) -> List[str]:
+    """
+    Thêm vào <bảng>_archive các cột mà bảng đang dùng có thêm sau khi bảng lưu trữ
+    được tạo (upgrade_schema thêm cột mới vào bảng đang dùng)
+
+    Returns:
+        Tên các cột của bảng đang dùng
+    """
+    inspector = inspect(connection)
+    columns = inspector.get_columns(table)
+    archived = {column['name'] for column in inspector.get_columns(f"{table}_archive")}
+    for column in columns:
+        if column['name'] not in archived:
+            column_type = column['type'].compile(dialect=connection.dialect)
+            logger.info(f"Thêm cột {table}_archive.{column['name']} {column_type}")
+            connection.execute(text(f"ALTER TABLE {table}_archive ADD COLUMN {column['name']} {column_type} NULL"))
+    return [column['name'] for column in columns]
+
+
+def upgrade_archive_tables(engine: Engine):
+    """Đưa các bảng <bảng>_archive đã có về đủ cột của bảng đang dùng"""
+    with engine.begin() as connection:
+        for table in PARTITIONED_TABLES:
+            if inspect(connection).has_table(f"{table}_archive"):
+                sync_archive_columns(connection, table)
+
+
+def _delete_before(db: Session, cutoff: datetime, archive: bool, chunk_size: int) -> int:
+    """Xóa (và lưu trữ) email cũ hơn cutoff theo từng lô, dùng khi bảng không được phân vùng"""
+    # Danh sách cột tường minh: bảng lưu trữ có thể có thứ tự cột khác bảng đang dùng
+    columns: Dict[str, str] = {}
+    if archive:
+        for table in PARTITIONED_TABLES:
+            db.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_archive AS SELECT * FROM {table} WHERE 1 = 0"))
+            columns[table] = ', '.join(sync_archive_columns(db.connection(), table))
+        db.commit()
+    removed = 0
+    while True:
+        rows = db.query(Email.id, Email.received_time).filter(
+            Email.received_time < cutoff
+        ).order_by(Email.received_time).limit(chunk_size).all()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        params = {"ids": ids}
+        try:
+            if archive:
+                for table, key in (('incoming_emails', 'id'), ('email_bodies', 'email_id')):
+                    db.execute(text(
+                        f"INSERT INTO {table}_archive ({columns[table]}) SELECT {columns[table]} FROM {table} "
+                        f"WHERE {key} IN :ids"
+                    ).bindparams(bindparam("ids", expanding=True)), params)
+            db.query(EmailBody).filter(EmailBody.email_id.in_(ids)).delete(synchronize_session=False)
+            db.query(Email).filter(Email.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        removed += len(ids)
+    return removed
+
+
+def apply_retention(engine: Engine, db: Session, months: Optional[int] = None,
+                    mode: Optional[str] = None, chunk_size: int = 1000) -> Dict[str, Any]:
+    """
+    Bỏ các email nhận trước tháng thứ `months` tính từ tháng hiện tại
+
+    Trên MySQL đã phân vùng, cả phân vùng cũ bị bỏ bằng DROP PARTITION (với mode
+    archive, phân vùng được EXCHANGE sang bảng <bảng>_archive_pYYYYMM trước); các
+    database khác xóa theo từng lô (archive sao chép sang <bảng>_archive trước).
+    Bảng email_daily_stats được cắt theo cùng mốc để thống kê khớp với dữ liệu còn lại.
+
+    Args:
+        engine: Engine kết nối database
+        db: Session database
+        months: Số tháng giữ lại, mặc định theo EMAIL_RETENTION_MONTHS (0 = không làm gì)
+        mode: archive hoặc drop, mặc định theo EMAIL_RETENTION_MODE
+
+    Returns:
+        Dict gồm mốc thời gian, số email và số phân vùng đã bỏ
+    """
+    months = retention_months() if months is None else months
+    mode = (mode or os.getenv("EMAIL_RETENTION_MODE", "archive")).lower()
+    if months <= 0:
+        return {"cutoff": None, "emails_removed": 0, "partitions_dropped": 0, "mode": mode}
+
+    cutoff = _add_months(_month_start(date.today()), -months)
+    archive = mode == "archive"
+    partitions_dropped = 0
+    removed = 0
+    if engine.dialect.name == 'mysql':
+        with engine.begin() as connection:
+            for table in PARTITIONED_TABLES:
+                if not list_partitions(connection, table):
+                    continue
+                dropped, rows = _drop_partitions(connection, table, cutoff, archive)
+                partitions_dropped += dropped
+                if table == Email.__tablename__:
+                    removed += rows
+    # Phần còn lại (bảng chưa phân vùng hoặc phân vùng không theo tên pYYYYMM)
+    removed += _delete_before(db, datetime.combine(cutoff, datetime.min.time()), archive, chunk_size)
+
+    db.query(EmailDailyStat).filter(EmailDailyStat.day < cutoff).delete(synchronize_session=False)
+    db.commit()
+    logger.info(f"Đã bỏ {removed} email nhận trước {cutoff} ({partitions_dropped} phân vùng, mode {mode})")
+    return {"cutoff": cutoff.isoformat(), "emails_removed": removed,
+            "partitions_dropped": partitions_dropped, "mode": mode}
+
+
+if __name__ == "__main__":
+    # Phân vùng bảng và áp dụng chính sách lưu giữ: python -m services.partitions
+    from database.session import SessionLocal, engine
+
+    logging.basicConfig(level=logging.INFO)
+    ensure_partitions(engine)
+    session = SessionLocal()
+    try:
+        print(apply_retention(engine, session))
+    finally:
+        session.close()
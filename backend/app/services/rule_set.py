@@ -0,0 +1,290 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.domain_index import DomainIndex, load_feeds, read_domain_list
+from services.keyword_matcher import KeywordMatcher
+from services.lookalike_index import LookalikeIndex
+from utils.lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Bộ quy tắc mặc định, dùng khi không có nguồn quy tắc nào khác
+# hoặc để bổ sung các khóa còn thiếu trong file/bản ghi quy tắc
+DEFAULT_RULES: Dict[str, Any] = {
+    # Các domain phishing phổ biến
+    'phishing_domains': [
+        'secure-banking.com', 'account-verify.net', 'login-secure-portal.com',
+        'my-account-verify.com', 'secure-login-info.com', 'verification-account.com',
+        'paypal-secure.com', 'facebook-security.com', 'apple-id-secure.com',
+        'bank-secure-login.com', 'verify-account-now.com', 'secure-verify.xyz'
+    ],
+    
+    # Các domain hợp pháp
+    'legitimate_domains': [
+        'google.com', 'facebook.com', 'microsoft.com', 'apple.com',
+        'amazon.com', 'paypal.com', 'netflix.com', 'gmail.com',
+        'outlook.com', 'yahoo.com', 'spotify.com', 'linkedin.com'
+    ],
+    
+    # Từ khóa spam tiếng Việt và tiếng Anh
+    'spam_words': [
+        'free', 'miễn phí', 'urgent', 'khẩn cấp', 'lottery', 'xổ số', 'winner', 'trúng thưởng',
+        'million dollar', 'triệu đô', 'limited time', 'viagra', 'enlarge', 'cheap', 'rẻ', 
+        'discount', 'giảm giá', 'cash', 'tiền mặt', 'offer', 'ưu đãi', 'exclusive', 'độc quyền',
+        'congratulation', 'chúc mừng', 'prize', 'giải thưởng', 'win', 'chiến thắng',
+        'free money', 'tiền miễn phí', 'best offer', 'ưu đãi tốt nhất', 'best price', 'giá tốt nhất',
+        'act now', 'hành động ngay', 'limited offer', 'ưu đãi có hạn', 'only today', 'chỉ hôm nay',
+        'call now', 'gọi ngay', 'click here', 'nhấp vào đây', 'click below', 'nhấp vào bên dưới',
+        'unbelievable', 'không thể tin được', 'incredible', 'không thể tin', 'amazing', 'tuyệt vời',
+        'guarantee', 'đảm bảo', '100% free', '100% miễn phí', 'no cost', 'không tốn phí'
+    ],
+    
+    # Các cụm từ phishing phổ biến tiếng Việt và tiếng Anh
+    'phishing_phrases': [
+        'verify your account', 'xác minh tài khoản', 
+        'confirm your password', 'xác nhận mật khẩu',
+        'update your payment', 'cập nhật thanh toán', 
+        'unusual activity', 'hoạt động bất thường',
+        'suspicious login', 'đăng nhập đáng ngờ', 
+        'account suspended', 'tài khoản bị đình chỉ',
+        'click here to verify', 'nhấp vào đây để xác minh',
+        'login to update', 'đăng nhập để cập nhật',
+        'confirm your identity', 'xác nhận danh tính của bạn',
+        'security alert', 'cảnh báo bảo mật',
+        'account will be terminated', 'tài khoản sẽ bị chấm dứt',
+        'verify now or lose access', 'xác minh ngay hoặc mất quyền truy cập',
+        'unauthorized purchase', 'giao dịch không được ủy quyền',
+        'verify billing information', 'xác minh thông tin thanh toán',
+        'update required', 'yêu cầu cập nhật',
+        'account verification required', 'yêu cầu xác minh tài khoản',
+        'your account has been limited', 'tài khoản của bạn đã bị giới hạn',
+        'payment declined', 'thanh toán bị từ chối',
+        'problem with your account', 'vấn đề với tài khoản của bạn',
+        'click to recover account', 'nhấp để khôi phục tài khoản'
+    ],
+    
+    # Từ khóa khẩn cấp
+    'urgency_words': [
+        'urgent', 'khẩn cấp', 'immediately', 'ngay lập tức', 
+        'now', 'right now', 'ngay bây giờ', 'expiring', 'sắp hết hạn',
+        'today only', 'chỉ hôm nay', 'limited time', 'thời gian có hạn',
+        'deadline', 'hạn cuối', 'act fast', 'hành động nhanh',
+        'final notice', 'thông báo cuối cùng', 'last chance', 'cơ hội cuối',
+        'expires today', 'hết hạn hôm nay', 'don\'t delay', 'đừng trì hoãn',
+        'urgent action required', 'yêu cầu hành động khẩn cấp',
+        'time sensitive', 'nhạy cảm về thời gian',
+        'respond now', 'phản hồi ngay', 'immediate action', 'hành động ngay lập tức'
+    ],
+    
+    # TLDs đáng ngờ
+    'suspicious_tlds': ['.xyz', '.tk', '.ml', '.ga', '.cf', '.gq', '.top', '.icu', '.work', '.info'],
+    
+    # Các dịch vụ rút gọn URL
+    'url_shorteners': ['bit.ly', 'tinyurl.com', 'goo.gl', 't.co', 'is.gd', 'buff.ly', 'ow.ly', 'rebrand.ly', 'cutt.ly'],
+    
+    # Các domain thương hiệu/đối tác cần bảo vệ khỏi giả mạo
+    'protected_brands': [
+        'google.com', 'gmail.com', 'outlook.com', 'yahoo.com', 
+        'microsoft.com', 'facebook.com', 'apple.com', 'amazon.com',
+        'paypal.com', 'netflix.com'
+    ],
+}
+
+# Các khóa chứa danh sách trong một bộ quy tắc
+LIST_KEYS = tuple(DEFAULT_RULES)
+
+
+def _file_signature(paths: List[str]) -> List[Tuple[str, int, int]]:
+    """Đường dẫn, thời điểm sửa và kích thước của các file, bỏ qua file không tồn tại"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return signature
+
+
+def _split_paths(value: str) -> List[str]:
+    return [path.strip() for path in value.split(',') if path.strip()]
+
+
+def _feed_paths(rules: Dict[str, Any]) -> Tuple[List[str], List[str], str]:
+    """Các file bên ngoài mà bộ quy tắc tham chiếu, mặc định lấy từ biến môi trường"""
+    return (
+        list(rules.get('phishing_domain_feeds', _split_paths(os.getenv("PHISHING_DOMAIN_FEEDS", "")))),
+        list(rules.get('legitimate_domain_feeds', _split_paths(os.getenv("LEGITIMATE_DOMAIN_FEEDS", "")))),
+        rules.get('protected_brands_file', os.getenv("PROTECTED_BRANDS_FILE", "")),
+    )
+
+
+class RuleSet:
+    """
+    Ảnh chụp bất biến của một bộ quy tắc đã biên dịch (chỉ mục domain, bộ so khớp
+    từ khóa, chỉ mục giả mạo) kèm phiên bản và cache kết quả theo host riêng.
+
+    Một RuleSet không bao giờ bị sửa sau khi tạo: tải lại quy tắc nghĩa là dựng
+    RuleSet mới rồi thay tham chiếu, nên luồng phân tích chỉ cần đọc tham chiếu
+    một lần ở đầu mỗi lần gọi mà không cần khóa.
+    """
+
+    def __init__(self, rules: Dict[str, Any], version: Optional[str] = None):
+        """
+        Args:
+            rules: Dict quy tắc, các khóa còn thiếu lấy từ DEFAULT_RULES
+            version: Phiên bản khai báo bởi nguồn quy tắc, mặc định là mã băm nội dung
+        """
+        merged = {key: list(rules.get(key, DEFAULT_RULES[key])) for key in LIST_KEYS}
+        self.phishing_domain_feeds, self.legitimate_domain_feeds, self.protected_brands_file = _feed_paths(rules)
+
+        self.phishing_domains = tuple(merged['phishing_domains'])
+        self.legitimate_domains = tuple(merged['legitimate_domains'])
+        self.spam_words = tuple(merged['spam_words'])
+        self.phishing_phrases = tuple(merged['phishing_phrases'])
+        self.urgency_words = tuple(merged['urgency_words'])
+        self.suspicious_tlds = tuple(merged['suspicious_tlds'])
+        self.url_shorteners = tuple(merged['url_shorteners'])
+        brands = list(merged['protected_brands'])
+        if self.protected_brands_file:
+            brands.extend(read_domain_list(self.protected_brands_file))
+        self.protected_brands = tuple(brands)
+
+        # Chỉ mục domain tra cứu theo domain cha, kèm các feed blocklist lớn trên đĩa
+        # (file .idx tạo bởi `python -m services.domain_index`)
+        self.phishing_index = DomainIndex(self.phishing_domains, load_feeds(','.join(self.phishing_domain_feeds)))
+        self.legitimate_index = DomainIndex(self.legitimate_domains, load_feeds(','.join(self.legitimate_domain_feeds)))
+        self.suspicious_tld_index = DomainIndex(self.suspicious_tlds)
+        self.shortener_index = DomainIndex(self.url_shorteners)
+
+        # Chỉ mục phát hiện domain giả mạo (homoglyph, chứa tên thương hiệu, lỗi chính tả)
+        self.lookalike_index = LookalikeIndex(self.protected_brands + self.legitimate_domains)
+
+        # Biên dịch các nhóm từ khóa thành một bộ so khớp duy nhất
+        self.keyword_matcher = KeywordMatcher({
+            'spam': self.spam_words,
+            'phishing': self.phishing_phrases,
+            'urgency': self.urgency_words,
+        })
+
+        # Cache kết quả kiểm tra theo host, dùng chung cho check_link và _is_suspicious_url.
+        # Gắn với RuleSet nên tự động mất hiệu lực khi quy tắc thay đổi.
+        self.host_verdict_cache = LRUCache(int(os.getenv("HOST_VERDICT_CACHE_SIZE", "10000")))
+
+        # Dữ liệu gốc để dựng lại cùng bộ quy tắc trong process worker
+        self.source_rules = {**merged,
+                             'phishing_domain_feeds': self.phishing_domain_feeds,
+                             'legitimate_domain_feeds': self.legitimate_domain_feeds,
+                             'protected_brands_file': self.protected_brands_file}
+        self.fingerprint = self._compute_fingerprint()
+        self.version = version or self.fingerprint
+
+    def _compute_fingerprint(self) -> str:
+        """Mã băm nội dung quy tắc và các file feed, dùng làm khóa cache kết quả"""
+        payload = {
+            'rules': self.source_rules,
+            'files': _file_signature(self.phishing_domain_feeds + self.legitimate_domain_feeds
+                                     + ([self.protected_brands_file] if self.protected_brands_file else []))
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class RuleSource:
+    """
+    Nguồn quy tắc. current_version() phải rẻ vì được gọi định kỳ để phát hiện thay
+    đổi; fetch() chỉ được gọi khi phiên bản khác với lần tải trước.
+    """
+
+    def current_version(self) -> Optional[str]:
+        """Phiên bản hiện tại của nguồn (hoặc chữ ký thay đổi), None nếu không xác định"""
+        raise NotImplementedError
+
+    def fetch(self) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Trả về (dict quy tắc, phiên bản)"""
+        raise NotImplementedError
+
+
+class StaticRuleSource(RuleSource):
+    """Nguồn quy tắc cố định trong bộ nhớ (mặc định là DEFAULT_RULES)"""
+
+    def __init__(self, rules: Optional[Dict[str, Any]] = None, version: Optional[str] = None):
+        self.rules = copy.deepcopy(rules if rules is not None else DEFAULT_RULES)
+        self.version = version
+
+    def current_version(self) -> Optional[str]:
+        # Feed domain và file thương hiệu có thể được build lại trong khi chạy
+        phishing_feeds, legitimate_feeds, brands_file = _feed_paths(self.rules)
+        files = phishing_feeds + legitimate_feeds + ([brands_file] if brands_file else [])
+        return json.dumps([self.version, _file_signature(files)])
+
+    def fetch(self) -> Tuple[Dict[str, Any], Optional[str]]:
+        return copy.deepcopy(self.rules), self.version
+
+
+class FileRuleSource(RuleSource):
+    """
+    Quy tắc từ các file JSON có phiên bản trong một thư mục (ví dụ rules-0001.json,
+    rules-0002.json). File có tên lớn nhất theo thứ tự từ điển là phiên bản đang dùng;
+    phiên bản lấy từ khóa "version" trong file, mặc định là tên file.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _latest_file(self) -> Optional[str]:
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith('.json'))
+        except OSError as e:
+            logger.warning(f"Không thể đọc thư mục quy tắc {self.directory}: {str(e)}")
+            return None
+        return os.path.join(self.directory, names[-1]) if names else None
+
+    def current_version(self) -> Optional[str]:
+        path = self._latest_file()
+        return json.dumps(_file_signature([path])) if path else None
+
+    def fetch(self) -> Tuple[Dict[str, Any], Optional[str]]:
+        path = self._latest_file()
+        if path is None:
+            return copy.deepcopy(DEFAULT_RULES), None
+        with open(path, 'r', encoding='utf-8') as f:
+            rules = json.load(f)
+        version = rules.pop('version', None) or os.path.splitext(os.path.basename(path))[0]
+        return rules, str(version)
+
+
+class DatabaseRuleSource(RuleSource):
+    """Quy tắc từ bảng rule_sets: bản ghi đang kích hoạt có id lớn nhất được dùng"""
+
+    def __init__(self, session_factory: Callable, model):
+        """
+        Args:
+            session_factory: Hàm tạo session database (SessionLocal)
+            model: Model bảng quy tắc (models.rule_set.RuleSetRecord)
+        """
+        self.session_factory = session_factory
+        self.model = model
+
+    def _latest(self, *columns):
+        db = self.session_factory()
+        try:
+            return db.query(*columns).filter(self.model.is_active.is_(True)).order_by(
+                self.model.id.desc()
+            ).first()
+        finally:
+            db.close()
+
+    def current_version(self) -> Optional[str]:
+        row = self._latest(self.model.version)
+        return row.version if row else None
+
+    def fetch(self) -> Tuple[Dict[str, Any], Optional[str]]:
+        row = self._latest(self.model.version, self.model.rules)
+        if row is None:
+            return copy.deepcopy(DEFAULT_RULES), None
+        return dict(row.rules), row.version
@@ -0,0 +1,31 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+import anyio.to_thread
+
+# Executor riêng cho phân tích email (CPU), tách khỏi threadpool của các route truy cập
+# database để một email lớn không chiếm hết thread đang chờ database. Phân tích giữ GIL
+# nên thêm thread không tăng thông lượng đáng kể mà làm chậm event loop; mặc định một
+# thread, tăng thông lượng bằng cách chạy thêm worker uvicorn
+analysis_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ANALYSIS_THREADS", "1")), thread_name_prefix="analysis"
+)
+
+
+def configure_threadpool(size: int):
+    """
+    Đặt số thread tối đa của threadpool mà FastAPI dùng cho các route và dependency
+    đồng bộ (truy vấn database qua SessionLocal). Giới hạn gắn với event loop nên phải gọi từ
+    trong event loop, ví dụ trong sự kiện startup.
+    """
+    if size > 0:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = size
+
+
+async def run_analysis(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Chạy hàm phân tích trong analysis_executor mà không chặn event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(analysis_executor, partial(func, *args, **kwargs))
@@ -1,8 +1,22 @@
+import base64
+import binascii
+import codecs
 import imaplib
 import email
+import quopri
+import re
+import select
+import socket
+import ssl
+import threading
+import time
 from email.header import decode_header
+from email.message import Message
+from email.parser import BytesHeaderParser
 import datetime
-from typing import List, Dict, Any, Optional
+from collections import defaultdict
+from itertools import count
+from typing import List, Dict, Any, Iterator, NamedTuple, Optional, Sequence
 import logging
 
 # Cấu hình logging
@@ -10,6 +24,203 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+HEADER_PARSER = BytesHeaderParser()
+
+# Một token trong phản hồi FETCH: ngoặc, quoted string, literal {n} ở cuối phần
+# trước literal, hoặc atom (gồm cả tên mục như BODY[1.2]<0>)
+FETCH_TOKEN = re.compile(
+    rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|(\{\d+\})\s*$|([^\s()"\[\]]+(?:\[[^\]]*\](?:<\d+>)?)?))'
+)
+QUOTED_ESCAPE = re.compile(rb'\\(.)')
+# Số phần text tối đa lấy cho mỗi email
+MAX_TEXT_PARTS = 8
+# Phản hồi trong lúc IDLE báo có email mới
+IDLE_NEW_MAIL = re.compile(rb'^\* \d+ (EXISTS|RECENT)', re.IGNORECASE)
+# Thời gian chờ (giây) server xác nhận bắt đầu/kết thúc IDLE
+IDLE_RESPONSE_TIMEOUT = 30.0
+# Số thứ tự cho tag của lệnh IDLE
+_idle_tags = count(1)
+
+
+def _batches(values: Sequence[int], size: int) -> Iterator[Sequence[int]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _message_set(uids: Sequence[int]) -> str:
+    """Rút gọn danh sách UID thành message set IMAP, ví dụ [1, 2, 3, 7] thành 1:3,7"""
+    ranges = []
+    for uid in sorted(uids):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(low) if low == high else f"{low}:{high}" for low, high in ranges)
+
+
+_OPEN = object()
+_CLOSE = object()
+
+
+def _fetch_tokens(data: List[Any]) -> Iterator[Any]:
+    """
+    Token của phản hồi FETCH từ imaplib: _OPEN/_CLOSE cho ngoặc, bytes cho chuỗi
+    (quoted hoặc literal), str cho atom và None cho NIL
+
+    imaplib trả về mỗi literal dưới dạng tuple (phần trước literal, literal) và phần
+    còn lại của dòng dưới dạng bytes, nên một email có thể trải trên nhiều phần tử.
+    Literal được trả nguyên (không sao chép).
+    """
+    for part in data:
+        text, literal = (part[0], part[1]) if isinstance(part, tuple) else (part, None)
+        if not isinstance(text, bytes):
+            continue
+        position = 0
+        while position < len(text):
+            match = FETCH_TOKEN.match(text, position)
+            if match is None or match.end() == position:
+                break
+            position = match.end()
+            if match.group(1):
+                yield _OPEN
+            elif match.group(2):
+                yield _CLOSE
+            elif match.group(3) is not None:
+                yield QUOTED_ESCAPE.sub(rb'\1', match.group(3))
+            elif match.group(5):
+                atom = match.group(5).decode('ascii', 'replace')
+                yield None if atom.upper() == "NIL" else atom
+        if literal is not None:
+            yield literal
+
+
+def _parse_fetch(data: List[Any]) -> Dict[int, Dict[str, Any]]:
+    """
+    Gom phản hồi FETCH của imaplib theo UID
+
+    Danh sách trong ngoặc (ví dụ BODYSTRUCTURE) được trả về dạng list lồng nhau.
+
+    Returns:
+        Dict UID -> {"RFC822.SIZE": int, "BODY[...]": bytes, "BODYSTRUCTURE": list, ...}
+    """
+    messages = {}
+    stack: List[List[Any]] = []
+    for token in _fetch_tokens(data):
+        if token is _OPEN:
+            stack.append([])
+        elif token is _CLOSE:
+            if not stack:
+                continue
+            value = stack.pop()
+            if stack:
+                stack[-1].append(value)
+                continue
+            # Hết danh sách mục của một email: các cặp tên, giá trị
+            items = {str(name).upper(): item for name, item in zip(value[::2], value[1::2])}
+            for name in ("UID", "RFC822.SIZE"):
+                if name in items:
+                    try:
+                        items[name] = int(items[name])
+                    except (TypeError, ValueError):
+                        del items[name]
+            if "UID" in items:
+                messages[items["UID"]] = items
+        elif stack:
+            stack[-1].append(token)
+    return messages
+
+
+class TextPart(NamedTuple):
+    """Một phần text/plain hoặc text/html trong BODYSTRUCTURE"""
+    section: str
+    subtype: str
+    charset: str
+    encoding: str
+    size: int
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value or ""
+
+
+def _text_parts(structure: List[Any], section: str = "") -> List[TextPart]:
+    """
+    Các phần text/plain và text/html không phải file đính kèm, theo thứ tự trong email
+
+    Email đính kèm (message/rfc822) không được duyệt vào.
+
+    Raises:
+        IndexError, TypeError, ValueError: BODYSTRUCTURE không hợp lệ
+    """
+    if isinstance(structure[0], list):
+        # Multipart: các phần con đứng trước subtype và dữ liệu mở rộng
+        parts = []
+        for index, child in enumerate(structure, 1):
+            if not isinstance(child, list):
+                break
+            parts.extend(_text_parts(child, f"{section}.{index}" if section else str(index)))
+        return parts
+
+    maintype, subtype = _text(structure[0]).lower(), _text(structure[1]).lower()
+    if maintype != "text" or subtype not in ("plain", "html"):
+        return []
+    # Phần text: type subtype params id description encoding size lines md5 disposition ...
+    disposition = structure[9] if len(structure) > 9 else None
+    if isinstance(disposition, list) and disposition and _text(disposition[0]).lower() == "attachment":
+        return []
+    params = structure[2] if isinstance(structure[2], list) else []
+    charset = ""
+    for name, value in zip(params[::2], params[1::2]):
+        if _text(name).lower() == "charset":
+            charset = _text(value).strip().lower()
+    return [TextPart(section or "1", subtype, charset, _text(structure[5]).lower(), int(structure[6]))]
+
+
+def _decode_text(data: bytes, charset: str, truncated: bool = False) -> str:
+    """
+    Giải mã nội dung theo charset; charset không biết được thay bằng utf-8 và byte
+    lỗi được thay bằng U+FFFD. Với nội dung bị cắt, ký tự nhiều byte dở dang ở cuối bị bỏ.
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(charset or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    return decoder.decode(data, final=not truncated)
+
+
+def _decode_part(data: bytes, part: TextPart, truncated: bool) -> str:
+    """Giải mã transfer encoding (base64, quoted-printable) rồi charset của một phần text"""
+    if part.encoding == "base64":
+        data = re.sub(rb'[^A-Za-z0-9+/]', b'', data)
+        # Phần bị cắt: bỏ nhóm 4 ký tự dở dang; padding được thêm lại nếu thiếu
+        if truncated:
+            data = data[:len(data) - len(data) % 4]
+        try:
+            data = base64.b64decode(data + b'=' * (-len(data) % 4))
+        except (binascii.Error, ValueError):
+            data = b''
+    elif part.encoding == "quoted-printable":
+        if truncated:
+            data = re.sub(rb'=[0-9A-Fa-f]?$', b'', data)
+        data = quopri.decodestring(data)
+    return _decode_text(data, part.charset, truncated)
+
+
+class SyncCheckpoint(NamedTuple):
+    """Vị trí đồng bộ của một thư mục: UIDVALIDITY và UID lớn nhất đã lấy"""
+    uidvalidity: int
+    last_uid: int
+
+
+class SyncResult(NamedTuple):
+    """Kết quả một lần đồng bộ: email mới, checkpoint mới và có phải đồng bộ lại từ đầu không"""
+    emails: List[Dict[str, Any]]
+    checkpoint: SyncCheckpoint
+    full_resync: bool
+
+
 class EmailMonitor:
     """
     Lớp để theo dõi và lấy email từ server IMAP
@@ -18,11 +229,19 @@ class EmailMonitor:
                  email_address: str, 
                  password: str, 
                  imap_server: str = "imap.gmail.com",
-                 imap_port: int = 993):
+                 imap_port: int = 993,
+                 use_ssl: bool = True,
+                 fetch_batch_size: int = 100,
+                 max_part_bytes: int = 262144):
         self.email_address = email_address
         self.password = password
         self.imap_server = imap_server
         self.imap_port = imap_port
+        self.use_ssl = use_ssl
+        # Số email mỗi lệnh UID FETCH
+        self.fetch_batch_size = fetch_batch_size
+        # Số byte tối đa tải về cho mỗi phần text của email
+        self.max_part_bytes = max_part_bytes
         self._imap = None
 
     def connect(self) -> bool:
@@ -30,13 +249,18 @@ class EmailMonitor:
         Kết nối tới server IMAP
         """
         try:
-            self._imap = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
+            imap_class = imaplib.IMAP4_SSL if self.use_ssl else imaplib.IMAP4
+            self._imap = imap_class(self.imap_server, self.imap_port)
             self._imap.login(self.email_address, self.password)
             return True
         except Exception as e:
             logger.error(f"Lỗi kết nối IMAP: {str(e)}")
             return False
 
+    @property
+    def connected(self) -> bool:
+        return self._imap is not None
+
     def disconnect(self):
         """
         Ngắt kết nối khỏi server IMAP
@@ -49,18 +273,35 @@ class EmailMonitor:
             self._imap = None
 
     def get_emails(self, folder: str = "INBOX", limit: int = 10, 
-                   since_date: Optional[datetime.date] = None) -> List[Dict[str, Any]]:
+                   since_date: Optional[datetime.date] = None,
+                   include_body: bool = True) -> List[Dict[str, Any]]:
         """
         Lấy danh sách email từ một thư mục cụ thể
+
+        Email được tìm theo UID rồi lấy theo từng lô fetch_batch_size email, mỗi lô
+        một lệnh UID FETCH trên dải UID: trước hết header và kích thước, sau đó nội
+        dung (nếu include_body). Dùng BODY.PEEK nên email không bị đánh dấu đã đọc.
+
+        Args:
+            folder: Thư mục IMAP
+            limit: Số email mới nhất cần lấy (0 = tất cả)
+            since_date: Chỉ lấy email nhận từ ngày này
+            include_body: False để chỉ lấy header, sau đó gọi fetch_bodies cho các
+                email cần phân tích
+
+        Returns:
+            Danh sách email, mới nhất trước; "id" là UID của email trong thư mục
         """
         if not self._imap:
             if not self.connect():
                 return []
 
-        emails_data = []
         try:
             # Chọn thư mục
-            status, messages = self._imap.select(folder)
+            status, _ = self._imap.select(folder)
+            if status != "OK":
+                logger.warning(f"Không thể chọn thư mục {folder}: {status}")
+                return []
             
             # Tạo điều kiện tìm kiếm
             search_criteria = "ALL"
@@ -68,70 +309,335 @@ class EmailMonitor:
                 date_str = since_date.strftime("%d-%b-%Y")
                 search_criteria = f'(SINCE "{date_str}")'
             
-            # Tìm kiếm email
-            status, messages = self._imap.search(None, search_criteria)
-            if status != "OK":
-                logger.warning(f"Không thể tìm kiếm email: {status}")
-                return []
-            
-            # Lấy danh sách ID
-            email_ids = messages[0].split()
+            # Tìm kiếm email theo UID (không đổi giữa các phiên, khác số thứ tự)
+            uids = self._search_uids(search_criteria)
             
             # Giới hạn số lượng email
             if limit > 0:
-                email_ids = email_ids[-limit:]
+                uids = uids[-limit:]
             
-            # Lấy thông tin từng email
-            for e_id in reversed(email_ids):
-                status, msg_data = self._imap.fetch(e_id, "(RFC822)")
-                if status != "OK":
-                    continue
-                
-                # Parse email
-                msg = email.message_from_bytes(msg_data[0][1])
-                
-                # Lấy thông tin email
-                subject = self._decode_header(msg["Subject"])
-                from_addr = self._decode_header(msg["From"])
-                to_addr = self._decode_header(msg["To"])
-                date = self._decode_header(msg["Date"])
-                
-                # Lấy nội dung
-                body = ""
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        content_type = part.get_content_type()
-                        content_disposition = str(part.get("Content-Disposition"))
-                        
-                        # Chỉ lấy phần text
-                        if content_type == "text/plain" and "attachment" not in content_disposition:
-                            try:
-                                body = part.get_payload(decode=True).decode()
-                            except:
-                                pass
-                else:
-                    try:
-                        body = msg.get_payload(decode=True).decode()
-                    except:
-                        body = msg.get_payload()
-                
-                # Thêm vào danh sách kết quả
-                email_data = {
-                    "id": e_id.decode(),
-                    "subject": subject,
-                    "from": from_addr,
-                    "to": to_addr,
-                    "date": date,
-                    "body": body
-                }
-                emails_data.append(email_data)
-            
-            return emails_data
+            return self._fetch_messages(uids, include_body)
             
         except Exception as e:
             logger.error(f"Lỗi khi lấy email: {str(e)}")
             return []
 
+    def sync(self, folder: str = "INBOX", checkpoint: Optional[SyncCheckpoint] = None,
+             limit: int = 0, include_body: bool = True) -> SyncResult:
+        """
+        Lấy các email mới của thư mục kể từ checkpoint của lần đồng bộ trước
+
+        Khi chưa có checkpoint hoặc UIDVALIDITY của thư mục đã đổi (UID cũ không còn
+        giá trị), thư mục được đồng bộ lại từ đầu: lấy limit email mới nhất. Nếu không,
+        chỉ lấy các UID từ last_uid + 1; khi UIDNEXT trong phản hồi SELECT cho thấy
+        không có email mới, lần đồng bộ chỉ tốn một lệnh SELECT.
+
+        Args:
+            folder: Thư mục IMAP
+            checkpoint: Checkpoint trả về từ lần đồng bộ trước (None = lần đầu)
+            limit: Số email tối đa mỗi lần (0 = không giới hạn); khi đồng bộ tiếp, các
+                email cũ nhất được lấy trước và phần còn lại được lấy ở lần sau
+            include_body: Lấy cả nội dung email
+
+        Returns:
+            SyncResult; chỉ nên lưu checkpoint mới sau khi đã xử lý xong các email
+
+        Raises:
+            imaplib.IMAP4.error, OSError: Lỗi IMAP hoặc mất kết nối
+        """
+        if not self._imap and not self.connect():
+            raise ConnectionError(f"Không thể kết nối IMAP tới {self.imap_server}")
+
+        status, _ = self._imap.select(folder)
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"Không thể chọn thư mục {folder}: {status}")
+        uidvalidity = self._select_response("UIDVALIDITY") or 0
+        uidnext = self._select_response("UIDNEXT")
+        # Bỏ EXISTS của SELECT: EXISTS xuất hiện sau đó nghĩa là có email mới (xem idle)
+        self._imap.response("EXISTS")
+
+        full_resync = checkpoint is None or checkpoint.uidvalidity != uidvalidity
+        if full_resync:
+            if checkpoint is not None:
+                logger.warning(f"UIDVALIDITY của {self.email_address}/{folder} đã đổi, đồng bộ lại từ đầu")
+            uids = self._search_uids("ALL")
+            if limit > 0:
+                uids = uids[-limit:]
+            last_uid = max(uids, default=0)
+        else:
+            last_uid = checkpoint.last_uid
+            if uidnext is not None and uidnext <= last_uid + 1:
+                return SyncResult([], checkpoint, False)
+            # Dải n:* luôn chứa email có UID lớn nhất, kể cả khi UID đó nhỏ hơn n
+            uids = [uid for uid in self._search_uids(f"UID {last_uid + 1}:*") if uid > last_uid]
+            if limit > 0:
+                uids = uids[:limit]
+            last_uid = max(uids, default=last_uid)
+
+        emails_data = self._fetch_messages(uids, include_body)
+        return SyncResult(emails_data, SyncCheckpoint(uidvalidity, last_uid), full_resync)
+
+    def supports_idle(self) -> bool:
+        """Server có hỗ trợ lệnh IDLE (RFC 2177) không"""
+        return self._imap is not None and "IDLE" in self._imap.capabilities
+
+    def idle(self, timeout: float, stop: Optional[threading.Event] = None) -> bool:
+        """
+        Chờ server báo có email mới trong thư mục đang chọn bằng lệnh IDLE
+
+        imaplib (Python < 3.14) không hỗ trợ IDLE nên lệnh được gửi bằng imap.send và
+        phản hồi được đọc bằng imap.readline, qua cùng bộ đệm với các lệnh khác. Hàm
+        trả về khi có email mới, khi hết timeout (nên nhỏ hơn giới hạn 29 phút của
+        server để gửi lại IDLE kịp thời) hoặc khi stop được đặt; lệnh IDLE luôn được
+        kết thúc bằng DONE trước khi trả về.
+
+        Args:
+            timeout: Thời gian chờ tối đa (giây)
+            stop: Event để dừng chờ sớm
+
+        Returns:
+            True nếu server báo có email mới
+
+        Raises:
+            imaplib.IMAP4.abort, OSError: Mất kết nối
+        """
+        imap = self._imap
+        # Server đã báo email mới kèm phản hồi của các lệnh trước và sẽ không báo lại
+        _, exists = imap.response("EXISTS")
+        if exists[-1] is not None:
+            return True
+
+        # Tag của imaplib chỉ gồm các chữ A-P và chữ số nên không trùng với tag này
+        tag = b"IDLE%dZ" % next(_idle_tags)
+        imap.send(tag + b" IDLE\r\n")
+        line = self._read_idle_line(time.monotonic() + IDLE_RESPONSE_TIMEOUT)
+        if line is None or not line.startswith(b"+"):
+            raise imaplib.IMAP4.abort(f"Server không chấp nhận IDLE: {line!r}")
+
+        new_mail = False
+        deadline = time.monotonic() + timeout
+        while not new_mail:
+            line = self._read_idle_line(deadline, stop)
+            if line is None:
+                break
+            if line.startswith(b"* BYE"):
+                raise imaplib.IMAP4.abort(f"Server đóng kết nối: {line!r}")
+            new_mail = bool(IDLE_NEW_MAIL.match(line))
+
+        imap.send(b"DONE\r\n")
+        while True:
+            line = self._read_idle_line(time.monotonic() + IDLE_RESPONSE_TIMEOUT)
+            if line is None:
+                raise imaplib.IMAP4.abort("Không nhận được phản hồi cho DONE")
+            if line.startswith(tag + b" "):
+                if not line[len(tag) + 1:].upper().startswith(b"OK"):
+                    raise imaplib.IMAP4.error(f"IDLE lỗi: {line!r}")
+                return new_mail
+            new_mail = new_mail or bool(IDLE_NEW_MAIL.match(line))
+
+    def _buffered_response(self) -> Optional[bool]:
+        """
+        Có dữ liệu phản hồi để đọc ngay không (trong bộ đệm của imaplib hoặc socket)
+
+        Returns:
+            True nếu có, None nếu chưa có, False nếu server đã đóng kết nối
+        """
+        sock = self._imap.sock
+        # Socket SSL có thể còn dữ liệu đã giải mã mà select không thấy
+        pending = getattr(sock, "pending", None)
+        if pending and pending():
+            return True
+        readable = bool(select.select([sock], [], [], 0)[0])
+        previous = sock.gettimeout()
+        sock.settimeout(0.0)
+        try:
+            # peek không lấy dữ liệu ra khỏi bộ đệm; socket không chặn nên không chờ
+            data = self._imap.file.peek(1)
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return None
+        finally:
+            sock.settimeout(previous)
+        if data:
+            return True
+        # Socket báo có dữ liệu nhưng không đọc được byte nào: kết nối đã đóng
+        return False if readable else None
+
+    def _read_idle_line(self, deadline: float, stop: Optional[threading.Event] = None) -> Optional[bytes]:
+        """
+        Đọc một dòng phản hồi bằng imap.readline, None nếu hết hạn hoặc stop được đặt
+
+        Chỉ đọc khi đã có dữ liệu: hết timeout trong lúc đọc file của imaplib làm hỏng
+        file đó, nên timeout của socket chỉ giới hạn thời gian chờ phần còn lại của một
+        dòng đã bắt đầu đến.
+        """
+        imap = self._imap
+        while True:
+            ready = self._buffered_response()
+            if ready:
+                break
+            if ready is False:
+                raise imaplib.IMAP4.abort("Server đóng kết nối")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (stop is not None and stop.is_set()):
+                return None
+            select.select([imap.sock], [], [], min(remaining, 1.0))
+
+        previous = imap.sock.gettimeout()
+        imap.sock.settimeout(IDLE_RESPONSE_TIMEOUT)
+        try:
+            return imap.readline().rstrip(b"\r\n")
+        except socket.timeout:
+            raise imaplib.IMAP4.abort("Hết thời gian chờ phản hồi của server")
+        finally:
+            imap.sock.settimeout(previous)
+
+    def fetch_bodies(self, emails_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Lấy nội dung cho các email đã có header (kết quả của get_emails với
+        include_body=False), theo lô trên thư mục đang chọn
+
+        Cấu trúc MIME (BODYSTRUCTURE) được lấy trước, sau đó chỉ các phần text/plain
+        (hoặc text/html nếu email không có text/plain) không phải file đính kèm, mỗi
+        phần tối đa max_part_bytes byte. File đính kèm không bao giờ được tải nên bộ
+        nhớ cho mỗi email bị giới hạn dù email lớn đến đâu. Email có BODYSTRUCTURE
+        không đọc được được lấy max_part_bytes byte đầu tiên rồi phân tích như cũ.
+
+        Args:
+            emails_data: Các email cần lấy nội dung, "body" được ghi vào từng phần tử
+
+        Returns:
+            Chính danh sách emails_data
+        """
+        by_uid = {int(email_data["id"]): email_data for email_data in emails_data}
+        for batch in _batches(sorted(by_uid), self.fetch_batch_size):
+            status, data = self._imap.uid("FETCH", _message_set(batch), "(UID BODYSTRUCTURE)")
+            if status != "OK":
+                logger.warning(f"Không thể lấy cấu trúc email: {status}")
+                continue
+
+            plans: Dict[int, List[TextPart]] = {}
+            unparsed = []
+            for uid, items in _parse_fetch(data).items():
+                if uid not in by_uid:
+                    continue
+                try:
+                    parts = _text_parts(items["BODYSTRUCTURE"])
+                except (KeyError, IndexError, TypeError, ValueError):
+                    unparsed.append(uid)
+                    continue
+                plain = [part for part in parts if part.subtype == "plain"]
+                plans[uid] = (plain or [part for part in parts if part.subtype == "html"])[:MAX_TEXT_PARTS]
+
+            # Email có cùng các section (thường gặp: "1", hoặc "1.1" trong multipart
+            # có file đính kèm) được lấy chung một lệnh UID FETCH
+            groups = defaultdict(list)
+            for uid, parts in plans.items():
+                if parts:
+                    groups[tuple(part.section for part in parts)].append(uid)
+            for sections, uids in groups.items():
+                self._fetch_text_parts(uids, sections, plans, by_uid)
+            if unparsed:
+                self._fetch_truncated(unparsed, by_uid)
+        return emails_data
+
+    def _fetch_text_parts(self, uids: List[int], sections: Sequence[str],
+                          plans: Dict[int, List[TextPart]], by_uid: Dict[int, Dict[str, Any]]):
+        """Lấy các section text (tối đa max_part_bytes byte mỗi phần) của các email có cùng section"""
+        fetch_items = " ".join(f"BODY.PEEK[{section}]<0.{self.max_part_bytes}>" for section in sections)
+        status, data = self._imap.uid("FETCH", _message_set(uids), f"(UID {fetch_items})")
+        if status != "OK":
+            logger.warning(f"Không thể lấy nội dung email: {status}")
+            return
+        for uid, items in _parse_fetch(data).items():
+            if uid not in plans:
+                continue
+            texts = []
+            for part in plans[uid]:
+                # Server có thể bỏ <0> khi phần nhỏ hơn giới hạn
+                raw = items.get(f"BODY[{part.section}]<0>", items.get(f"BODY[{part.section}]"))
+                if isinstance(raw, bytes):
+                    texts.append(_decode_part(raw, part, part.size > self.max_part_bytes))
+            by_uid[uid]["body"] = "\n".join(texts)
+
+    def _fetch_truncated(self, uids: List[int], by_uid: Dict[int, Dict[str, Any]]):
+        """Lấy max_part_bytes byte đầu của các email không đọc được BODYSTRUCTURE"""
+        status, data = self._imap.uid("FETCH", _message_set(uids), f"(UID BODY.PEEK[]<0.{self.max_part_bytes}>)")
+        if status != "OK":
+            logger.warning(f"Không thể lấy nội dung email: {status}")
+            return
+        for uid, items in _parse_fetch(data).items():
+            raw = items.get("BODY[]<0>", items.get("BODY[]"))
+            if uid in by_uid and isinstance(raw, bytes):
+                by_uid[uid]["body"] = self._extract_body(email.message_from_bytes(raw))
+
+    def _select_response(self, name: str) -> Optional[int]:
+        """Giá trị số trong phản hồi của lệnh SELECT vừa chạy, ví dụ UIDVALIDITY"""
+        _, data = self._imap.response(name)
+        try:
+            return int(data[0])
+        except (IndexError, TypeError, ValueError):
+            return None
+
+    def _search_uids(self, criteria: str) -> List[int]:
+        """UID (tăng dần) của các email trong thư mục đang chọn thỏa mãn điều kiện"""
+        status, messages = self._imap.uid("SEARCH", None, criteria)
+        if status != "OK":
+            raise imaplib.IMAP4.error(f"Không thể tìm kiếm email: {status}")
+        return sorted(int(uid) for uid in messages[0].split())
+
+    def _fetch_messages(self, uids: List[int], include_body: bool) -> List[Dict[str, Any]]:
+        emails_data = self._fetch_headers(uids)
+        if include_body:
+            self.fetch_bodies(emails_data)
+        return emails_data
+
+    def _fetch_headers(self, uids: List[int]) -> List[Dict[str, Any]]:
+        """Header và kích thước của các email theo UID, mỗi lô một lệnh UID FETCH"""
+        fetched = {}
+        for batch in _batches(uids, self.fetch_batch_size):
+            status, data = self._imap.uid("FETCH", _message_set(batch), "(UID RFC822.SIZE BODY.PEEK[HEADER])")
+            if status != "OK":
+                logger.warning(f"Không thể lấy header email: {status}")
+                continue
+            fetched.update(_parse_fetch(data))
+
+        emails_data = []
+        for uid in reversed(uids):
+            items = fetched.get(uid)
+            if items is None or "BODY[HEADER]" not in items:
+                # Email đã bị xóa giữa SEARCH và FETCH
+                continue
+            msg = HEADER_PARSER.parsebytes(items["BODY[HEADER]"])
+            emails_data.append({
+                "id": str(uid),
+                # Message-ID dùng để chống lưu trùng khi cùng một email được đọc lại
+                "message_id": (msg["Message-ID"] or "").strip() or None,
+                "subject": self._decode_header(msg["Subject"]),
+                "from": self._decode_header(msg["From"]),
+                "to": self._decode_header(msg["To"]),
+                "date": self._decode_header(msg["Date"]),
+                "size": items.get("RFC822.SIZE"),
+                "body": ""
+            })
+        return emails_data
+
+    def _extract_body(self, msg: Message) -> str:
+        """
+        Nội dung của email: các phần text/plain không phải file đính kèm nối lại,
+        hoặc các phần text/html nếu email không có text/plain
+        """
+        texts = {"plain": [], "html": []}
+        for part in msg.walk():
+            if part.is_multipart() or part.get_content_maintype() != "text":
+                continue
+            subtype = part.get_content_subtype()
+            if subtype not in texts or "attachment" in str(part.get("Content-Disposition")):
+                continue
+            payload = part.get_payload(decode=True)
+            if payload is not None:
+                texts[subtype].append(_decode_text(payload, part.get_content_charset() or ""))
+        return "\n".join(texts["plain"] or texts["html"])
+
     def _decode_header(self, header):
         """
         Decode email header
@@ -0,0 +1,47 @@
+import json
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson là tùy chọn, dùng json chuẩn nếu chưa cài đặt
+    orjson = None
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Mã hóa JSON dạng UTF-8 gọn nhất có thể
+
+    Dùng orjson nếu có (mã hóa trực tiếp dict, list, datetime...); các kiểu khác như
+    pydantic model được chuyển qua jsonable_encoder.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=jsonable_encoder)
+        except TypeError:
+            # orjson từ chối ký tự surrogate đơn lẻ (ví dụ nội dung email nhập dạng JSON
+            # "\ud83d"): dùng json chuẩn bên dưới
+            pass
+    encoded = jsonable_encoder(value)
+    try:
+        return json.dumps(encoded, ensure_ascii=False, allow_nan=False,
+                          indent=None, separators=(',', ':')).encode('utf-8')
+    except UnicodeEncodeError:
+        # Surrogate đơn lẻ không mã hóa được sang UTF-8: thoát thành \udXXX
+        return json.dumps(encoded, allow_nan=False, indent=None, separators=(',', ':')).encode('ascii')
+
+
+def loads(data) -> Any:
+    """Giải mã JSON từ str hoặc bytes (orjson nếu có); lỗi cú pháp là ValueError"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse mã hóa bằng dumps (orjson nếu có)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
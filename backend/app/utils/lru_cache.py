@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Cache LRU có giới hạn kích thước, an toàn khi dùng từ nhiều thread,
+    kèm bộ đếm hit/miss để theo dõi hiệu quả cache.
+
+    Khi truyền `sizeof`, cache còn theo dõi tổng dung lượng các giá trị và loại bỏ
+    phần tử cũ khi vượt `max_bytes`.
+    """
+    def __init__(self, maxsize: int = 10000, max_bytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Lấy giá trị theo key, đánh dấu là vừa được sử dụng"""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Lưu giá trị, loại bỏ phần tử ít được dùng nhất khi vượt giới hạn"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if self._sizeof is not None:
+                if key in self._data:
+                    self.bytes -= self._sizeof(self._data[key])
+                self.bytes += self._sizeof(value)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize or (
+                    self.max_bytes is not None and self.bytes > self.max_bytes and len(self._data) > 1):
+                _, evicted = self._data.popitem(last=False)
+                if self._sizeof is not None:
+                    self.bytes -= self._sizeof(evicted)
+
+    def clear(self):
+        """Xóa toàn bộ cache (ví dụ khi quy tắc phân tích thay đổi)"""
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hoạt động của cache"""
+        total = self.hits + self.misses
+        stats = {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
+        if self._sizeof is not None:
+            stats['bytes'] = self.bytes
+            stats['max_bytes'] = self.max_bytes
+        return stats
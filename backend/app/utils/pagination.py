@@ -0,0 +1,29 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+class InvalidCursor(ValueError):
+    """Cursor phân trang không hợp lệ"""
+
+
+def encode_cursor(received_time: datetime, email_id: int) -> str:
+    """Mã hóa vị trí (received_time, id) của phần tử cuối trang thành cursor không trong suốt"""
+    raw = json.dumps([received_time.isoformat(), email_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Giải mã cursor tạo bởi encode_cursor
+
+    Raises:
+        InvalidCursor: Nếu cursor không đúng định dạng
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        received_time, email_id = json.loads(raw)
+        return datetime.fromisoformat(received_time), int(email_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Cursor không hợp lệ: {cursor}") from e
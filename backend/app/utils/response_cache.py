@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Mapping, NamedTuple, Optional
+
+from fastapi import Request, Response
+
+from utils.json_response import dumps
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResponse(NamedTuple):
+    """Một response đã mã hóa JSON kèm ETag"""
+    etag: str
+    body: bytes
+
+    def encode(self) -> bytes:
+        return self.etag.encode('ascii') + b'\n' + self.body
+
+    @classmethod
+    def decode(cls, value: bytes) -> 'CachedResponse':
+        etag, body = value.split(b'\n', 1)
+        return cls(etag.decode('ascii'), body)
+
+
+class MemoryBackend:
+    """Backend lưu response trong process, giới hạn số phần tử, hết hạn theo TTL"""
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, tuple[float, bytes]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def generation(self) -> int:
+        return self._generation
+
+    def bump_generation(self):
+        with self._lock:
+            self._generation += 1
+            # Các khóa của thế hệ cũ không bao giờ được đọc lại
+            self._data.clear()
+
+
+class RedisBackend:
+    """
+    Backend dùng chung giữa các worker qua Redis. Nhận bất kỳ client nào có
+    get/set(ex=...)/incr (redis.Redis hoặc một bản thay thế cục bộ khi kiểm thử).
+    """
+
+    def __init__(self, client, prefix: str = 'email_analyzer:response:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, ex=max(1, int(round(ttl))))
+
+    def generation(self) -> int:
+        return int(self.client.get(self.prefix + 'generation') or 0)
+
+    def bump_generation(self):
+        self.client.incr(self.prefix + 'generation')
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    """So khớp If-None-Match (có thể gồm nhiều ETag, ETag yếu W/ hoặc *)"""
+    if not header:
+        return False
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    Cache response JSON của các endpoint chỉ đọc, có TTL và khóa theo tham số truy vấn.
+
+    Mỗi lần ghi dữ liệu (analyze-batch, thêm email) gọi invalidate() để tăng số thế hệ;
+    số thế hệ là một phần của khóa nên mọi response cũ mất hiệu lực ngay, kể cả ở
+    các worker khác khi dùng backend dùng chung. Request có If-None-Match trùng ETag
+    nhận 304 mà không cần truy vấn database hay mã hóa JSON.
+    """
+
+    def __init__(self, backend=None, ttl: float = 5.0):
+        """
+        Args:
+            backend: MemoryBackend (mặc định) hoặc RedisBackend
+            ttl: Số giây một response được giữ trong cache; 0 để chỉ dùng ETag
+        """
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @classmethod
+    def from_env(cls) -> 'ResponseCache':
+        """Tạo cache theo RESPONSE_CACHE_BACKEND (memory hoặc redis) và RESPONSE_CACHE_TTL"""
+        ttl = float(os.getenv("RESPONSE_CACHE_TTL", "5"))
+        backend_name = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+        if backend_name == "redis":
+            try:
+                import redis
+            except ImportError:
+                logger.warning("Chưa cài đặt redis, dùng cache response trong process")
+            else:
+                client = redis.Redis.from_url(os.getenv("RESPONSE_CACHE_URL", "redis://localhost:6379/0"))
+                return cls(RedisBackend(client), ttl)
+        return cls(MemoryBackend(int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))), ttl)
+
+    def _key(self, name: str, params: Mapping[str, Any]) -> str:
+        query = '&'.join(f"{key}={params[key]}" for key in sorted(params) if params[key] is not None)
+        return f"{self.backend.generation()}:{name}?{query}"
+
+    def invalidate(self):
+        """Làm mất hiệu lực mọi response đã cache (gọi sau khi commit thay đổi dữ liệu)"""
+        try:
+            self.backend.bump_generation()
+        except Exception as e:
+            logger.warning(f"Không thể làm mới cache response: {str(e)}")
+
+    def respond(self, request: Request, name: str, params: Mapping[str, Any],
+                compute: Callable[[], Any]) -> Response:
+        """
+        Trả response từ cache hoặc tính mới bằng compute() rồi lưu lại
+
+        Args:
+            request: Request hiện tại (đọc header If-None-Match)
+            name: Tên endpoint
+            params: Các tham số truy vấn quyết định nội dung response
+            compute: Hàm trả về dữ liệu response (dict, list hoặc pydantic model)
+
+        Returns:
+            Response JSON kèm ETag, hoặc 304 nếu client đã có đúng phiên bản
+        """
+        key = None
+        entry = None
+        try:
+            key = self._key(name, params)
+            value = self.backend.get(key) if self.ttl > 0 else None
+            entry = CachedResponse.decode(value) if value is not None else None
+        except Exception as e:
+            logger.warning(f"Không thể đọc cache response: {str(e)}")
+
+        if entry is None:
+            self.misses += 1
+            body = dumps(compute())
+            entry = CachedResponse(_etag(body), body)
+            if key is not None and self.ttl > 0:
+                try:
+                    self.backend.set(key, entry.encode(), self.ttl)
+                except Exception as e:
+                    logger.warning(f"Không thể ghi cache response: {str(e)}")
+        else:
+            self.hits += 1
+
+        headers = {'ETag': entry.etag, 'Cache-Control': 'no-cache'}
+        if _etag_matches(request.headers.get('if-none-match'), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type='application/json', headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss và số response 304"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0
+        }
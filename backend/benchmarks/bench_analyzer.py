@@ -0,0 +1,163 @@
+"""
+Benchmark EmailAnalyzer trên corpus tổng hợp tiếng Việt/tiếng Anh (benchmarks/corpus.py).
+
+Đo số email mỗi giây và các phân vị độ trễ (p50, p90, p99) của analyze_email
+(đầy đủ và chế độ lười) theo từng kích thước nội dung và mật độ URL, cùng với
+check_link và verify_sender. Cache kết quả phân tích được tắt để đo đúng chi phí
+phân tích; cache theo host được xóa trước mỗi kịch bản. Chạy từ thư mục backend:
+
+    python benchmarks/bench_analyzer.py --output results.json
+    python benchmarks/bench_analyzer.py --compare results.json
+
+Với --compare, chương trình trả mã thoát 1 nếu p50 của một kịch bản chậm hơn
+kết quả cũ quá --threshold (mặc định 10%).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Sequence
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import corpus_links, generate_corpus  # noqa: E402
+from services.analysis_cache import AnalysisCache  # noqa: E402
+from services.email_analyzer import EmailAnalyzer  # noqa: E402
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Phân vị theo phương pháp nearest-rank trên danh sách đã sắp xếp"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(func: Callable, inputs: Sequence[tuple], min_time: float) -> Dict[str, Any]:
+    """
+    Gọi func với từng đầu vào, lặp lại cả danh sách cho đến khi đủ min_time giây
+
+    Returns:
+        Số lần gọi, số lần gọi mỗi giây và các phân vị độ trễ (micro giây)
+    """
+    latencies: List[int] = []
+    clock = time.perf_counter_ns
+    start = clock()
+    while True:
+        for args in inputs:
+            begin = clock()
+            func(*args)
+            latencies.append(clock() - begin)
+        elapsed = clock() - start
+        if elapsed >= min_time * 1e9:
+            break
+
+    latencies.sort()
+    return {
+        'calls': len(latencies),
+        'per_second': round(len(latencies) / (sum(latencies) / 1e9), 1),
+        'p50_us': round(percentile(latencies, 0.50) / 1e3, 1),
+        'p90_us': round(percentile(latencies, 0.90) / 1e3, 1),
+        'p99_us': round(percentile(latencies, 0.99) / 1e3, 1),
+        'max_us': round(latencies[-1] / 1e3, 1),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(seed: int, per_combination: int, min_time: float) -> Dict[str, Any]:
+    analyzer = EmailAnalyzer()
+    # Tắt cache kết quả: các lần lặp lại corpus phải được phân tích lại thật sự
+    analyzer.result_cache = AnalysisCache(maxsize=0)
+
+    corpus = generate_corpus(seed=seed, per_combination=per_combination)
+    groups = defaultdict(list)
+    for email in corpus:
+        groups[(email.size, email.url_density)].append((email.title, email.content, email.sender))
+
+    scenarios: Dict[str, Dict[str, Any]] = {}
+    for lazy in (False, True):
+        name = 'analyze_email_lazy' if lazy else 'analyze_email'
+
+        def analyze(title, content, sender, lazy=lazy):
+            analyzer.analyze_email(title, content, sender, lazy=lazy)
+
+        for (size, density), inputs in sorted(groups.items()):
+            analyzer.host_verdict_cache.clear()
+            scenarios[f"{name}/size={size}/urls={density:g}"] = run_scenario(analyze, inputs, min_time)
+
+    analyzer.host_verdict_cache.clear()
+    scenarios['check_link'] = run_scenario(analyzer.check_link, [(url,) for url in corpus_links(corpus)], min_time)
+    analyzer.host_verdict_cache.clear()
+    scenarios['verify_sender'] = run_scenario(analyzer.verify_sender, [(email.sender,) for email in corpus], min_time)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': seed,
+            'corpus_size': len(corpus),
+            'rules_version': analyzer.rules_version,
+        },
+        'scenarios': scenarios,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """In so sánh p50 với kết quả cũ, trả về True nếu có kịch bản chậm hơn quá ngưỡng"""
+    regressed = False
+    print(f"\nSo sánh với {baseline['meta'].get('commit')} (ngưỡng {threshold:.0%})")
+    print(f"{'scenario':<40} {'old p50':>10} {'new p50':>10} {'change':>8}")
+    for name, result in current['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old is None:
+            continue
+        change = result['p50_us'] / old['p50_us'] - 1 if old['p50_us'] else 0.0
+        flag = ' !' if change > threshold else ''
+        regressed = regressed or change > threshold
+        print(f"{name:<40} {old['p50_us']:>10.1f} {result['p50_us']:>10.1f} {change:>+7.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark EmailAnalyzer")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--per-combination', type=int, default=5, help="Số email cho mỗi tổ hợp của corpus")
+    parser.add_argument('--min-time', type=float, default=1.0, help="Số giây tối thiểu cho mỗi kịch bản")
+    parser.add_argument('--output', help="Ghi kết quả dạng JSON vào file")
+    parser.add_argument('--compare', help="File JSON kết quả cũ để so sánh")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Ngưỡng chậm hơn cho phép của p50")
+    args = parser.parse_args()
+
+    results = run(args.seed, args.per_combination, args.min_time)
+
+    print(f"{'scenario':<40} {'calls/s':>10} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9}")
+    for name, result in results['scenarios'].items():
+        print(f"{name:<40} {result['per_second']:>10.1f} {result['p50_us']:>9.1f} "
+              f"{result['p90_us']:>9.1f} {result['p99_us']:>9.1f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
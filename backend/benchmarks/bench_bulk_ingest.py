@@ -0,0 +1,93 @@
+"""
+Benchmark POST /api/emails/bulk với một database SQLite tạm thay cho MySQL.
+
+Sinh --emails bản ghi từ corpus tổng hợp (benchmarks/corpus.py), gửi lên endpoint
+dưới dạng NDJSON (hoặc mảng JSON với --array) theo từng đoạn 64 KB và đo số email
+được phân tích và ghi mỗi giây. Chạy từ thư mục backend:
+
+    python benchmarks/bench_bulk_ingest.py
+    python benchmarks/bench_bulk_ingest.py --emails 100000 --batch-size 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='bench_bulk_ingest_'), 'bench.db')
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ["DATABASE_ECHO"] = "False"
+os.environ["JOB_WORKERS"] = "0"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from corpus import generate_corpus  # noqa: E402
+from database.session import Base, SessionLocal, engine  # noqa: E402
+from main import app  # noqa: E402
+from models.email import Email  # noqa: E402
+
+
+def build_body(count: int, seed: int, as_array: bool) -> bytes:
+    """Body gồm `count` bản ghi EmailCreate, tiêu đề khác nhau để không trúng cache phân tích"""
+    corpus = generate_corpus(seed=seed, per_combination=1, sizes=(500, 5_000))
+    start = datetime(2026, 1, 1)
+    records = (
+        json.dumps({
+            'title': f"{corpus[i % len(corpus)].title} #{i}",
+            'content': corpus[i % len(corpus)].content,
+            'from_email': corpus[i % len(corpus)].sender,
+            'to_email': 'user@example.com',
+            'received_time': (start + timedelta(seconds=i * 37)).isoformat(),
+        }, ensure_ascii=False)
+        for i in range(count)
+    )
+    if as_array:
+        return ('[' + ',\n'.join(records) + ']').encode('utf-8')
+    return '\n'.join(records).encode('utf-8')
+
+
+def chunked(body: bytes, size: int = 65536):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark nhập email hàng loạt")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--emails', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=None, help="Mặc định theo BULK_INSERT_BATCH_SIZE")
+    parser.add_argument('--array', action='store_true', help="Gửi mảng JSON thay vì NDJSON")
+    args = parser.parse_args()
+
+    import models.email_stats  # noqa: F401
+    Base.metadata.create_all(bind=engine)
+    body = build_body(args.emails, args.seed, args.array)
+    url = '/api/emails/bulk' + (f"?batch_size={args.batch_size}" if args.batch_size else '')
+
+    with TestClient(app) as client:
+        begin = time.perf_counter()
+        response = client.post(url, content=chunked(body))
+        elapsed = time.perf_counter() - begin
+    response.raise_for_status()
+    result = response.json()
+
+    db = SessionLocal()
+    try:
+        stored = db.query(Email.id).count()
+    finally:
+        db.close()
+
+    print(f"body: {len(body) / 1e6:.1f} MB, {'JSON array' if args.array else 'NDJSON'}")
+    print(f"inserted: {result['inserted']}/{result['received']} (failed {result['failed']}, "
+          f"unscored {result['unscored']}), rows in table: {stored}")
+    print(f"elapsed: {elapsed:.2f} s, {result['inserted'] / elapsed:,.0f} emails/s, "
+          f"{len(body) / 1e6 / elapsed:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
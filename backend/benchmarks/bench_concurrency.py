@@ -0,0 +1,185 @@
+"""
+Benchmark độ trễ của các request nhẹ khi có tải phân tích nặng chạy đồng thời.
+
+Ứng dụng FastAPI được chạy trong process qua httpx.AsyncClient (ASGITransport) với
+một database SQLite tạm thay cho MySQL. Các client "nhẹ" liên tục gọi /api/emails/stats,
+danh sách email và /, đo độ trễ trong ba kịch bản:
+
+    idle            chỉ có request nhẹ
+    mixed           thêm các client gửi /api/emails/analyze với nội dung lớn
+    mixed_blocking  như mixed nhưng phân tích chạy thẳng trên event loop (cách làm
+                    cũ), để so sánh
+
+Độ trễ của kịch bản mixed phải gần như không đổi so với idle. Chạy từ thư mục backend:
+
+    python benchmarks/bench_concurrency.py
+    python benchmarks/bench_concurrency.py --max-ratio 3
+
+Chương trình trả mã thoát 1 nếu p95 của kịch bản mixed lớn hơn --max-ratio lần p95
+của kịch bản idle (cộng thêm --slack-ms để bỏ qua dao động ở mức mili giây).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Sequence
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='bench_concurrency_'), 'bench.db')
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ["DATABASE_ECHO"] = "False"
+os.environ["JOB_WORKERS"] = "0"
+# Không cache response và kết quả phân tích: mọi request đều truy vấn database / phân tích thật
+os.environ["RESPONSE_CACHE_TTL"] = "0"
+os.environ["ANALYSIS_CACHE_SIZE"] = "0"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx  # noqa: E402
+
+from corpus import generate_corpus  # noqa: E402
+from database.session import Base, SessionLocal, engine  # noqa: E402
+from main import app  # noqa: E402
+from models.email import Email  # noqa: E402
+from routes.emails import email_analyzer  # noqa: E402
+from utils.concurrency import configure_threadpool  # noqa: E402
+
+LIGHT_PATHS = ('/api/emails/stats', '/api/emails/?limit=50', '/')
+
+
+@app.post("/bench/analyze-blocking")
+async def analyze_blocking(payload: Dict[str, Any]):
+    """Phân tích ngay trên event loop như trước khi tách executor (chỉ dùng để so sánh)"""
+    return email_analyzer.analyze_email(payload["title"], payload["content"], payload["sender"])
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Phân vị theo phương pháp nearest-rank trên danh sách đã sắp xếp"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def seed_database(count: int, seed: int):
+    """Tạo bảng và thêm `count` email đã phân loại vào database tạm"""
+    import models.email_stats  # noqa: F401
+
+    Base.metadata.create_all(bind=engine)
+    corpus = generate_corpus(seed=seed, per_combination=1, sizes=(500, 5_000))
+    now = datetime.now()
+    categories = ['safe', 'suspicious', 'spam', 'phishing', 'unknown']
+    db = SessionLocal()
+    try:
+        db.add_all(
+            Email(
+                title=corpus[i % len(corpus)].title,
+                content=corpus[i % len(corpus)].content,
+                from_email=corpus[i % len(corpus)].sender,
+                to_email='user@example.com',
+                received_time=now - timedelta(minutes=i * 7),
+                category=categories[i % len(categories)],
+            )
+            for i in range(count)
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+async def light_client(client: httpx.AsyncClient, deadline: float, latencies: List[float]):
+    """Gọi lần lượt các endpoint nhẹ cho đến deadline, ghi độ trễ (mili giây)"""
+    index = 0
+    while time.perf_counter() < deadline:
+        path = LIGHT_PATHS[index % len(LIGHT_PATHS)]
+        index += 1
+        begin = time.perf_counter()
+        response = await client.get(path)
+        latencies.append((time.perf_counter() - begin) * 1000)
+        response.raise_for_status()
+
+
+async def heavy_client(client: httpx.AsyncClient, deadline: float, path: str,
+                       payloads: Sequence[Dict[str, str]], counter: List[int]):
+    """Gửi liên tục các email lớn cần phân tích cho đến deadline"""
+    index = 0
+    while time.perf_counter() < deadline:
+        response = await client.post(path, json=payloads[index % len(payloads)])
+        index += 1
+        response.raise_for_status()
+        counter[0] += 1
+
+
+async def run_scenario(name: str, duration: float, light_clients: int, heavy_clients: int,
+                       payloads: Sequence[Dict[str, str]]) -> Dict[str, Any]:
+    heavy_path = '/bench/analyze-blocking' if name == 'mixed_blocking' else '/api/emails/analyze'
+    # Giới hạn threadpool gắn với event loop nên phải đặt lại cho mỗi asyncio.run
+    configure_threadpool(int(os.getenv("THREADPOOL_SIZE", "40")))
+    latencies: List[float] = []
+    analyzed = [0]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        deadline = time.perf_counter() + duration
+        tasks = [light_client(client, deadline, latencies) for _ in range(light_clients)]
+        if name != 'idle':
+            tasks += [heavy_client(client, deadline, heavy_path, payloads, analyzed)
+                      for _ in range(heavy_clients)]
+        await asyncio.gather(*tasks)
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'analyzed': analyzed[0],
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(latencies[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark độ trễ request dưới tải hỗn hợp")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--emails', type=int, default=2000, help="Số email trong database tạm")
+    parser.add_argument('--duration', type=float, default=5.0, help="Số giây cho mỗi kịch bản")
+    parser.add_argument('--light-clients', type=int, default=4)
+    parser.add_argument('--heavy-clients', type=int, default=4)
+    parser.add_argument('--body-size', type=int, default=50_000, help="Kích thước nội dung email phân tích")
+    parser.add_argument('--max-ratio', type=float, default=3.0, help="Tỷ lệ p95 mixed/idle tối đa cho phép")
+    parser.add_argument('--slack-ms', type=float, default=5.0, help="Dao động p95 được bỏ qua (mili giây)")
+    parser.add_argument('--skip-blocking', action='store_true', help="Bỏ qua kịch bản mixed_blocking")
+    parser.add_argument('--output', help="Ghi kết quả dạng JSON vào file")
+    args = parser.parse_args()
+
+    seed_database(args.emails, args.seed)
+    payloads = [
+        {'title': email.title, 'content': email.content, 'sender': email.sender}
+        for email in generate_corpus(seed=args.seed, per_combination=1, sizes=(args.body_size,))
+    ]
+
+    names = ['idle', 'mixed'] + ([] if args.skip_blocking else ['mixed_blocking'])
+    results = {}
+    for name in names:
+        results[name] = asyncio.run(run_scenario(
+            name, args.duration, args.light_clients, args.heavy_clients, payloads
+        ))
+
+    print(f"{'scenario':<16} {'requests':>9} {'analyzed':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, result in results.items():
+        print(f"{name:<16} {result['requests']:>9} {result['analyzed']:>9} {result['p50_ms']:>8.2f} "
+              f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['max_ms']:>8.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'scenarios': results}, f, indent=2, ensure_ascii=False)
+
+    limit = results['idle']['p95_ms'] * args.max_ratio + args.slack_ms
+    if results['mixed']['p95_ms'] > limit:
+        print(f"\np95 dưới tải hỗn hợp {results['mixed']['p95_ms']:.2f} ms vượt ngưỡng {limit:.2f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
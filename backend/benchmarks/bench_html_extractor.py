@@ -0,0 +1,105 @@
+"""
+Benchmark bước trích xuất chữ và liên kết từ email HTML theo kích thước bản tin.
+
+So sánh extract_html (một lượt quét bỏ qua markup, không dựng cây DOM) với cách
+dựng toàn bộ cây DOM bằng BeautifulSoup rồi lấy chữ và các thẻ <a>. Bộ nhớ đỉnh
+được đo bằng tracemalloc. Chạy từ thư mục backend:
+
+    python benchmarks/bench_html_extractor.py
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from services.html_extractor import extract_html  # noqa: E402
+
+SIZES = [20_000, 100_000, 500_000, 2_000_000]
+
+HEAD = """<!DOCTYPE html><html><head><meta charset="utf-8"><title>Bản tin hàng tuần</title>
+<style type="text/css">body{margin:0;padding:0}table{border-collapse:collapse}
+.content td{font-family:Arial,sans-serif;font-size:14px;color:#333333;line-height:20px}
+@media only screen and (max-width:600px){.wrapper{width:100%!important}}</style></head>
+<body><table class="wrapper" width="600" cellpadding="0" cellspacing="0" border="0" align="center">"""
+
+ARTICLE = """<tr><td class="content" style="padding:20px 30px;background-color:#ffffff">
+<h2 style="margin:0 0 10px 0;font-size:20px;color:#222222">{title}</h2>
+<p style="margin:0 0 12px 0">Chúng tôi gửi đến bạn bản tin hàng tuần với các bài viết mới nhất về du lịch
+và ẩm thực. Dear customer, thank you for reading our weekly newsletter &amp; don't miss the
+<strong>limited time</strong> discount for subscribers.</p>
+<table cellpadding="0" cellspacing="0" border="0"><tr><td style="border-radius:4px;background:#1a73e8">
+<a href="https://news.example.com/r/{id}?utm_source=newsletter&amp;utm_medium=email" target="_blank"
+style="display:inline-block;padding:10px 18px;color:#ffffff;text-decoration:none">Đọc thêm</a>
+</td></tr></table>
+<img src="https://cdn.example.com/img/{id}.jpg" width="540" alt="" style="display:block;border:0"/>
+</td></tr>"""
+
+FOOTER = """<tr><td style="padding:20px;font-size:11px;color:#999999">
+<a href="https://news.example.com/unsubscribe?u=abc">Hủy đăng ký</a> |
+<a href="https://news.example.com/preferences">Tùy chọn</a></td></tr></table>
+<img src="https://track.example.com/open.gif?u=abc" width="1" height="1"/></body></html>"""
+
+
+def newsletter(size: int, rng: random.Random) -> str:
+    """Tạo bản tin HTML dạng bảng với kích thước xấp xỉ `size` ký tự"""
+    parts = [HEAD]
+    length = len(HEAD) + len(FOOTER)
+    while length < size:
+        article = ARTICLE.format(title=f"Bài viết số {rng.randint(1, 10_000)}", id=rng.randint(1, 1_000_000))
+        parts.append(article)
+        length += len(article)
+    parts.append(FOOTER)
+    return ''.join(parts)
+
+
+def dom_extract(html: str):
+    """Cách dựng toàn bộ cây DOM"""
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'head']):
+        tag.decompose()
+    links = {}
+    for anchor in soup.find_all('a', href=True):
+        links.setdefault(anchor['href'], anchor.get_text(' ', strip=True))
+    return ' '.join(soup.get_text(' ').split()), links
+
+
+def measure(func, *args, min_time: float = 0.5):
+    """Trả về thời gian trung bình (giây) cho một lần gọi và bộ nhớ đỉnh (byte)"""
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        func(*args)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / runs, peak
+
+
+def main():
+    rng = random.Random(42)
+
+    print(f"{'size':>10} {'links':>6} {'dom ms':>9} {'scan ms':>10} {'speedup':>8} {'dom MB':>8} {'scan MB':>10}")
+    for size in SIZES:
+        html = newsletter(size, rng)
+        extracted = extract_html(html)
+        _, dom_links = dom_extract(html)
+        assert [link.url for link in extracted.links] == list(dom_links)[:len(extracted.links)]
+
+        dom, dom_peak = measure(dom_extract, html)
+        stream, stream_peak = measure(extract_html, html)
+        print(f"{len(html):>10} {len(extracted.links):>6} {dom * 1e3:>9.1f} {stream * 1e3:>10.1f} "
+              f"{dom / stream:>7.1f}x {dom_peak / 1e6:>8.1f} {stream_peak / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark EmailMonitor.get_emails với server IMAP giả lập (benchmarks/fake_imap.py).
+
+Server trả lời mỗi lệnh sau --latency giây để mô phỏng một kết nối WAN. So sánh
+cách lấy cũ (SEARCH ALL rồi một lệnh FETCH RFC822 cho từng email) với get_emails
+(UID FETCH theo lô) về số lệnh gửi tới server và thời gian, cùng chi phí của một
+lần đồng bộ tăng dần (EmailMonitor.sync) khi không có email mới. Chạy từ thư mục backend:
+
+    python benchmarks/bench_imap_fetch.py
+    python benchmarks/bench_imap_fetch.py --emails 5000 --latency 0.02 --batch-size 200
+"""
+import argparse
+import email
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_corpus  # noqa: E402
+from fake_imap import FakeIMAPServer, FakeMailbox, make_message  # noqa: E402
+from utils.email_monitor import EmailMonitor  # noqa: E402
+
+
+def build_mailbox(count: int, seed: int) -> FakeMailbox:
+    corpus = generate_corpus(seed=seed, per_combination=1, sizes=(500, 5_000))
+    mailbox = FakeMailbox()
+    mailbox.add_folder('INBOX')
+    for i in range(count):
+        item = corpus[i % len(corpus)]
+        mailbox.append('INBOX', make_message(i, f"{item.title} #{i}", item.content, item.sender))
+    return mailbox
+
+
+def legacy_fetch(monitor: EmailMonitor, limit: int) -> int:
+    """Cách lấy trước đây: một lượt đi-về FETCH (RFC822) cho mỗi email"""
+    imap = monitor._imap
+    imap.select('INBOX')
+    _, messages = imap.search(None, 'ALL')
+    email_ids = messages[0].split()
+    if limit > 0:
+        email_ids = email_ids[-limit:]
+    count = 0
+    for e_id in reversed(email_ids):
+        status, msg_data = imap.fetch(e_id, '(RFC822)')
+        if status == 'OK':
+            email.message_from_bytes(msg_data[0][1])
+            count += 1
+    return count
+
+
+def run(server: FakeIMAPServer, batch_size: int, label: str, fetch, prepare=None) -> None:
+    """Đo fetch(monitor); prepare(monitor) (nếu có) chạy trước và không được tính"""
+    monitor = EmailMonitor('user@example.com', 'secret', imap_server='127.0.0.1',
+                           imap_port=server.port, use_ssl=False, fetch_batch_size=batch_size)
+    monitor.connect()
+    if prepare is not None:
+        prepare(monitor)
+    server.reset_stats()
+    begin = time.perf_counter()
+    count = fetch(monitor)
+    elapsed = time.perf_counter() - begin
+    commands = sum(server.commands.values())
+    monitor.disconnect()
+    rate = f" {count / elapsed:>9,.0f} emails/s" if count else ""
+    print(f"{label:<28} {count:>6} emails {commands:>6} commands {elapsed:>8.2f} s{rate}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lấy email qua IMAP")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--emails', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.01, help="Độ trễ mỗi lệnh (giây)")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--skip-legacy', action='store_true', help="Bỏ qua cách lấy cũ (chậm với nhiều email)")
+    args = parser.parse_args()
+
+    server = FakeIMAPServer(build_mailbox(args.emails, args.seed), latency=args.latency).start()
+    print(f"{args.emails} emails, latency {args.latency * 1000:.0f} ms/command, batch size {args.batch_size}")
+    try:
+        if not args.skip_legacy:
+            run(server, args.batch_size, "legacy FETCH per message", lambda monitor: legacy_fetch(monitor, 0))
+        run(server, args.batch_size, "get_emails (headers only)",
+            lambda monitor: len(monitor.get_emails(limit=0, include_body=False)))
+        run(server, args.batch_size, "get_emails (with bodies)", lambda monitor: len(monitor.get_emails(limit=0)))
+
+        # Đồng bộ tăng dần khi không có email mới: chỉ một lệnh SELECT
+        synced = {}
+        run(server, args.batch_size, "sync (no new mail)",
+            lambda monitor: len(monitor.sync(checkpoint=synced['checkpoint']).emails),
+            prepare=lambda monitor: synced.update(checkpoint=monitor.sync(include_body=False).checkpoint))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
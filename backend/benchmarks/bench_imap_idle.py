@@ -0,0 +1,101 @@
+"""
+Benchmark độ trễ phát hiện email mới của FolderWatcher: IDLE so với đồng bộ định kỳ.
+
+Dùng server IMAP giả lập (benchmarks/fake_imap.py) và một database SQLite tạm thay
+cho MySQL. Mỗi email mới được thêm vào hộp thư sau một khoảng ngẫu nhiên; độ trễ là
+thời gian từ lúc email đến server tới lúc email đã được phân tích và lưu. Chạy từ
+thư mục backend:
+
+    python benchmarks/bench_imap_idle.py
+    python benchmarks/bench_imap_idle.py --emails 50 --poll-interval 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='bench_imap_idle_'), 'bench.db')
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ["DATABASE_ECHO"] = "False"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_imap import FakeIMAPServer, FakeMailbox, make_message  # noqa: E402
+from database.migrations import migrate  # noqa: E402
+from database.session import SessionLocal, engine  # noqa: E402
+from models.email import Email  # noqa: E402
+from services.email_analyzer import EmailAnalyzer  # noqa: E402
+from services.imap_sync import FolderWatcher  # noqa: E402
+from utils.email_monitor import EmailMonitor  # noqa: E402
+
+
+def stored_count() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(Email.id).count()
+    finally:
+        db.close()
+
+
+def wait_for(count: int, timeout: float = 60.0) -> float:
+    begin = time.perf_counter()
+    while stored_count() < count and time.perf_counter() - begin < timeout:
+        time.sleep(0.002)
+    return time.perf_counter() - begin
+
+
+def measure(label: str, idle: bool, args, analyzer: EmailAnalyzer):
+    mailbox = FakeMailbox()
+    folder = f"bench-{label}"
+    mailbox.add_folder(folder)
+    server = FakeIMAPServer(mailbox, latency=args.latency,
+                            capabilities=('IMAP4rev1', 'IDLE') if idle else ('IMAP4rev1',)).start()
+    monitor = EmailMonitor(f"{label}@example.com", 'secret', imap_server='127.0.0.1',
+                           imap_port=server.port, use_ssl=False)
+    watcher = FolderWatcher(monitor, analyzer, SessionLocal, folder=folder, poll_interval=args.poll_interval)
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop,), daemon=True)
+    thread.start()
+
+    rng = random.Random(args.seed)
+    latencies = []
+    expected = stored_count()
+    try:
+        time.sleep(0.5)
+        for i in range(args.emails):
+            time.sleep(rng.uniform(0, args.poll_interval))
+            mailbox.append(folder, make_message(i, f"{label} #{i}", f"Nội dung email {label} {i}", 'sender@example.com'))
+            expected += 1
+            latencies.append(wait_for(expected))
+    finally:
+        stop.set()
+        thread.join()
+        server.stop()
+    latencies.sort()
+    print(f"{label:<6} median {statistics.median(latencies) * 1000:>8.0f} ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:>8.0f} ms  "
+          f"max {latencies[-1] * 1000:>8.0f} ms  commands {sum(server.commands.values())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark độ trễ phát hiện email mới qua IMAP")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--emails', type=int, default=20)
+    parser.add_argument('--poll-interval', type=float, default=2.0, help="Chu kỳ đồng bộ khi không có IDLE (giây)")
+    parser.add_argument('--latency', type=float, default=0.01, help="Độ trễ mỗi lệnh IMAP (giây)")
+    args = parser.parse_args()
+
+    migrate(engine)
+    analyzer = EmailAnalyzer()
+    print(f"{args.emails} emails, poll interval {args.poll_interval} s, latency {args.latency * 1000:.0f} ms/command")
+    measure("idle", True, args, analyzer)
+    measure("poll", False, args, analyzer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark lấy nội dung email có file đính kèm lớn qua IMAP.
+
+So sánh cách lấy cũ (BODY.PEEK[] cả email rồi phân tích toàn bộ MIME) với
+EmailMonitor.fetch_bodies (BODYSTRUCTURE rồi chỉ các phần text, có giới hạn kích
+thước) về số byte server gửi, thời gian và bộ nhớ đỉnh (tracemalloc) của client.
+Server IMAP giả lập (benchmarks/fake_imap.py) chạy trong process riêng để không
+tính vào bộ nhớ và CPU của client. Chạy từ thư mục backend:
+
+    python benchmarks/bench_imap_mime.py
+    python benchmarks/bench_imap_mime.py --emails 50 --attachment-size 10000000
+"""
+import argparse
+import email
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import generate_corpus  # noqa: E402
+from fake_imap import FakeIMAPServer, FakeMailbox, make_message  # noqa: E402
+from utils.email_monitor import EmailMonitor, _batches, _message_set, _parse_fetch  # noqa: E402
+
+
+def build_mailbox(count: int, seed: int, attachment_size: int) -> FakeMailbox:
+    corpus = generate_corpus(seed=seed, per_combination=1, sizes=(500, 5_000))
+    mailbox = FakeMailbox()
+    mailbox.add_folder('INBOX')
+    for i in range(count):
+        item = corpus[i % len(corpus)]
+        mailbox.append('INBOX', make_message(i, f"{item.title} #{i}", item.content, item.sender,
+                                             html=f"<p>{item.content}</p>", attachment_size=attachment_size))
+    return mailbox
+
+
+def serve(conn, args):
+    """Process server: gửi port, sau đó trả lời lệnh 'reset'/'stats' qua conn đến khi nhận 'stop'"""
+    server = FakeIMAPServer(build_mailbox(args.emails, args.seed, args.attachment_size),
+                            latency=args.latency).start()
+    conn.send(server.port)
+    try:
+        while True:
+            command = conn.recv()
+            if command == 'reset':
+                server.reset_stats()
+            elif command == 'stats':
+                conn.send((sum(server.commands.values()), server.sent_bytes))
+            else:
+                break
+    finally:
+        server.stop()
+
+
+def legacy_fetch_bodies(monitor: EmailMonitor, emails_data):
+    """Cách lấy trước đây: cả email (gồm file đính kèm) rồi phân tích toàn bộ MIME"""
+    by_uid = {int(email_data["id"]): email_data for email_data in emails_data}
+    for batch in _batches(sorted(by_uid), monitor.fetch_batch_size):
+        _, data = monitor._imap.uid("FETCH", _message_set(batch), "(UID BODY.PEEK[])")
+        for uid, items in _parse_fetch(data).items():
+            by_uid[uid]["body"] = monitor._extract_body(email.message_from_bytes(items["BODY[]"]))
+    return emails_data
+
+
+def run(conn, port: int, args, label: str, fetch_bodies) -> None:
+    monitor = EmailMonitor('user@example.com', 'secret', imap_server='127.0.0.1', imap_port=port,
+                           use_ssl=False, fetch_batch_size=args.batch_size, max_part_bytes=args.max_part_bytes)
+    emails_data = monitor.get_emails(limit=0, include_body=False)
+    conn.send('reset')
+    tracemalloc.start()
+    begin = time.perf_counter()
+    fetch_bodies(monitor, emails_data)
+    elapsed = time.perf_counter() - begin
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conn.send('stats')
+    commands, sent_bytes = conn.recv()
+    monitor.disconnect()
+    print(f"{label:<26} {commands:>5} commands {sent_bytes / 1e6:>9.1f} MB sent "
+          f"{elapsed:>7.2f} s  peak {peak / 1e6:>8.1f} MB  "
+          f"bodies {sum(len(email_data['body']) for email_data in emails_data):,} chars")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lấy nội dung email có file đính kèm")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--emails', type=int, default=100)
+    parser.add_argument('--attachment-size', type=int, default=2_000_000, help="Kích thước file đính kèm (byte)")
+    parser.add_argument('--latency', type=float, default=0.01, help="Độ trễ mỗi lệnh (giây)")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--max-part-bytes', type=int, default=262144)
+    args = parser.parse_args()
+
+    conn, child_conn = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(child_conn, args), daemon=True)
+    server.start()
+    port = conn.recv()
+    print(f"{args.emails} emails, attachment {args.attachment_size / 1e6:.1f} MB, "
+          f"latency {args.latency * 1000:.0f} ms/command, batch size {args.batch_size}")
+    try:
+        run(conn, port, args, "legacy BODY.PEEK[]", legacy_fetch_bodies)
+        run(conn, port, args, "fetch_bodies (text parts)", EmailMonitor.fetch_bodies)
+    finally:
+        conn.send('stop')
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark MailboxMonitorService: thông lượng đồng bộ nhiều hộp thư theo số kết nối.
+
+Dùng server IMAP giả lập (benchmarks/fake_imap.py, mỗi lệnh trễ --latency giây) và
+một database SQLite tạm thay cho MySQL. Mỗi hộp thư có một thư mục với --emails
+email; đo thời gian đến khi mọi email của --accounts hộp thư đã được phân tích và
+lưu, với các mức --connections khác nhau. Chạy từ thư mục backend:
+
+    python benchmarks/bench_imap_monitor.py
+    python benchmarks/bench_imap_monitor.py --accounts 200 --connections 1 8 32
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='bench_imap_monitor_'), 'bench.db')
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_FILE}"
+os.environ["DATABASE_ECHO"] = "False"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_imap import FakeIMAPServer, FakeMailbox, make_message  # noqa: E402
+from database.migrations import migrate  # noqa: E402
+from database.session import SessionLocal, engine  # noqa: E402
+from services.email_analyzer import EmailAnalyzer  # noqa: E402
+from services.mailbox_monitor import ImapAccount, MailboxMonitorService  # noqa: E402
+
+
+def measure(connections: int, args, analyzer: EmailAnalyzer):
+    # Mỗi hộp thư dùng một thư mục riêng trên cùng server giả lập
+    mailbox = FakeMailbox()
+    accounts = []
+    for a in range(args.accounts):
+        folder = f"c{connections}-box{a}"
+        for i in range(args.emails):
+            mailbox.append(folder, make_message(i, f"{folder} #{i}", f"Nội dung {folder} {i}", 'sender@example.com'))
+        accounts.append(ImapAccount(f"user{a}-c{connections}@example.com", 'secret', server='127.0.0.1',
+                                    use_ssl=False, folders=(folder,)))
+    server = FakeIMAPServer(mailbox, latency=args.latency).start()
+    accounts = [account._replace(port=server.port) for account in accounts]
+
+    service = MailboxMonitorService(accounts, analyzer, SessionLocal, max_connections=connections,
+                                    max_connections_per_server=connections, poll_interval=3600,
+                                    limit=0, fetch_batch_size=args.batch_size)
+    expected = args.accounts * args.emails
+    begin = time.perf_counter()
+    service.start()
+    try:
+        while True:
+            report = service.health_report().values()
+            if sum(health["inserted"] for health in report) >= expected:
+                break
+            if time.perf_counter() - begin > args.timeout:
+                print(f"timeout after {args.timeout} s")
+                break
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - begin
+    finally:
+        service.stop()
+        server.stop()
+    inserted = sum(health["inserted"] for health in service.health_report().values())
+    logins = server.commands['LOGIN']
+    print(f"{connections:>4} connections {inserted:>7} emails {elapsed:>8.2f} s "
+          f"{inserted / elapsed:>8,.0f} emails/s {logins:>5} logins {sum(server.commands.values()):>7} commands")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark theo dõi nhiều hộp thư IMAP")
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--emails', type=int, default=10, help="Số email mỗi hộp thư")
+    parser.add_argument('--connections', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--latency', type=float, default=0.02, help="Độ trễ mỗi lệnh IMAP (giây)")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--timeout', type=float, default=600)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    migrate(engine)
+    analyzer = EmailAnalyzer()
+    print(f"{args.accounts} mailboxes x {args.emails} emails, latency {args.latency * 1000:.0f} ms/command")
+    for connections in args.connections:
+        measure(connections, args, analyzer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark bộ so khớp từ khóa của EmailAnalyzer theo kích thước nội dung email.
+
+So sánh cách cũ (mỗi từ khóa một lần `word in (title + content).lower()`) với
+KeywordMatcher quét một lượt. Chạy từ thư mục backend:
+
+    python benchmarks/bench_keyword_matcher.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from services.email_analyzer import EmailAnalyzer  # noqa: E402
+from services.keyword_matcher import normalize_text  # noqa: E402
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+PARAGRAPH = (
+    "Dear customer, thank you for reading our weekly newsletter about gardening, cooking and travel. "
+    "Chúng tôi gửi đến bạn bản tin hàng tuần với các bài viết mới nhất về du lịch và ẩm thực. "
+    "Please click here to read more and don't miss the limited time discount for subscribers. "
+)
+
+
+def legacy_scan(analyzer: EmailAnalyzer, title: str, content: str):
+    """Cách quét từ khóa trước khi có KeywordMatcher"""
+    has_urgency = any(word in (title + content).lower() for word in analyzer.rules.urgency_words)
+    contains_phishing = any(phrase in (title + content).lower() for phrase in analyzer.rules.phishing_phrases)
+    spam_count = sum(1 for word in analyzer.rules.spam_words if word in (title + content).lower())
+    return has_urgency, contains_phishing, spam_count
+
+
+def matcher_scan(analyzer: EmailAnalyzer, title: str, content: str):
+    hits = analyzer.rules.keyword_matcher.scan(normalize_text(title + content), normalized=True)
+    return hits['urgency'].count > 0, hits['phishing'].count > 0, hits['spam'].count
+
+
+def measure(func, *args, min_time: float = 0.5) -> float:
+    """Trả về thời gian trung bình (giây) cho một lần gọi"""
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        func(*args)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / runs
+
+
+def main():
+    analyzer = EmailAnalyzer()
+    title = "Weekly newsletter"
+
+    print(f"{'size':>10} {'legacy MB/s':>12} {'matcher MB/s':>13} {'speedup':>8}")
+    for size in SIZES:
+        content = (PARAGRAPH * (size // len(PARAGRAPH) + 1))[:size]
+        assert legacy_scan(analyzer, title, content) == matcher_scan(analyzer, title, content)
+
+        legacy = measure(legacy_scan, analyzer, title, content)
+        matcher = measure(matcher_scan, analyzer, title, content)
+        megabytes = len(content.encode('utf-8')) / 1_000_000
+        print(f"{size:>10} {megabytes / legacy:>12.1f} {megabytes / matcher:>13.1f} {legacy / matcher:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
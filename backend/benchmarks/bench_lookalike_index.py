@@ -0,0 +1,57 @@
+"""
+Benchmark LookalikeIndex theo số lượng thương hiệu được bảo vệ.
+
+Đo thời gian dựng chỉ mục và độ trễ trung bình của một lần kiểm tra domain người
+gửi. Chạy từ thư mục backend:
+
+    python benchmarks/bench_lookalike_index.py
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from services.lookalike_index import LookalikeIndex  # noqa: E402
+
+BRAND_COUNTS = [10, 100, 1_000, 5_000]
+QUERIES = 5_000
+
+
+def random_label(rng: random.Random, low: int, high: int) -> str:
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+
+def main():
+    rng = random.Random(42)
+    brands = [random_label(rng, 6, 14) + '.com' for _ in range(max(BRAND_COUNTS))]
+
+    print(f"{'brands':>8} {'build s':>8} {'query us':>9}")
+    for count in BRAND_COUNTS:
+        protected = brands[:count]
+        start = time.perf_counter()
+        index = LookalikeIndex(protected)
+        build = time.perf_counter() - start
+
+        # Trộn domain bình thường, domain chứa tên thương hiệu và domain gõ sai
+        queries = []
+        for _ in range(QUERIES):
+            brand = rng.choice(protected).split('.')[0]
+            queries.append(rng.choice([
+                random_label(rng, 5, 20) + '.com',
+                'mail.' + random_label(rng, 4, 12) + '.co.uk',
+                brand + '-secure.net',
+                brand[:-1] + 'x.com',
+            ]))
+
+        start = time.perf_counter()
+        for domain in queries:
+            index.match(domain)
+        per_query = (time.perf_counter() - start) / QUERIES
+        print(f"{count:>8} {build:>8.2f} {per_query * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
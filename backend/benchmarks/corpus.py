@@ -0,0 +1,174 @@
+"""
+Bộ sinh corpus email tổng hợp cho benchmark, tái lập được theo seed.
+
+Trộn email an toàn, spam và phishing bằng tiếng Việt và tiếng Anh với nhiều kích
+thước nội dung và mật độ URL khác nhau. Cùng seed và tham số luôn sinh ra cùng
+một corpus, nên kết quả benchmark giữa các commit có thể so sánh với nhau.
+"""
+import random
+from typing import Dict, Iterator, List, NamedTuple, Sequence
+
+CATEGORIES = ('safe', 'spam', 'phishing')
+LANGUAGES = ('vi', 'en')
+
+# Kích thước nội dung (ký tự) và mật độ URL (số URL trên 1000 ký tự)
+BODY_SIZES = (500, 5_000, 50_000)
+URL_DENSITIES = (0.0, 1.0, 5.0)
+
+FILLER = {
+    'vi': [
+        "Chúng tôi xin gửi đến bạn thông tin cập nhật mới nhất về dự án.",
+        "Cuộc họp tuần này sẽ diễn ra vào chiều thứ năm tại phòng họp tầng ba.",
+        "Vui lòng xem tài liệu đính kèm và phản hồi trước cuối tuần.",
+        "Báo cáo doanh thu quý vừa rồi cho thấy mức tăng trưởng ổn định.",
+        "Cảm ơn bạn đã tham gia chương trình đào tạo nội bộ của công ty.",
+        "Lịch nghỉ lễ năm nay đã được phòng nhân sự công bố trên cổng thông tin.",
+    ],
+    'en': [
+        "Please find the updated project schedule for the next sprint below.",
+        "The weekly team meeting has been moved to Thursday afternoon.",
+        "Let me know if you have any questions about the attached document.",
+        "Our quarterly report shows steady growth across all regions.",
+        "Thank you for attending the internal training session last week.",
+        "The holiday calendar has been published on the intranet portal.",
+    ],
+}
+
+SPAM = {
+    'vi': [
+        "Chúc mừng! Bạn đã trúng thưởng giải thưởng lớn, nhấp vào đây để nhận ngay.",
+        "Ưu đãi có hạn: giảm giá 90% chỉ hôm nay, gọi ngay để được tư vấn miễn phí.",
+        "Cơ hội kiếm tiền mặt tại nhà, đảm bảo 100% miễn phí, hành động ngay.",
+    ],
+    'en': [
+        "Congratulations! You are the winner of our lottery prize, click here to claim.",
+        "Best offer of the year: exclusive discount, limited time only, act now.",
+        "Earn cash from home, 100% free, guarantee of incredible results, call now.",
+    ],
+}
+
+PHISHING = {
+    'vi': [
+        "Cảnh báo bảo mật: phát hiện đăng nhập đáng ngờ, vui lòng xác minh tài khoản ngay lập tức.",
+        "Tài khoản của bạn đã bị giới hạn, nhấp vào đây để xác minh trước khi hết hạn hôm nay.",
+        "Thanh toán bị từ chối, yêu cầu cập nhật thông tin thanh toán để tránh tài khoản bị đình chỉ.",
+    ],
+    'en': [
+        "Security alert: unusual activity detected, verify your account immediately.",
+        "Your account has been limited, click here to verify before it expires today.",
+        "Payment declined, update your payment details or your account will be terminated.",
+    ],
+}
+
+TITLES = {
+    'safe': {'vi': "Thông báo lịch họp", 'en': "Meeting schedule update"},
+    'spam': {'vi': "Ưu đãi đặc biệt dành cho bạn", 'en': "Exclusive offer just for you"},
+    'phishing': {'vi': "Cảnh báo bảo mật tài khoản", 'en': "Account security alert"},
+}
+
+SENDERS = {
+    'safe': ['news@google.com', 'hr@company.vn', 'team@microsoft.com', 'no-reply@github.com'],
+    'spam': ['promo@deals-online.top', 'offer@sale.icu', 'win@lucky-prize.info', 'ads@shop.work'],
+    'phishing': ['security@paypa1.com', 'support@g00gle-verify.com', 'alert@account-verify.net',
+                 'service@rnicrosoft.com'],
+}
+
+URLS = {
+    'safe': ['https://www.github.com/org/repo', 'https://docs.company.vn/report', 'https://example.com/page'],
+    'spam': ['http://bit.ly/{token}', 'https://deals-online.top/{token}', 'http://tinyurl.com/{token}'],
+    'phishing': ['http://secure-login-info.com/{token}', 'https://paypal-secure.com/verify/{token}',
+                 'http://192.168.10.{octet}/login', 'https://apple-id-secure.com/{token}'],
+}
+
+
+class CorpusEmail(NamedTuple):
+    """Một email trong corpus"""
+    title: str
+    content: str
+    sender: str
+    category: str   # Nhãn dự kiến khi sinh (safe, spam, phishing)
+    language: str
+    size: int
+    url_density: float
+
+
+def _url(rng: random.Random, category: str) -> str:
+    template = rng.choice(URLS[category])
+    return template.format(token=''.join(rng.choice('abcdefghijkmnpqrstuvwxyz23456789') for _ in range(8)),
+                           octet=rng.randint(1, 254))
+
+
+def generate_email(rng: random.Random, category: str, language: str, size: int,
+                   url_density: float) -> CorpusEmail:
+    """Sinh một email với nhãn, ngôn ngữ, kích thước và mật độ URL cho trước"""
+    signal = {'safe': [], 'spam': SPAM[language], 'phishing': PHISHING[language]}[category]
+    url_count = int(size * url_density / 1000)
+    if category == 'phishing':
+        url_count = max(url_count, 1)
+
+    sentences: List[str] = []
+    length = 0
+    while length < size:
+        # Khoảng 1/5 số câu mang dấu hiệu spam/phishing, phần còn lại là nội dung thông thường
+        pool = signal if signal and rng.random() < 0.2 else FILLER[language]
+        sentence = rng.choice(pool)
+        sentences.append(sentence)
+        length += len(sentence) + 1
+
+    for _ in range(url_count):
+        sentences.insert(rng.randrange(len(sentences) + 1), _url(rng, category))
+    if signal and not any(sentence in signal for sentence in sentences):
+        sentences.insert(0, rng.choice(signal))
+
+    return CorpusEmail(
+        title=TITLES[category][language],
+        content=' '.join(sentences),
+        sender=rng.choice(SENDERS[category]),
+        category=category,
+        language=language,
+        size=size,
+        url_density=url_density,
+    )
+
+
+def generate_corpus(seed: int = 42, per_combination: int = 5,
+                    sizes: Sequence[int] = BODY_SIZES,
+                    url_densities: Sequence[float] = URL_DENSITIES) -> List[CorpusEmail]:
+    """
+    Sinh corpus gồm mọi tổ hợp nhãn, ngôn ngữ, kích thước và mật độ URL
+
+    Args:
+        seed: Seed của bộ sinh số ngẫu nhiên
+        per_combination: Số email cho mỗi tổ hợp
+        sizes: Các kích thước nội dung (ký tự)
+        url_densities: Các mật độ URL (số URL trên 1000 ký tự)
+
+    Returns:
+        Danh sách email theo thứ tự đã xáo trộn (cố định theo seed)
+    """
+    rng = random.Random(seed)
+    corpus = [
+        generate_email(rng, category, language, size, density)
+        for category in CATEGORIES
+        for language in LANGUAGES
+        for size in sizes
+        for density in url_densities
+        for _ in range(per_combination)
+    ]
+    rng.shuffle(corpus)
+    return corpus
+
+
+def corpus_links(corpus: Sequence[CorpusEmail]) -> List[str]:
+    """Các URL xuất hiện trong corpus, dùng làm đầu vào cho check_link"""
+    seen: Dict[str, None] = {}
+    for email in corpus:
+        for word in email.content.split():
+            if word.startswith(('http://', 'https://')):
+                seen.setdefault(word, None)
+    return list(seen)
+
+
+def iter_senders(corpus: Sequence[CorpusEmail]) -> Iterator[str]:
+    """Người gửi của từng email trong corpus, dùng làm đầu vào cho verify_sender"""
+    return (email.sender for email in corpus)
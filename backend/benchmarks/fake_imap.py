@@ -0,0 +1,398 @@
+"""
+Server IMAP giả lập (không SSL) dùng cho benchmark EmailMonitor.
+
+Chỉ hỗ trợ tập lệnh mà imaplib và EmailMonitor dùng: CAPABILITY, LOGIN,
+SELECT/EXAMINE, SEARCH và FETCH (theo số thứ tự hoặc UID, gồm BODYSTRUCTURE và
+section dạng 1.2 có giới hạn <start.length>), IDLE (khi có trong capabilities),
+NOOP, LOGOUT. Mỗi lệnh được trả lời sau `latency` giây để mô phỏng độ trễ mạng WAN
+và được đếm trong `commands`; số byte gửi tới client được đếm trong `sent_bytes`.
+"""
+import email
+import functools
+import re
+import socket
+import socketserver
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from email.message import EmailMessage, Message
+from email.utils import format_datetime, make_msgid, parsedate_to_datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+FETCH_ITEM = re.compile(
+    r'BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?|BODYSTRUCTURE|RFC822\.SIZE|RFC822|UID|FLAGS',
+    re.IGNORECASE
+)
+SECTION_NUMBER = re.compile(r'^\d+(?:\.\d+)*$')
+
+
+def make_message(index: int, title: str, content: str, sender: str,
+                 received: Optional[datetime] = None, attachment_size: int = 0,
+                 html: Optional[str] = None, charset: str = 'utf-8') -> bytes:
+    """
+    Một email RFC 822 (CRLF): nội dung text/plain (và text/html nếu có html, dạng
+    multipart/alternative), có thể kèm một file đính kèm nhị phân attachment_size byte
+    """
+    message = EmailMessage()
+    message['Subject'] = title
+    message['From'] = sender
+    message['To'] = 'user@example.com'
+    message['Date'] = format_datetime(received or datetime(2026, 1, 1) + timedelta(minutes=index))
+    message['Message-ID'] = make_msgid(idstring=str(index), domain='example.com')
+    message.set_content(content, charset=charset)
+    if html is not None:
+        message.add_alternative(html, subtype='html', charset=charset)
+    if attachment_size:
+        message.add_attachment(bytes(range(256)) * (attachment_size // 256 + 1),
+                               maintype='application', subtype='octet-stream', filename=f'report-{index}.bin')
+    return message.as_bytes().replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+
+
+class FakeMailbox:
+    """Các thư mục email trong bộ nhớ, mỗi email có UID tăng dần theo thư mục"""
+
+    def __init__(self):
+        self.folders: Dict[str, List[Tuple[int, bytes]]] = {}
+        self.uidvalidity: Dict[str, int] = {}
+        self.next_uid: Dict[str, int] = {}
+        self.lock = threading.Condition()
+
+    def add_folder(self, name: str, uidvalidity: int = 1):
+        with self.lock:
+            self.folders[name] = []
+            self.uidvalidity[name] = uidvalidity
+            self.next_uid[name] = 1
+
+    def append(self, folder: str, raw: bytes) -> int:
+        with self.lock:
+            if folder not in self.folders:
+                self.add_folder(folder)
+            uid = self.next_uid[folder]
+            self.next_uid[folder] = uid + 1
+            self.folders[folder].append((uid, raw))
+            self.lock.notify_all()
+            return uid
+
+    def messages(self, folder: str) -> List[Tuple[int, bytes]]:
+        with self.lock:
+            return list(self.folders.get(folder, []))
+
+
+def _unquote(value: bytes) -> str:
+    value = value.strip()
+    if value.startswith(b'"') and value.endswith(b'"'):
+        value = value[1:-1]
+    return value.decode()
+
+
+def _resolve_set(message_set: str, values: Sequence[int]) -> List[int]:
+    """Các giá trị (số thứ tự hoặc UID) thuộc message set dạng 1:5,7,9:*"""
+    if not values:
+        return []
+    highest = max(values)
+    selected = set()
+    for part in message_set.split(','):
+        bounds = [highest if bound == '*' else int(bound) for bound in part.split(':')]
+        low, high = min(bounds), max(bounds)
+        selected.update(value for value in values if low <= value <= high)
+    return sorted(selected)
+
+
+def _quote(value: str) -> bytes:
+    """Chuỗi IMAP: quoted string, hoặc literal nếu có ký tự ngoài ASCII"""
+    data = value.encode('utf-8')
+    if not data.isascii():
+        return b'{%d}\r\n' % len(data) + data
+    return b'"' + data.replace(b'\\', b'\\\\').replace(b'"', b'\\"') + b'"'
+
+
+def _payload(part: Message) -> bytes:
+    """Nội dung của một phần MIME như trên đường truyền (chưa giải mã transfer encoding)"""
+    # BytesParser giữ nội dung gốc với byte ngoài ASCII dạng surrogateescape;
+    # get_payload() có thể đã giải mã theo charset
+    payload = part._payload
+    return payload.encode('ascii', 'surrogateescape') if isinstance(payload, str) else b''
+
+
+def _bodystructure(part: Message) -> bytes:
+    if part.is_multipart():
+        children = b''.join(_bodystructure(child) for child in part.get_payload())
+        return b'(' + children + b' ' + _quote(part.get_content_subtype().upper()) + b')'
+    maintype = part.get_content_maintype().upper()
+    params = part.get_params()[1:] if part.get_params() else []
+    param_list = (b'(' + b' '.join(_quote(key.upper()) + b' ' + _quote(value) for key, value in params) + b')'
+                  if params else b'NIL')
+    body = _payload(part)
+    fields = [_quote(maintype), _quote(part.get_content_subtype().upper()), param_list, b'NIL', b'NIL',
+              _quote((part.get('Content-Transfer-Encoding') or '7BIT').upper()), b'%d' % len(body)]
+    if maintype == 'TEXT':
+        fields.append(b'%d' % body.count(b'\n'))
+    disposition = part.get_content_disposition()
+    if disposition:
+        filename = part.get_filename()
+        fields += [b'NIL', b'(' + _quote(disposition.upper()) + b' ' +
+                   (b'(' + _quote('FILENAME') + b' ' + _quote(filename) + b')' if filename else b'NIL') + b')']
+    return b'(' + b' '.join(fields) + b')'
+
+
+@functools.lru_cache(maxsize=256)
+def _parsed(raw: bytes) -> Message:
+    return email.message_from_bytes(raw)
+
+
+def _numbered_section(raw: bytes, section: str) -> bytes:
+    node = _parsed(raw)
+    for number in section.split('.'):
+        if node.is_multipart():
+            node = node.get_payload()[int(number) - 1]
+        elif number != '1':
+            return b''
+    return _payload(node)
+
+
+def _split(raw: bytes) -> Tuple[bytes, bytes]:
+    end = raw.find(b'\r\n\r\n')
+    return (raw, b'') if end < 0 else (raw[:end + 4], raw[end + 4:])
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Phản hồi được ghi thành nhiều phần nhỏ: tắt Nagle để độ trễ chỉ đến từ `latency`
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.folder: Optional[str] = None
+        # Số email của thư mục mà client đã được báo (EXISTS)
+        self.known = 0
+        self.server.track(self.connection)
+        try:
+            self._serve()
+        except OSError:
+            # Kết nối bị đóng (drop_connections hoặc client ngắt)
+            pass
+
+    def _serve(self):
+        self._send(b'* OK fake IMAP ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.rstrip(b'\r\n').partition(b' ')
+            command, _, args = rest.partition(b' ')
+            command = command.decode().upper()
+            if command == 'UID':
+                sub, _, args = args.partition(b' ')
+                command = f'UID {sub.decode().upper()}'
+            self.server.record(command)
+            time.sleep(self.server.latency)
+            handler = getattr(self, 'do_' + command.replace(' ', '_'), None)
+            if handler is None:
+                self._send(tag + b' BAD unknown command')
+                continue
+            keep_open = handler(args)
+            self._report_exists()
+            self._send(tag + b' OK ' + command.encode() + b' completed')
+            if keep_open is False:
+                return
+
+    def _send(self, data: bytes):
+        self._write(data + b'\r\n')
+
+    def _write(self, data: bytes):
+        self.server.sent(len(data))
+        self.wfile.write(data)
+
+    def _report_exists(self):
+        """Như server thật: báo EXISTS cho email mới đến kèm phản hồi của lệnh bất kỳ"""
+        if self.folder is None:
+            return
+        count = len(self.server.mailbox.messages(self.folder))
+        if count > self.known:
+            self._send(b'* %d EXISTS' % count)
+            self.known = count
+
+    def do_CAPABILITY(self, args):
+        self._send(b'* CAPABILITY ' + ' '.join(self.server.capabilities).encode())
+
+    def do_LOGIN(self, args):
+        pass
+
+    def do_NOOP(self, args):
+        pass
+
+    def do_LOGOUT(self, args):
+        self._send(b'* BYE logging out')
+        return False
+
+    def do_IDLE(self, args):
+        """Báo EXISTS mỗi khi thư mục có email mới, đến khi client gửi DONE"""
+        if 'IDLE' not in self.server.capabilities:
+            return
+        mailbox = self.server.mailbox
+        done = threading.Event()
+
+        def wait_done():
+            self.rfile.readline()
+            done.set()
+
+        threading.Thread(target=wait_done, daemon=True).start()
+        self._send(b'+ idling')
+        while not done.is_set():
+            self._report_exists()
+            with mailbox.lock:
+                mailbox.lock.wait(0.05)
+
+    def do_SELECT(self, args):
+        self.folder = _unquote(args)
+        mailbox = self.server.mailbox
+        messages = mailbox.messages(self.folder)
+        self.known = len(messages)
+        self._send(b'* %d EXISTS' % len(messages))
+        self._send(b'* 0 RECENT')
+        self._send(b'* OK [UIDVALIDITY %d] UIDs valid' % mailbox.uidvalidity.get(self.folder, 1))
+        self._send(b'* OK [UIDNEXT %d] Predicted next UID' % mailbox.next_uid.get(self.folder, 1))
+
+    do_EXAMINE = do_SELECT
+
+    def _search(self, args: bytes, by_uid: bool):
+        messages = self.server.mailbox.messages(self.folder)
+        matched = list(range(len(messages)))
+        tokens = args.decode().strip('()').split()
+        position = 0
+        while position < len(tokens):
+            token = tokens[position].upper()
+            if token == 'SINCE':
+                since = datetime.strptime(tokens[position + 1].strip('"'), '%d-%b-%Y')
+                matched = [index for index in matched
+                           if _date(messages[index][1]) >= since]
+                position += 2
+            elif token == 'UID':
+                uids = set(_resolve_set(tokens[position + 1], [uid for uid, _ in messages]))
+                matched = [index for index in matched if messages[index][0] in uids]
+                position += 2
+            else:
+                position += 1
+        values = [messages[index][0] if by_uid else index + 1 for index in matched]
+        self._send(b'* SEARCH' + b''.join(b' %d' % value for value in values))
+
+    def do_SEARCH(self, args):
+        self._search(args, by_uid=False)
+
+    def do_UID_SEARCH(self, args):
+        self._search(args, by_uid=True)
+
+    def _fetch(self, args: bytes, by_uid: bool):
+        message_set, _, items = args.decode().partition(' ')
+        messages = self.server.mailbox.messages(self.folder)
+        if by_uid:
+            positions = {uid: index for index, (uid, _) in enumerate(messages)}
+            indexes = [positions[uid] for uid in _resolve_set(message_set, list(positions))]
+        else:
+            indexes = [seq - 1 for seq in _resolve_set(message_set, list(range(1, len(messages) + 1)))]
+        for index in indexes:
+            uid, raw = messages[index]
+            self._write(b'* %d FETCH (' % (index + 1) + self._fetch_items(uid, raw, items, by_uid) + b')\r\n')
+
+    def _fetch_items(self, uid: int, raw: bytes, items: str, by_uid: bool) -> bytes:
+        parts = [b'UID %d' % uid] if by_uid else []
+        for match in FETCH_ITEM.finditer(items):
+            name = match.group(0).upper()
+            if name == 'UID':
+                if not by_uid:
+                    parts.append(b'UID %d' % uid)
+            elif name == 'RFC822.SIZE':
+                parts.append(b'RFC822.SIZE %d' % len(raw))
+            elif name == 'FLAGS':
+                parts.append(b'FLAGS ()')
+            elif name == 'BODYSTRUCTURE':
+                parts.append(b'BODYSTRUCTURE ' + _bodystructure(_parsed(raw)))
+            elif name == 'RFC822':
+                parts.append(b'RFC822 {%d}\r\n' % len(raw) + raw)
+            else:
+                section, start, length = match.group(1).upper(), match.group(2), match.group(3)
+                data = self._section(raw, section)
+                label = f'BODY[{section}]'
+                if start is not None:
+                    data = data[int(start):int(start) + int(length)]
+                    label += f'<{start}>'
+                parts.append(label.encode() + b' {%d}\r\n' % len(data) + data)
+        return b' '.join(parts)
+
+    def _section(self, raw: bytes, section: str) -> bytes:
+        header, text = _split(raw)
+        if section == 'HEADER':
+            return header
+        if section == 'TEXT':
+            return text
+        if SECTION_NUMBER.match(section):
+            return _numbered_section(raw, section)
+        return raw
+
+    def do_FETCH(self, args):
+        self._fetch(args, by_uid=False)
+
+    def do_UID_FETCH(self, args):
+        self._fetch(args, by_uid=True)
+
+
+def _date(raw: bytes) -> datetime:
+    header = _split(raw)[0].decode('utf-8', errors='replace')
+    match = re.search(r'^Date: (.+)$', header, re.MULTILINE | re.IGNORECASE)
+    return parsedate_to_datetime(match.group(1).strip()).replace(tzinfo=None)
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    """Server IMAP giả lập chạy trong một thread nền, lắng nghe trên cổng ngẫu nhiên của 127.0.0.1"""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, mailbox: Optional[FakeMailbox] = None, latency: float = 0.0,
+                 capabilities: Sequence[str] = ('IMAP4rev1',)):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.mailbox = mailbox or FakeMailbox()
+        self.latency = latency
+        self.capabilities = tuple(capabilities)
+        self.commands: Counter = Counter()
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+        self._connections: List = []
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def record(self, command: str):
+        with self._lock:
+            self.commands[command] += 1
+
+    def track(self, connection):
+        with self._lock:
+            self._connections.append(connection)
+
+    def drop_connections(self):
+        """Đóng mọi kết nối đang mở, mô phỏng server khởi động lại hoặc mất mạng"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def sent(self, size: int):
+        with self._lock:
+            self.sent_bytes += size
+
+    def reset_stats(self):
+        with self._lock:
+            self.commands.clear()
+            self.sent_bytes = 0
+
+    def start(self) -> 'FakeIMAPServer':
+        threading.Thread(target=self.serve_forever, name='fake-imap', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
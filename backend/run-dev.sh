@@ -39,22 +39,7 @@ while ! docker exec email_analyzer_api ls >/dev/null 2>&1; do
 done
 
 echo "Tạo bảng database (nếu chưa có)..."
-docker exec email_analyzer_api python -c "
-import sys, os, glob, importlib
-sys.path.insert(0, '/app')
-try:
-    from database.session import Base, engine
-    models_dir = os.path.join('/app', 'models')
-    for file in glob.glob(os.path.join(models_dir, '*.py')):
-        name = os.path.splitext(os.path.basename(file))[0]
-        if name != '__init__':
-            importlib.import_module(f'models.{name}')
-    Base.metadata.create_all(bind=engine)
-    print('Đã tạo bảng thành công (hoặc đã tồn tại)')
-except Exception as e:
-    print('Lỗi khi tạo bảng:', e)
-    sys.exit(1)
-"
+docker exec -w /app email_analyzer_api python -m database.migrations || exit 1
 
 echo "Môi trường development đã sẵn sàng tại http://localhost:8000"
 docker-compose $COMPOSE_FILES logs -f api 
\ No newline at end of file
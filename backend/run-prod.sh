@@ -35,7 +35,7 @@ if docker ps | grep -q "email_analyzer_api"; then
     
     # Tạo bảng trong database nếu chưa tồn tại
     echo "Kiểm tra và tạo bảng database..."
-    docker exec -it email_analyzer_api python -c "from database.session import Base, engine; Base.metadata.create_all(bind=engine); print('Tạo bảng database thành công')"
+    docker exec -it -w /app email_analyzer_api python -m database.migrations
 else
     echo "Lỗi: API không khởi động. Kiểm tra logs:"
     docker-compose logs api
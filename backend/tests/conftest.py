@@ -0,0 +1,92 @@
+"""
+Cấu hình chung cho các test: database SQLite tạm thay cho MySQL, không chạy tác vụ
+nền, không cache để mọi lần gọi đều phân tích / truy vấn thật. Chạy từ thư mục backend:
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+
+# Biến môi trường phải được đặt trước khi import các module của ứng dụng
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix='tests_'), 'test.db')
+os.environ["DATABASE_ECHO"] = "False"
+os.environ["JOB_WORKERS"] = "0"
+os.environ["RESPONSE_CACHE_TTL"] = "0"
+os.environ["ANALYSIS_CACHE_SIZE"] = "0"
+os.environ["ANALYSIS_CACHE_PERSISTENT"] = "False"
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'app'))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+import pytest  # noqa: E402
+
+from corpus import generate_corpus  # noqa: E402
+from fake_imap import FakeIMAPServer, FakeMailbox, make_message  # noqa: E402
+from database.migrations import migrate  # noqa: E402
+from database.session import SessionLocal, engine  # noqa: E402
+from services.email_analyzer import EmailAnalyzer  # noqa: E402
+from utils.email_monitor import EmailMonitor  # noqa: E402
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    """Tạo schema một lần cho cả phiên test"""
+    migrate(engine)
+    yield engine
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope='session')
+def analyzer():
+    analyzer = EmailAnalyzer()
+    yield analyzer
+    analyzer.close()
+
+
+@pytest.fixture(scope='session')
+def corpus():
+    """Corpus tổng hợp cố định theo seed (an toàn, spam, phishing; tiếng Việt và tiếng Anh)"""
+    return generate_corpus(seed=42, per_combination=1, sizes=(500, 5_000))
+
+
+@pytest.fixture(scope='session')
+def client():
+    """Client HTTP gọi thẳng ứng dụng FastAPI (không chạy sự kiện startup)"""
+    from fastapi.testclient import TestClient
+    from main import app
+    return TestClient(app)
+
+
+@pytest.fixture
+def mailbox():
+    """Hộp thư giả lập có thư mục INBOX với một email"""
+    mailbox = FakeMailbox()
+    mailbox.add_folder('INBOX')
+    mailbox.append('INBOX', make_message(0, "Welcome", "Xin chào", 'sender@example.com'))
+    return mailbox
+
+
+@pytest.fixture
+def server(mailbox):
+    """Server IMAP giả lập (có IDLE) phục vụ mailbox"""
+    server = FakeIMAPServer(mailbox, capabilities=('IMAP4rev1', 'IDLE')).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def monitor(server):
+    monitor = EmailMonitor('user@example.com', 'secret', imap_server='127.0.0.1',
+                           imap_port=server.port, use_ssl=False)
+    yield monitor
+    monitor.disconnect()
@@ -0,0 +1,41 @@
+"""
+Bản thay thế Redis trong bộ nhớ cho test: chỉ các lệnh mà ứng dụng dùng
+(get, set với ex, incr), thời gian hết hạn theo đồng hồ điều khiển được.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+
+class FakeRedis:
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires is not None and expires <= self.clock():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value, ex: Optional[int] = None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        elif isinstance(value, int):
+            value = str(value).encode('ascii')
+        with self._lock:
+            self._data[key] = (self.clock() + ex if ex is not None else None, value)
+        return True
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            expires, value = self._data.get(key, (None, b'0'))
+            value = int(value) + 1
+            self._data[key] = (expires, str(value).encode('ascii'))
+            return value
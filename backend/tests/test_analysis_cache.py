@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database.session import SessionLocal
+from models.analysis_cache import AnalysisResultCache
+from services.analysis_cache import AnalysisCache, DatabaseCacheTier, analysis_cache_key
+from services.email_analyzer import EmailAnalyzer
+from services.rule_set import StaticRuleSource
+
+CAMPAIGN = ("Tài khoản của bạn bị khóa", "Verify your account at http://secure-verify.xyz/login now",
+            "Alerts@Example.com")
+
+
+@pytest.fixture
+def tier():
+    return DatabaseCacheTier(SessionLocal, AnalysisResultCache)
+
+
+def cached_analyzer(persistent=None) -> EmailAnalyzer:
+    analyzer = EmailAnalyzer(StaticRuleSource())
+    analyzer.result_cache = AnalysisCache(maxsize=100, persistent=persistent)
+    return analyzer
+
+
+def count_analyses(monkeypatch, analyzer) -> list:
+    calls = []
+    analyze = analyzer._analyze_email
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return analyze(*args, **kwargs)
+
+    monkeypatch.setattr(analyzer, '_analyze_email', counting)
+    return calls
+
+
+def test_cache_key():
+    key = analysis_cache_key("Title", "Body http://Example.com/A", "User@Example.com ", "v1")
+    assert key == analysis_cache_key("Title", "Body http://Example.com/A", "user@example.com", "v1")
+    assert key != analysis_cache_key("title", "Body http://Example.com/A", "user@example.com", "v1")
+    assert key != analysis_cache_key("Title", "Body http://example.com/a", "user@example.com", "v1")
+    assert key != analysis_cache_key("Title", "Body http://Example.com/A", "user@example.com", "v2")
+    # Ranh giới giữa các phần được giữ: ("ab", "c") khác ("a", "bc")
+    assert analysis_cache_key("ab", "c", "", "v1") != analysis_cache_key("a", "bc", "", "v1")
+
+
+def test_memory_tier_returns_independent_copies():
+    cache = AnalysisCache(maxsize=10, max_bytes=200)
+    cache.set('k', {'category': 'spam', 'indicators': ['a']}, 'v1')
+    first = cache.get('k')
+    first['indicators'].append('b')
+    assert cache.get('k') == {'category': 'spam', 'indicators': ['a']}
+
+    cache.set_many({f'big{i}': {'text': 'x' * 80} for i in range(3)}, 'v1')
+    assert cache.memory.bytes <= 200
+    assert cache.get('k') is None and cache.get('big2') is not None
+
+
+def test_campaign_duplicates_are_analyzed_once(monkeypatch):
+    analyzer = cached_analyzer()
+    calls = count_analyses(monkeypatch, analyzer)
+    first = analyzer.analyze_email(*CAMPAIGN)
+    assert analyzer.analyze_email(*CAMPAIGN) == first
+    results = analyzer.analyze_many([CAMPAIGN] * 5 + [("Other", "Hello", "friend@example.com")] * 2, workers=1)
+    assert results[:5] == [first] * 5
+    assert calls == [CAMPAIGN[0], "Other"]
+
+    # Tải lại quy tắc có nội dung khác: khóa mới, kết quả cũ không được dùng
+    analyzer.rule_source = StaticRuleSource({'spam_words': ['hello']})
+    analyzer.load_rules()
+    analyzer.analyze_email(*CAMPAIGN)
+    assert calls == [CAMPAIGN[0], "Other", CAMPAIGN[0]]
+    analyzer.close()
+
+
+def test_persistent_tier_is_shared_between_workers(monkeypatch, tier):
+    email = ("Persistent tier", "Nội dung dùng chung giữa các worker", "a@example.com")
+    first = cached_analyzer(tier)
+    expected = first.analyze_email(*email)
+    first.close()
+
+    # Worker khác (bộ nhớ trống) đọc kết quả từ database thay vì phân tích lại
+    second = cached_analyzer(tier)
+    calls = count_analyses(monkeypatch, second)
+    assert second.analyze_email(*email) == expected
+    assert second.analyze_many([email, email], workers=1) == [expected, expected]
+    assert calls == []
+    assert tier.hits >= 1
+    second.close()
+
+
+def test_prune_removes_other_versions_and_expired_rows(tier):
+    db = SessionLocal()
+    try:
+        old = datetime.now() - timedelta(days=30)
+        db.add_all([AnalysisResultCache(cache_key=f"prune-old-version-{i}", rules_version='old', result={})
+                    for i in range(5)])
+        db.add(AnalysisResultCache(cache_key="prune-expired", rules_version='current', result={}, created_at=old))
+        db.add(AnalysisResultCache(cache_key="prune-fresh", rules_version='current', result={}))
+        db.commit()
+    finally:
+        db.close()
+
+    assert tier.prune('current', chunk_size=2) >= 5
+    assert set(tier.get_many(["prune-old-version-0", "prune-expired", "prune-fresh"])) == {"prune-expired", "prune-fresh"}
+    assert tier.prune('current', max_age=86400) >= 1
+    assert set(tier.get_many(["prune-expired", "prune-fresh"])) == {"prune-fresh"}
+    assert tier.prune('current', max_age=86400) == 0
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+
+from models.analysis_checkpoint import AnalysisCheckpoint
+from models.email import Email
+from services import batch_analysis
+from services.email_analyzer import EmailAnalyzer
+
+
+class BrokenTitleAnalyzer(EmailAnalyzer):
+    """Lô luôn lỗi và email có 'broken' trong tiêu đề không phân tích được"""
+
+    def analyze_many(self, emails, **kwargs):
+        raise RuntimeError("batch failed")
+
+    def analyze_email(self, title, content, sender='', lazy=None):
+        if 'broken' in title:
+            raise RuntimeError("analysis failed")
+        return super().analyze_email(title, content, sender)
+
+
+@pytest.fixture
+def pending(db, analyzer):
+    """Phân tích hết email tồn đọng của các test khác rồi thêm email chưa phân loại mới"""
+    assert batch_analysis.analyze_unknown_emails(db, analyzer).finished
+
+    def add(*titles):
+        emails = [Email(title=title, content=f"Please verify your account now ({title})",
+                        from_email='alerts@example.com', to_email='user@example.com',
+                        received_time=datetime(2024, 3, 1, 9, 0), category='unknown') for title in titles]
+        db.add_all(emails)
+        db.commit()
+        return [email.id for email in emails]
+
+    return add
+
+
+def categories(db, ids):
+    return {email_id: category for email_id, category in db.query(Email.id, Email.category).filter(Email.id.in_(ids)).order_by(Email.id)}
+
+
+def test_interrupted_run_resumes_from_checkpoint(db, analyzer, pending):
+    ids = pending(*(f"batch-{i}" for i in range(7)))
+    chunks = []
+
+    def stop_after_first(result):
+        chunks.append(result.processed)
+        return False
+
+    first = batch_analysis.analyze_unknown_emails(db, analyzer, chunk_size=3, on_chunk=stop_after_first)
+    assert (first.processed, first.finished, chunks) == (3, False, [3])
+    checkpoint = db.get(AnalysisCheckpoint, batch_analysis.CHECKPOINT_NAME)
+    assert (checkpoint.last_id, checkpoint.processed) == (ids[2], 3)
+    assert batch_analysis.count_pending(db) == 4
+    assert list(categories(db, ids).values()).count('unknown') == 4
+
+    second = batch_analysis.analyze_unknown_emails(db, analyzer, chunk_size=3, on_chunk=lambda result: chunks.append(result.processed))
+    assert (second.resumed_from, second.processed, second.finished) == (ids[2], 4, True)
+    assert chunks == [3, 3, 4]
+    assert 'unknown' not in categories(db, ids).values()
+    db.expire_all()
+    assert db.get(AnalysisCheckpoint, batch_analysis.CHECKPOINT_NAME) is None
+
+
+def test_limit_stops_early_and_keeps_checkpoint(db, analyzer, pending):
+    ids = pending(*(f"limit-{i}" for i in range(5)))
+    result = batch_analysis.analyze_unknown_emails(db, analyzer, limit=2, chunk_size=10)
+    assert (result.processed, result.finished) == (2, False)
+    assert db.get(AnalysisCheckpoint, batch_analysis.CHECKPOINT_NAME).last_id == ids[1]
+    assert batch_analysis.analyze_unknown_emails(db, analyzer).processed == 3
+
+
+def test_failed_emails_are_skipped_and_retried_next_run(db, analyzer, pending):
+    ids = pending("retry-ok-1", "retry-broken", "retry-ok-2")
+    with_failure = BrokenTitleAnalyzer()
+    try:
+        result = batch_analysis.analyze_unknown_emails(db, with_failure, chunk_size=2)
+    finally:
+        with_failure.close()
+    assert (result.processed, result.failed, result.finished) == (2, 1, True)
+    assert [category == 'unknown' for category in categories(db, ids).values()] == [False, True, False]
+
+    # Checkpoint đã bị xóa khi duyệt hết: lượt sau phân tích lại email lỗi
+    retried = batch_analysis.analyze_unknown_emails(db, analyzer)
+    assert (retried.resumed_from, retried.processed) == (0, 1)
+    assert 'unknown' not in categories(db, ids).values()
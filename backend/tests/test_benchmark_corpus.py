@@ -0,0 +1,47 @@
+from collections import Counter
+
+from bench_analyzer import compare, percentile, run_scenario
+from corpus import CATEGORIES, LANGUAGES, PHISHING, SPAM, corpus_links, generate_corpus
+
+
+def test_corpus_is_reproducible_by_seed():
+    first = generate_corpus(seed=7, per_combination=1, sizes=(500,))
+    assert first == generate_corpus(seed=7, per_combination=1, sizes=(500,))
+    assert first != generate_corpus(seed=8, per_combination=1, sizes=(500,))
+
+
+def test_corpus_covers_every_combination():
+    corpus = generate_corpus(seed=1, per_combination=2, sizes=(500, 5_000), url_densities=(0.0, 5.0))
+    combinations = Counter((email.category, email.language, email.size, email.url_density) for email in corpus)
+    assert len(combinations) == len(CATEGORIES) * len(LANGUAGES) * 2 * 2
+    assert set(combinations.values()) == {2}
+
+    for email in corpus:
+        assert len(email.content) >= email.size
+        urls = sum(word.startswith(('http://', 'https://')) for word in email.content.split())
+        expected = int(email.size * email.url_density / 1000)
+        assert urls == (max(expected, 1) if email.category == 'phishing' else expected)
+        signal = {'safe': (), 'spam': SPAM[email.language], 'phishing': PHISHING[email.language]}[email.category]
+        assert not signal or any(sentence in email.content for sentence in signal)
+    assert all(link.startswith(('http://', 'https://')) for link in corpus_links(corpus))
+
+
+def test_corpus_labels_match_analyzer(analyzer, corpus):
+    for email in corpus:
+        category = analyzer.analyze_email(email.title, email.content, email.sender)['category']
+        if email.category == 'safe':
+            assert category == 'safe', email.title
+        else:
+            assert category != 'safe', email.title
+
+
+def test_run_scenario_and_compare():
+    assert percentile([1, 2, 3, 4], 0.5) == 2
+    assert percentile([1, 2, 3, 4], 0.99) == 4
+    result = run_scenario(lambda value: value * 2, [(1,), (2,)], min_time=0.001)
+    assert result['calls'] >= 2
+    assert result['p50_us'] <= result['p99_us'] <= result['max_us']
+
+    baseline = {'meta': {'commit': 'abc'}, 'scenarios': {'a': {'p50_us': 10.0}, 'b': {'p50_us': 10.0}}}
+    assert compare({'scenarios': {'a': {'p50_us': 10.5}, 'c': {'p50_us': 99.0}}}, baseline, 0.1) is False
+    assert compare({'scenarios': {'a': {'p50_us': 10.5}, 'b': {'p50_us': 12.0}}}, baseline, 0.1) is True
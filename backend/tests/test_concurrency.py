@@ -0,0 +1,156 @@
+"""
+Bản rút gọn của benchmarks/bench_concurrency.py: độ trễ của các request nhẹ không
+được tăng đáng kể khi có các request phân tích nặng chạy đồng thời.
+"""
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from database.session import SessionLocal
+from models.email import Email
+
+LIGHT_PATHS = ('/api/emails/stats', '/api/emails/?limit=50', '/')
+DURATION = 1.5
+MAX_RATIO = 5.0
+SLACK_MS = 50.0
+
+
+@pytest.fixture(scope='module')
+def app(corpus):
+    from main import app
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        db.add_all(
+            Email(title=item.title, content=item.content, from_email=item.sender, to_email='user@example.com',
+                  received_time=now - timedelta(minutes=index * 7), category='safe')
+            for index, item in enumerate(corpus)
+        )
+        db.commit()
+    finally:
+        db.close()
+    return app
+
+
+def p95(values):
+    values = sorted(values)
+    return values[max(0, int(round(0.95 * len(values) + 0.5)) - 1)]
+
+
+async def scenario(app, payloads, heavy_clients):
+    from utils.concurrency import configure_threadpool
+    configure_threadpool(int(os.getenv("THREADPOOL_SIZE", "40")))
+    latencies = []
+    analyzed = [0]
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        deadline = time.perf_counter() + DURATION
+
+        async def light():
+            index = 0
+            while time.perf_counter() < deadline:
+                begin = time.perf_counter()
+                response = await client.get(LIGHT_PATHS[index % len(LIGHT_PATHS)])
+                latencies.append((time.perf_counter() - begin) * 1000)
+                assert response.status_code == 200
+                index += 1
+
+        async def heavy():
+            index = 0
+            while time.perf_counter() < deadline:
+                response = await client.post('/api/emails/analyze', json=payloads[index % len(payloads)])
+                assert response.status_code == 200
+                analyzed[0] += 1
+                index += 1
+
+        await asyncio.gather(*([light() for _ in range(2)] + [heavy() for _ in range(heavy_clients)]))
+    return latencies, analyzed[0]
+
+
+def test_light_requests_stay_fast_under_analysis_load(app):
+    from corpus import generate_corpus
+    payloads = [{'title': item.title, 'content': item.content, 'sender': item.sender}
+                for item in generate_corpus(seed=1, per_combination=1, sizes=(50_000,))]
+
+    idle, _ = asyncio.run(scenario(app, payloads, heavy_clients=0))
+    mixed, analyzed = asyncio.run(scenario(app, payloads, heavy_clients=2))
+
+    assert analyzed > 0
+    assert p95(mixed) <= p95(idle) * MAX_RATIO + SLACK_MS
+
+
+def test_database_is_never_queried_on_the_event_loop(app):
+    """Mọi truy vấn database của các route phải chạy trong threadpool, không trên event loop"""
+    from sqlalchemy import event
+    from database.session import engine
+
+    on_loop = []
+
+    def check(conn, cursor, statement, *args):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        on_loop.append(statement.split()[0])
+
+    async def requests():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+            for path in LIGHT_PATHS + ('/api/emails/?cursor=&limit=5', '/api/emails/cache-stats'):
+                assert (await client.get(path)).status_code == 200
+            response = await client.post('/api/emails/bulk', content=(
+                b'{"title": "Loop check", "content": "hello", "from_email": "a@example.com", '
+                b'"to_email": "b@example.com", "received_time": "2024-02-03T10:00:00"}\n'
+            ))
+            assert response.json()['inserted'] == 1
+            assert (await client.post('/api/emails/analyze', json={
+                'title': 'Hi', 'content': 'Hello', 'sender': 'a@example.com'})).status_code == 200
+
+    event.listen(engine, 'before_cursor_execute', check)
+    try:
+        asyncio.run(requests())
+    finally:
+        event.remove(engine, 'before_cursor_execute', check)
+    assert on_loop == []
+
+
+def test_run_analysis_keeps_event_loop_responsive():
+    from utils.concurrency import analysis_executor, run_analysis
+
+    def blocking(value):
+        time.sleep(0.3)
+        return value * 2, threading.current_thread().name
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await run_analysis(blocking, 21)
+        task.cancel()
+        return result, ticks
+
+    (value, thread_name), ticks = asyncio.run(main())
+    assert value == 42
+    assert thread_name.startswith(analysis_executor._thread_name_prefix)
+    assert ticks >= 10
+
+
+def test_configure_threadpool_sets_limiter():
+    import anyio.to_thread
+    from utils.concurrency import configure_threadpool
+
+    async def main():
+        configure_threadpool(7)
+        configure_threadpool(0)
+        return anyio.to_thread.current_default_thread_limiter().total_tokens
+
+    assert asyncio.run(main()) == 7
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from services.domain_index import DomainFeed, DomainIndex, normalize_domain, parent_domains, read_domain_list
+from services.email_analyzer import EmailAnalyzer
+from services.rule_set import StaticRuleSource
+
+
+def test_normalize_domain():
+    assert normalize_domain(" User@Login.PayPal.com:443 ") == "login.paypal.com"
+    assert normalize_domain("*.example.com.") == "example.com"
+    assert normalize_domain("[::1]:8080") == "::1"
+    assert list(parent_domains("www.paypal.com")) == ["com", "paypal.com", "www.paypal.com"]
+
+
+def test_match_parent_domain_not_across_label_boundary():
+    index = DomainIndex(["evil.com", "bad.co.uk"])
+    assert index.match("evil.com") == "evil.com"
+    assert index.match("login.secure.evil.com") == "evil.com"
+    assert index.match("x.bad.co.uk") == "bad.co.uk"
+    # Chỉ khớp theo nhãn: "notevil.com" và "evil.com.example.org" không phải domain con của evil.com
+    assert index.match("notevil.com") is None
+    assert index.match("evil.com.example.org") is None
+    assert index.match("co.uk") is None
+    assert "sub.evil.com" in index and "evil.co" not in index
+
+
+def test_feed_file_matches_and_is_shared_by_readers(tmp_path):
+    blocklist = tmp_path / "blocklist.txt"
+    blocklist.write_text("# feed\n0.0.0.0 phish.example\nmalware.test  # ghi chú\n\n*.wild.example\n")
+    domains = list(read_domain_list(str(blocklist)))
+    assert domains == ["phish.example", "malware.test", "wild.example"]
+
+    path = str(tmp_path / "feed.idx")
+    # Feed lớn hơn bảng mặc định để có va chạm và dò tuyến tính
+    assert DomainFeed.build(domains + [f"d{i}.example" for i in range(1000)], path) == 1003
+    feed, other = DomainFeed(path), DomainFeed(path)
+    try:
+        index = DomainIndex(["inline.example"], [feed])
+        assert len(index) == 1004
+        assert index.match("a.b.phish.example") == "phish.example"
+        assert index.match("d999.example") == "d999.example"
+        assert index.match("inline.example") == "inline.example"
+        assert index.match("d1000.example") is None
+        assert all(f"d{i}.example" in other for i in range(1000))
+    finally:
+        feed.close()
+        other.close()
+
+
+def test_invalid_feed_file_is_rejected(tmp_path):
+    path = tmp_path / "broken.idx"
+    path.write_bytes(b"NOTANIDX" + bytes(16))
+    with pytest.raises(ValueError):
+        DomainFeed(str(path))
+    DomainFeed.build(["a.example"], str(path))
+    path.write_bytes(path.read_bytes()[:-8])
+    with pytest.raises(ValueError):
+        DomainFeed(str(path))
+
+
+def test_rebuilt_feed_is_picked_up_on_reload(tmp_path):
+    path = str(tmp_path / "phishing.idx")
+    DomainFeed.build(["old-phish.example"], path)
+    old = DomainFeed(path)
+
+    analyzer = EmailAnalyzer(StaticRuleSource({'phishing_domain_feeds': [path]}))
+    try:
+        assert analyzer.rules.phishing_index.match("x.old-phish.example")
+        assert analyzer.reload_rules() is False
+
+        # File được thay thế nguyên tử: bản đã mở vẫn đọc được nội dung cũ
+        DomainFeed.build(["new-phish.example", "other.example"], path)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert "old-phish.example" in old
+
+        assert analyzer.reload_rules() is True
+        rules = analyzer.rules
+        assert rules.phishing_index.match("new-phish.example")
+        assert not rules.phishing_index.match("old-phish.example")
+        assert analyzer._check_suspicious_sender("billing@new-phish.example")
+    finally:
+        old.close()
+        analyzer.close()
@@ -0,0 +1,41 @@
+import threading
+
+
+def test_analyze_many_matches_analyze_email(analyzer, corpus):
+    emails = [(item.title, item.content, item.sender) for item in corpus]
+    expected = [analyzer.analyze_email(*email) for email in emails]
+
+    assert analyzer.analyze_many(emails, workers=1) == expected
+    assert analyzer.analyze_many(iter(emails), workers=2, chunksize=8) == expected
+
+
+def test_analyze_many_keeps_order_of_duplicates(analyzer, corpus):
+    emails = [(item.title, item.content, item.sender) for item in corpus[:5]] * 3
+    results = analyzer.analyze_many(emails, workers=1)
+    assert results == [analyzer.analyze_email(*email) for email in emails]
+    # Các kết quả là dict riêng biệt, sửa một kết quả không ảnh hưởng kết quả khác
+    results[0]['category'] = 'changed'
+    assert results[5]['category'] != 'changed'
+
+
+def test_analyze_many_shares_pool_across_threads_and_reloads(analyzer, corpus):
+    emails = [(item.title, item.content, item.sender) for item in corpus]
+    expected = [analyzer.analyze_email(*email) for email in emails]
+    errors, outputs = [], []
+
+    def run():
+        try:
+            outputs.append(analyzer.analyze_many(iter(emails), workers=2, chunksize=8))
+        except Exception as e:
+            errors.append(repr(e))
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    # Nạp lại quy tắc trong khi các lời gọi khác đang dùng process pool
+    analyzer.load_rules()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(output == expected for output in outputs)
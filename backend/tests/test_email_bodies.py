@@ -0,0 +1,100 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import text
+
+from database.session import engine
+from models.email import Email
+from models.email_body import EmailBody
+from services import email_bodies, email_ingest, partitions
+
+TEXT = "Xin chào, đây là nội dung email tiếng Việt. " * 200 + "\ud83d"
+
+
+@pytest.mark.parametrize('codec', ['zstd', 'zlib', 'none'])
+def test_codecs_round_trip(codec):
+    if codec == 'zstd' and email_bodies.zstandard is None:
+        pytest.skip("zstandard chưa được cài đặt")
+    data = email_bodies.compress(TEXT, codec)
+    assert email_bodies.decompress(data, codec) == TEXT
+    if codec != 'none':
+        assert len(data) < len(TEXT) // 10
+
+
+def test_body_codec_falls_back_without_zstandard(monkeypatch):
+    monkeypatch.setattr(email_bodies, 'zstandard', None)
+    for configured, expected in (('auto', 'zlib'), ('zstd', 'zlib'), ('none', 'none'), ('ZLIB', 'zlib')):
+        monkeypatch.setenv('EMAIL_BODY_CODEC', configured)
+        assert email_bodies.body_codec() == expected
+    with pytest.raises(RuntimeError):
+        email_bodies.decompress(b'\x28\xb5\x2f\xfd', 'zstd')
+
+
+def test_ingested_body_is_stored_compressed(db, analyzer, client):
+    result = email_ingest.IngestResult()
+    email_ingest.insert_batch(db, analyzer, [(0, {
+        'title': 'Compressed body', 'content': TEXT, 'from_email': 'a@example.com', 'to_email': 'b@example.com',
+        'received_time': datetime(2024, 4, 1, 8, 0), 'message_id': '<compressed-body@example.com>',
+    }, None)], result)
+    assert result.inserted == 1
+
+    email = db.query(Email).filter(Email.message_id == '<compressed-body@example.com>').one()
+    body = db.get(EmailBody, (email.id, email.received_time))
+    assert email.content == ''
+    assert body.codec == email_bodies.body_codec()
+    assert body.size == len(TEXT.encode('utf-8', errors='surrogatepass')) and len(body.data) < body.size
+    assert email_bodies.load_body(db, email) == TEXT
+    assert client.get(f'/api/emails/{email.id}').json()['content'] == TEXT
+
+
+def test_move_inline_bodies(db):
+    emails = [Email(title=f'Inline {i}', content=f"Nội dung cũ {i} " * 50, from_email='a@example.com',
+                    to_email='b@example.com', received_time=datetime(2024, 4, 2, 8, i), category='safe')
+              for i in range(3)]
+    db.add_all(emails)
+    db.commit()
+    contents = {email.id: email.content for email in emails}
+    before = email_bodies.storage_stats(db)
+
+    assert email_bodies.move_inline_bodies(db, chunk_size=2, codec='zlib') >= 3
+    assert email_bodies.move_inline_bodies(db, codec='zlib') == 0
+    db.expire_all()
+    refs = [(email.id, email.received_time, email.content) for email in emails]
+    assert all(content == '' for _, _, content in refs)
+    assert email_bodies.load_bodies(db, refs) == contents
+
+    after = email_bodies.storage_stats(db)
+    assert after['bodies'] >= before['bodies'] + 3
+    assert after['raw_bytes'] - before['raw_bytes'] >= sum(len(content.encode()) for content in contents.values())
+
+
+def test_partition_helpers():
+    assert partitions._add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert partitions._add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert partitions._months(date(2024, 11, 1), date(2025, 1, 1)) == [
+        date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1)]
+    assert partitions._partition_month('p202402') == date(2024, 2, 1)
+    assert partitions._partition_month('pmax') is None
+    assert partitions._partition_definition(date(2024, 12, 1)) == (
+        "PARTITION p202412 VALUES LESS THAN (TO_DAYS('2025-01-01'))")
+    assert partitions.widened_index_name('ux_incoming_emails_message_id') == (
+        'ux_incoming_emails_message_id_received_time')
+    with engine.connect() as connection:
+        assert partitions.is_partitioned(connection, 'incoming_emails') is False
+
+
+def test_sync_archive_columns_adds_new_columns():
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE sync_test (id INTEGER PRIMARY KEY, title VARCHAR(50), score FLOAT)"))
+        connection.execute(text("CREATE TABLE sync_test_archive (id INTEGER PRIMARY KEY, title VARCHAR(50))"))
+        connection.execute(text("INSERT INTO sync_test_archive (id, title) VALUES (1, 'old')"))
+    try:
+        with engine.begin() as connection:
+            assert partitions.sync_archive_columns(connection, 'sync_test') == ['id', 'title', 'score']
+        with engine.connect() as connection:
+            rows = connection.execute(text("SELECT id, title, score FROM sync_test_archive")).all()
+        assert [tuple(row) for row in rows] == [(1, 'old', None)]
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE sync_test"))
+            connection.execute(text("DROP TABLE sync_test_archive"))
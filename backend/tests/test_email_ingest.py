@@ -0,0 +1,146 @@
+from datetime import datetime
+
+import pytest
+
+from models.email import Email
+from services import email_bodies, email_ingest
+from services.email_analyzer import EmailAnalyzer
+
+
+class PartlyFailingAnalyzer(EmailAnalyzer):
+    """Lô luôn lỗi và email có 'broken' trong tiêu đề không phân tích được"""
+
+    def analyze_many(self, emails, **kwargs):
+        raise RuntimeError("batch failed")
+
+    def analyze_email(self, title, content, sender='', lazy=None):
+        if 'broken' in title:
+            raise RuntimeError("analysis failed")
+        return super().analyze_email(title, content, sender)
+
+
+@pytest.fixture(scope='module')
+def failing_analyzer():
+    return PartlyFailingAnalyzer()
+
+
+def record(index, title):
+    return index, {
+        'title': title,
+        'content': f"Your account has been limited, click here to verify ({title})",
+        'from_email': 'alerts@example.com',
+        'to_email': 'user@example.com',
+        'received_time': datetime(2024, 1, 1, 8, 0, index),
+        'message_id': f"<ingest-{index}@example.com>",
+    }, None
+
+
+@pytest.mark.parametrize('titles', [('scored-a', 'broken-a'), ('broken-b', 'scored-b')])
+def test_mixed_scored_and_unscored_batch(db, failing_analyzer, titles):
+    offset = 0 if titles[0].startswith('scored') else 10
+    result = email_ingest.IngestResult()
+    email_ingest.insert_batch(db, failing_analyzer, [record(offset + i, title) for i, title in enumerate(titles)], result)
+
+    assert (result.inserted, result.failed, result.unscored) == (2, 0, 1)
+    stored = {email.title: email for email in db.query(Email).filter(Email.title.in_(titles))}
+    scored = next(title for title in titles if title.startswith('scored'))
+    broken = next(title for title in titles if title.startswith('broken'))
+    assert stored[scored].category != 'unknown'
+    assert stored[scored].suspicious_indicators is not None
+    assert stored[broken].category == 'unknown'
+    assert stored[broken].suspicious_indicators is None
+
+
+def test_duplicate_records_are_skipped(db, analyzer):
+    records = [record(20, 'duplicate')]
+    first, second = email_ingest.IngestResult(), email_ingest.IngestResult()
+    email_ingest.insert_batch(db, analyzer, records, first)
+    email_ingest.insert_batch(db, analyzer, [record(20, 'duplicate')], second)
+    assert (first.inserted, second.inserted, second.duplicates) == (1, 0, 1)
+
+
+def test_parser_reads_array_with_bom():
+    parser = email_ingest.RecordStreamParser()
+    payload = ('\ufeff [{"title": "t", "content": "c", "from_email": "a@example.com", '
+               '"to_email": "b@example.com", "received_time": "2024-01-01T08:00:00.600000+00:00"}]').encode('utf-8')
+    records = parser.feed(payload[:20]) + parser.feed(payload[20:]) + parser.close()
+    assert len(records) == 1
+    index, row, error = records[0]
+    assert error is None and row['title'] == 't'
+    received = email_ingest.normalize_received_time(row['received_time'])
+    assert received.tzinfo is None and received.microsecond == 0
+
+
+@pytest.fixture(params=['returning', 'lookup'])
+def insert_mode(request, db, monkeypatch):
+    """Chạy test với RETURNING (SQLite) và với cách tra id theo dấu vân tay của MySQL"""
+    if request.param == 'lookup':
+        monkeypatch.setattr(db.get_bind().dialect, 'insert_executemany_returning_sort_by_parameter_order', False)
+    return request.param
+
+
+def test_bodies_follow_their_rows_when_fingerprints_collide(db, insert_mode):
+    shared_hash = ('shared-' + insert_mode).ljust(64, '0')
+
+    def row(title):
+        return {'title': title, 'content': f"body of {title}", 'from_email': 'a@example.com',
+                'to_email': 'b@example.com', 'received_time': datetime(2024, 3, 1), 'message_id': None,
+                'content_hash': shared_hash, 'category': 'unknown', 'category_id': 1,
+                'confidence_score': 0.0, 'level': '', 'suspicious_indicators': None}
+
+    email_ingest._write_rows(db, [row(f'{insert_mode}-existing')], 'zlib')
+    db.commit()
+    email_ingest._write_rows(db, [row(f'{insert_mode}-first'), row(f'{insert_mode}-second')], 'zlib')
+    db.commit()
+
+    stored = db.query(Email).filter(Email.content_hash == shared_hash).all()
+    assert len(stored) == 3
+    for email in stored:
+        assert email_bodies.load_body(db, email) == f"body of {email.title}"
+
+
+def test_same_content_in_one_batch_is_stored_once(db, analyzer, insert_mode):
+    records = []
+    for index in range(2):
+        _, row, _ = record(30, f'same-content-{insert_mode}')
+        row['message_id'] = f"<same-{insert_mode}-{index}@example.com>"
+        records.append((index, row, None))
+    result = email_ingest.IngestResult()
+    email_ingest.insert_batch(db, analyzer, records, result)
+
+    assert (result.inserted, result.duplicates) == (1, 1)
+    email = db.query(Email).filter(Email.title == f'same-content-{insert_mode}').one()
+    assert email_bodies.load_body(db, email) == records[0][1]['content']
+
+
+def test_concurrent_duplicate_is_dropped_and_counted_once(db, analyzer, monkeypatch):
+    from database.session import SessionLocal
+    from services import email_stats
+
+    email_stats.rebuild_rollup(db)
+    records = [record(40 + i, f'race-{i}') for i in range(3)]
+    conflicting = dict(records[1][1], title='race-other-request')
+    original = email_ingest._analyze_batch
+    calls = []
+
+    def analyze_then_race(analyzer, rows):
+        # Một request khác ghi cùng Message-ID sau khi lô đã được kiểm tra trùng lặp
+        if not calls:
+            calls.append(1)
+            other = SessionLocal()
+            try:
+                email_ingest.insert_batch(other, analyzer, [(0, dict(conflicting), None)], email_ingest.IngestResult())
+            finally:
+                other.close()
+        return original(analyzer, rows)
+
+    monkeypatch.setattr(email_ingest, '_analyze_batch', analyze_then_race)
+    result = email_ingest.IngestResult()
+    email_ingest.insert_batch(db, analyzer, records, result)
+
+    assert (result.inserted, result.duplicates, result.failed) == (2, 1, 0)
+    stored = db.query(Email.title).filter(Email.message_id.in_(
+        [row['message_id'] for _, row, _ in records]
+    )).all()
+    assert sorted(title for (title,) in stored) == ['race-0', 'race-2', 'race-other-request']
+    assert email_stats._rollup_matches(db, full=True)
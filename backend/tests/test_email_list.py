@@ -0,0 +1,101 @@
+import json
+from datetime import datetime
+
+import pytest
+from pydantic import BaseModel
+from sqlalchemy import event
+
+from database.session import engine
+from models.email import Email
+from routes.emails import DEFAULT_LIST_FIELDS
+from utils import json_response
+
+RECEIVED = datetime(2098, 6, 1, 12, 0)
+
+
+@pytest.fixture
+def listed(db):
+    """Một email mới hơn mọi email khác để luôn nằm ở đầu danh sách"""
+    email = Email(title='Projection', content='x' * 10_000, from_email='a@example.com', to_email='b@example.com',
+                  received_time=RECEIVED, category='projection', category_id=2, confidence_score=12.5,
+                  level='low', suspicious_indicators={'reasons': ['r']})
+    db.add(email)
+    db.commit()
+    yield email.id
+    db.delete(email)
+    db.commit()
+
+
+@pytest.fixture
+def statements():
+    captured = []
+
+    def capture(conn, cursor, statement, *args):
+        captured.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    yield captured
+    event.remove(engine, 'before_cursor_execute', capture)
+
+
+def test_default_fields_exclude_content_and_indicators(client, listed, statements):
+    items = client.get('/api/emails/', params={'category': 'projection'}).json()
+    assert items == [{
+        'id': listed, 'title': 'Projection', 'from_email': 'a@example.com', 'to_email': 'b@example.com',
+        'received_time': '2098-06-01T12:00:00', 'category': 'projection', 'category_id': 2,
+        'confidence_score': 12.5, 'level': 'low', 'created_at': items[0]['created_at'],
+    }]
+    assert tuple(items[0]) == DEFAULT_LIST_FIELDS
+    select = next(statement for statement in statements if 'FROM incoming_emails' in statement)
+    assert 'incoming_emails.content' not in select
+    assert 'suspicious_indicators' not in select
+
+
+def test_selected_fields_are_projected(client, listed, statements):
+    items = client.get('/api/emails/', params={'category': 'projection', 'fields': 'title, id'}).json()
+    assert items == [{'id': listed, 'title': 'Projection'}]
+    select = next(statement for statement in statements if 'FROM incoming_emails' in statement)
+    assert 'incoming_emails.level' not in select
+
+    page = client.get('/api/emails/', params={'category': 'projection', 'fields': 'suspicious_indicators',
+                                              'cursor': ''}).json()
+    assert page == {'items': [{'suspicious_indicators': {'reasons': ['r']}}], 'next_cursor': None}
+
+
+def test_unknown_fields_are_rejected(client):
+    response = client.get('/api/emails/', params={'fields': 'id,content'})
+    assert response.status_code == 400
+    assert 'content' in response.json()['detail']
+
+
+def test_detail_endpoint_still_returns_content(client, listed):
+    email = client.get(f'/api/emails/{listed}').json()
+    assert email['content'] == 'x' * 10_000
+
+
+class Model(BaseModel):
+    name: str
+    when: datetime
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dumps_matches_standard_encoding(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(json_response, 'orjson', None)
+    elif json_response.orjson is None:
+        pytest.skip("orjson chưa được cài đặt")
+    value = {'items': [{'id': 1, 'title': 'Tiếng Việt', 'received_time': datetime(2024, 1, 2, 3, 4, 5)}],
+             'model': Model(name='m', when=datetime(2024, 1, 1)), 'none': None}
+    assert json.loads(json_response.dumps(value)) == {
+        'items': [{'id': 1, 'title': 'Tiếng Việt', 'received_time': '2024-01-02T03:04:05'}],
+        'model': {'name': 'm', 'when': '2024-01-01T00:00:00'}, 'none': None,
+    }
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dumps_escapes_lone_surrogates(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(json_response, 'orjson', None)
+    elif json_response.orjson is None:
+        pytest.skip("orjson chưa được cài đặt")
+    assert json.loads(json_response.dumps({'content': 'a\ud83db'})) == {'content': 'a\ud83db'}
@@ -0,0 +1,196 @@
+import threading
+import time
+
+from fake_imap import make_message
+from utils.email_monitor import EmailMonitor, TextPart, _message_set, _parse_fetch, _text_parts
+
+
+def deliver_later(mailbox, delay, index=1):
+    def deliver():
+        time.sleep(delay)
+        mailbox.append('INBOX', make_message(index, f"New #{index}", "Nội dung mới", 'sender@example.com'))
+    thread = threading.Thread(target=deliver, daemon=True)
+    thread.start()
+    return thread
+
+
+def assert_usable(monitor):
+    """Sau IDLE (đã gửi DONE và đọc phản hồi), kết nối dùng tiếp được cho lệnh khác"""
+    status, _ = monitor._imap.noop()
+    assert status == 'OK'
+
+
+def test_idle_wakes_up_on_exists(monitor, mailbox, server):
+    monitor.sync('INBOX')
+    assert monitor.supports_idle()
+    deliver_later(mailbox, 0.2)
+    begin = time.monotonic()
+    assert monitor.idle(10) is True
+    assert time.monotonic() - begin < 5
+    assert server.commands['IDLE'] == 1
+    assert_usable(monitor)
+
+
+def test_idle_times_out_and_sends_done(monitor, server):
+    monitor.sync('INBOX')
+    begin = time.monotonic()
+    assert monitor.idle(0.3) is False
+    assert 0.3 <= time.monotonic() - begin < 5
+    assert_usable(monitor)
+    # Gửi lại IDLE trên cùng kết nối sau khi hết hạn
+    assert monitor.idle(0.2) is False
+    assert server.commands['IDLE'] == 2
+    assert_usable(monitor)
+
+
+def test_idle_stops_when_requested(monitor):
+    monitor.sync('INBOX')
+    stop = threading.Event()
+    threading.Timer(0.2, stop.set).start()
+    begin = time.monotonic()
+    assert monitor.idle(10, stop) is False
+    assert time.monotonic() - begin < 5
+    assert_usable(monitor)
+
+
+def test_idle_returns_at_once_for_exists_seen_before(monitor, mailbox, server):
+    monitor.sync('INBOX')
+    mailbox.append('INBOX', make_message(1, "Arrived", "Nội dung", 'sender@example.com'))
+    # EXISTS đến kèm phản hồi của NOOP và được imaplib giữ lại
+    monitor._imap.noop()
+    assert monitor.idle(10) is True
+    assert server.commands['IDLE'] == 0
+
+
+def test_idle_sees_exists_sent_right_after_continuation(monitor, mailbox):
+    monitor.sync('INBOX')
+    # Email đến khi không có lệnh nào: server báo EXISTS ngay sau "+ idling", thường
+    # trong cùng gói tin, nên dòng EXISTS nằm sẵn trong bộ đệm đọc của imaplib
+    mailbox.append('INBOX', make_message(1, "Arrived", "Nội dung", 'sender@example.com'))
+    begin = time.monotonic()
+    assert monitor.idle(3) is True
+    assert time.monotonic() - begin < 2
+    assert_usable(monitor)
+
+
+def test_message_set_collapses_ranges():
+    assert _message_set([7, 1, 2, 3, 9, 10]) == "1:3,7,9:10"
+    assert _message_set([4]) == "4"
+
+
+def test_parse_fetch_reads_literals_quoted_strings_and_lists():
+    # Literal chứa ngoặc, dấu nháy và {n} không được tách thành token
+    header = b'Subject: (not a list) "quoted" {3}\r\n\r\n'
+    data = [
+        (b'1 (UID 5 RFC822.SIZE 120 BODY[HEADER] {%d}' % len(header), header),
+        b')',
+        (b'2 (UID 7 BODY[1]<0> {5}', b'hello'),
+        (b' BODY[2] {5}', b'world'),
+        b' FLAGS (\\Seen \\Answered) X-NOTE "a \\"b\\"" X-EMPTY NIL)',
+        # Cập nhật FLAGS không có UID bị bỏ qua
+        b'3 (FLAGS (\\Seen))',
+    ]
+    parsed = _parse_fetch(data)
+    assert sorted(parsed) == [5, 7]
+    assert parsed[5]['BODY[HEADER]'] == header
+    assert parsed[5]['RFC822.SIZE'] == 120
+    assert parsed[7]['BODY[1]<0>'] == b'hello'
+    assert parsed[7]['BODY[2]'] == b'world'
+    assert parsed[7]['FLAGS'] == ['\\Seen', '\\Answered']
+    assert parsed[7]['X-NOTE'] == b'a "b"'
+    assert parsed[7]['X-EMPTY'] is None
+
+
+def test_get_emails_fetches_in_uid_batches(mailbox, server):
+    for index in range(1, 5):
+        mailbox.append('INBOX', make_message(index, f"Batch #{index}", f"Nội dung {index}", 'sender@example.com'))
+    monitor = EmailMonitor('user@example.com', 'secret', imap_server='127.0.0.1', imap_port=server.port,
+                           use_ssl=False, fetch_batch_size=2)
+    try:
+        server.reset_stats()
+        emails = monitor.get_emails(limit=0)
+        assert [email["id"] for email in emails] == ['5', '4', '3', '2', '1']
+        assert [email["subject"] for email in emails[:2]] == ["Batch #4", "Batch #3"]
+        assert emails[0]["body"].strip() == "Nội dung 4"
+        assert emails[0]["message_id"].startswith("<")
+        # Mỗi lô 2 email: header, BODYSTRUCTURE và phần text, mỗi loại một lệnh
+        assert server.commands['UID FETCH'] == 3 * 3
+        assert server.commands['FETCH'] == 0
+
+        newest = monitor.get_emails(limit=2, include_body=False)
+        assert [email["id"] for email in newest] == ['5', '4']
+        assert newest[0]["body"] == ""
+    finally:
+        monitor.disconnect()
+
+
+def test_text_parts_skip_attachments_and_read_charset():
+    plain = [b'TEXT', b'PLAIN', [b'CHARSET', b'ISO-8859-1', b'FORMAT', b'flowed'], None, None,
+             b'QUOTED-PRINTABLE', '120', '3']
+    html = [b'TEXT', b'HTML', [b'charset', b'UTF-8'], None, None, b'7BIT', '300', '10']
+    binary = [b'APPLICATION', b'OCTET-STREAM', [b'NAME', b'report.bin'], None, None, b'BASE64', '90000',
+              None, [b'ATTACHMENT', [b'FILENAME', b'report.bin']]]
+    text_attachment = [b'TEXT', b'PLAIN', [b'CHARSET', b'utf-8'], None, None, b'7BIT', '50', '2', None,
+                       [b'ATTACHMENT', [b'FILENAME', b'notes.txt']]]
+    forwarded = [b'MESSAGE', b'RFC822', None, None, None, b'7BIT', '500']
+    structure = [[plain, html, b'ALTERNATIVE'], binary, text_attachment, forwarded, b'MIXED']
+
+    assert _text_parts(structure) == [
+        TextPart('1.1', 'plain', 'iso-8859-1', 'quoted-printable', 120),
+        TextPart('1.2', 'html', 'utf-8', '7bit', 300),
+    ]
+    # Email không phải multipart: section 1
+    assert _text_parts(plain) == [TextPart('1', 'plain', 'iso-8859-1', 'quoted-printable', 120)]
+
+
+def bodies_monitor(server, **kwargs):
+    return EmailMonitor('user@example.com', 'secret', imap_server='127.0.0.1', imap_port=server.port,
+                        use_ssl=False, **kwargs)
+
+
+def test_fetch_bodies_skips_attachments_and_decodes_charset(mailbox, server):
+    content = "Café crème à la française, très bien."
+    mailbox.append('INBOX', make_message(1, "Latin-1", content, 'sender@example.com', charset='iso-8859-1',
+                                         html=f"<p>{content}</p>", attachment_size=500_000))
+    monitor = bodies_monitor(server)
+    try:
+        server.reset_stats()
+        emails = monitor.get_emails(limit=1)
+        assert emails[0]["subject"] == "Latin-1"
+        # Chỉ phần text/plain, không có HTML hay file đính kèm
+        assert emails[0]["body"].strip() == content
+        assert server.sent_bytes < 50_000
+    finally:
+        monitor.disconnect()
+
+
+def test_fetch_bodies_uses_html_without_plain_part(mailbox, server):
+    from email.message import EmailMessage
+
+    message = EmailMessage()
+    message['Subject'] = "HTML only"
+    message['From'] = 'sender@example.com'
+    message['To'] = 'user@example.com'
+    message['Date'] = 'Thu, 01 Jan 2026 00:05:00 +0000'
+    message.set_content("<p>Xin chào</p>", subtype='html')
+    message.add_attachment(b'%PDF' * 1000, maintype='application', subtype='pdf', filename='a.pdf')
+    mailbox.append('INBOX', message.as_bytes())
+    monitor = bodies_monitor(server)
+    try:
+        assert monitor.get_emails(limit=1)[0]["body"].strip() == "<p>Xin chào</p>"
+    finally:
+        monitor.disconnect()
+
+
+def test_fetch_bodies_truncates_large_parts(mailbox, server):
+    content = "Nội dung rất dài của email. " * 500
+    mailbox.append('INBOX', make_message(1, "Large", content, 'sender@example.com'))
+    monitor = bodies_monitor(server, max_part_bytes=300)
+    try:
+        body = monitor.get_emails(limit=1)[0]["body"]
+        # Phần bị cắt được giải mã không lỗi, không có ký tự dở dang ở cuối
+        assert 0 < len(body) < len(content)
+        assert content.startswith(body)
+        assert '\ufffd' not in body
+    finally:
+        monitor.disconnect()
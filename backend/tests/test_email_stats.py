@@ -0,0 +1,116 @@
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from database.session import engine
+from models.email import Email
+from models.email_stats import EmailDailyStat
+from services import batch_analysis, email_ingest, email_stats, partitions
+
+# Mốc lưu giữ của test: trước mọi email khác trong database test
+CUTOFF = date(1995, 1, 1)
+
+
+def retention_months() -> int:
+    """Số tháng giữ lại để mốc của apply_retention là CUTOFF"""
+    today = date.today()
+    return (today.year - CUTOFF.year) * 12 + today.month - CUTOFF.month
+
+
+def record(index, received_time):
+    return index, {
+        'title': f"Retention {index}",
+        'content': f"Your account has been limited, click here to verify ({index})",
+        'from_email': 'alerts@example.com',
+        'to_email': 'user@example.com',
+        'received_time': received_time,
+        'message_id': f"<retention-{index}@example.com>",
+    }, None
+
+
+def stored_count(db, day: date, category: str) -> int:
+    stat = db.get(EmailDailyStat, (day, category))
+    return stat.count if stat is not None else 0
+
+
+def test_ingest_analyze_and_retention_keep_rollup_in_sync(db, analyzer, monkeypatch):
+    email_stats.rebuild_rollup(db)
+    assert email_stats._rollup_matches(db, full=True)
+
+    boundary = datetime.combine(CUTOFF, datetime.min.time())
+    times = [
+        datetime(1994, 6, 10, 12, 0),
+        boundary - timedelta(seconds=1),
+        # Làm tròn lên nửa giây như MySQL: được lưu là 00:00:00 của ngày mốc
+        boundary - timedelta(microseconds=300000),
+        boundary,
+        datetime(1995, 1, 1, 0, 30, tzinfo=timezone(timedelta(hours=14))),
+    ]
+    # Nhập không chấm điểm: email được lưu với danh mục unknown cho analyze-batch
+    monkeypatch.setattr(email_ingest, '_analyze_batch', lambda analyzer, rows: [None] * len(rows))
+    result = email_ingest.IngestResult()
+    email_ingest.insert_batch(db, analyzer, [record(i, value) for i, value in enumerate(times)], result)
+    assert (result.inserted, result.unscored) == (5, 5)
+    assert email_stats._rollup_matches(db, full=True)
+
+    batch = batch_analysis.analyze_unknown_emails(db, analyzer, chunk_size=2)
+    assert batch.finished
+    assert db.query(Email).filter(Email.title.like("Retention %"), Email.category == 'unknown').count() == 0
+    assert email_stats._rollup_matches(db, full=True)
+
+    outcome = partitions.apply_retention(engine, db, months=retention_months(), mode='archive')
+    # Email có múi giờ được lưu theo giờ địa phương: cùng mốc với received_time đã lưu
+    removed = {f"Retention {i}" for i, value in enumerate(times)
+               if email_ingest.normalize_received_time(value) < boundary}
+    assert {"Retention 0", "Retention 1"} <= removed and "Retention 2" not in removed
+    assert outcome["cutoff"] == CUTOFF.isoformat()
+    assert outcome["emails_removed"] == len(removed)
+    kept = {email.title for email in db.query(Email).filter(Email.title.like("Retention %"))}
+    assert kept == {f"Retention {i}" for i in range(len(times))} - removed
+    archived = db.execute(text("SELECT title FROM incoming_emails_archive WHERE title LIKE 'Retention %'")).scalars()
+    assert set(archived) == removed
+    assert db.query(EmailDailyStat).filter(EmailDailyStat.day < CUTOFF).count() == 0
+    assert email_stats._rollup_matches(db, full=True)
+
+
+def test_record_category_changes_uses_stored_day(db):
+    email_stats.rebuild_rollup(db)
+    aware = datetime(2001, 3, 1, 0, 30, tzinfo=timezone(timedelta(hours=14)))
+    day = email_ingest.normalize_received_time(aware).date()
+    late = datetime(2001, 2, 27, 23, 59, 59, 700000)
+
+    email_stats.record_category_changes(db, [
+        (aware, None, 'spam'), (aware, None, 'spam'), (late, None, None), (date(2001, 3, 5), None, 'safe'),
+    ])
+    db.commit()
+    assert stored_count(db, day, 'spam') == 2
+    assert stored_count(db, date(2001, 2, 28), 'unknown') == 1
+    assert stored_count(db, date(2001, 3, 5), 'safe') == 1
+
+    # Phân loại lại: chuyển số lượng giữa các danh mục, không đổi tổng
+    email_stats.record_category_changes(db, [(aware, 'spam', 'phishing'), (aware, 'spam', 'spam')])
+    db.commit()
+    assert stored_count(db, day, 'spam') == 1
+    assert stored_count(db, day, 'phishing') == 1
+    email_stats.rebuild_rollup(db)
+
+
+def test_reconcile_rollup_rebuilds_only_when_out_of_sync(db):
+    email_stats.rebuild_rollup(db)
+    assert email_stats.reconcile_rollup(db) is False
+
+    # Email ghi thẳng vào bảng (không qua email_ingest) làm bảng tổng hợp lệch
+    db.add(Email(title='Reconcile', content='hello', from_email='a@example.com', to_email='b@example.com',
+                 received_time=datetime(2002, 5, 5, 10, 0), category='safe'))
+    db.commit()
+    assert not email_stats._rollup_matches(db, full=True)
+    assert email_stats.reconcile_rollup(db, full=False) is True
+    assert stored_count(db, date(2002, 5, 5), 'safe') == 1
+
+    # Tổng số khớp nhưng sai ngày: chỉ đối chiếu đầy đủ mới phát hiện
+    db.query(EmailDailyStat).filter(EmailDailyStat.day == date(2002, 5, 5)).update({'day': date(2002, 5, 6)})
+    db.commit()
+    assert email_stats.reconcile_rollup(db, full=False) is False
+    assert email_stats.reconcile_rollup(db, full=True) is True
+    assert email_stats._rollup_matches(db, full=True)
+    assert email_stats.reconcile_rollup(db) is False
@@ -0,0 +1,63 @@
+import pytest
+
+from services.html_extractor import HtmlLink, extract_html, looks_like_html
+
+
+@pytest.mark.parametrize('content, expected', [
+    ("<!DOCTYPE html><html><body>Hi</body></html>", True),
+    ("<div>Xin chào</div>", True),
+    ("Dear user,<br>please read", True),
+    ("Giá < 100 và > 50", False),
+    ("Plain text with an email <user@example.com>", False),
+    ("x" * 5000 + "<html>", False),
+])
+def test_looks_like_html(content, expected):
+    assert looks_like_html(content) is expected
+
+
+def test_visible_text_skips_markup_and_hidden_blocks():
+    html = """<html><head><title>Tiêu đề ẩn</title><style>p { color: red }</style></head>
+    <body><!-- chú thích --><p>Xin&nbsp;chào</p><div>bạn</div><script>var a = "<p>x</p>";</script>
+    <p title="a > b">Giá &lt;100&gt; &amp; <b>giảm</b>giá</p></body></html>"""
+    content = extract_html(html)
+    assert content.text == "Xin chào bạn Giá <100> & giảmgiá"
+    assert content.links == [] and content.truncated is False
+
+
+def test_links_keep_href_and_anchor_text():
+    html = ("<p>Đăng nhập <a href='http://secure-verify.xyz/login?a=1&amp;b=2'>tại <b>PayPal</b></a></p>"
+            '<a href="mailto:a@example.com">mail</a><a href=https://bank.vn/x>Ngân hàng</a>'
+            '<a href="http://secure-verify.xyz/login?a=1&b=2">lần hai</a><a href="https://empty.example"></a>')
+    content = extract_html(html)
+    assert content.links == [
+        HtmlLink("http://secure-verify.xyz/login?a=1&b=2", "tại PayPal"),
+        HtmlLink("https://bank.vn/x", "Ngân hàng"),
+        HtmlLink("https://empty.example", ""),
+    ]
+    assert "tại PayPal" in content.text and "mail" in content.text
+
+
+def test_max_links_and_unclosed_blocks():
+    html = "".join(f'<a href="https://l{i}.example">{i}</a>' for i in range(10))
+    assert [link.url for link in extract_html(html, max_links=3).links] == [
+        "https://l0.example", "https://l1.example", "https://l2.example"]
+    # Khối script không đóng: phần còn lại bị bỏ qua thay vì coi là chữ
+    assert extract_html("<p>Hiển thị</p><script>var x = 1;").text == "Hiển thị"
+
+
+def test_max_text_chars_stops_scanning():
+    html = "<p>" + "chữ " * 1000 + "</p>" + '<a href="https://late.example">cuối</a>'
+    content = extract_html(html, max_text_chars=100)
+    assert content.truncated is True
+    assert len(content.text) <= 100
+    assert content.links == []
+    assert extract_html(html).links == [HtmlLink("https://late.example", "cuối")]
+
+
+def test_html_email_is_scored_on_text_and_links(analyzer):
+    html = ('<html><body><p>Please verify your account</p>'
+            '<a href="http://192.168.1.10/login">https://www.vietcombank.com.vn</a></body></html>')
+    result = analyzer.analyze_email("Security alert", html, "service@paypal.com")
+    assert result['suspicious_indicators']['urls_count'] == 2
+    assert result['suspicious_indicators']['suspicious_urls'] == 1
+    assert result['category'] == 'phishing'
@@ -0,0 +1,125 @@
+import pytest
+from sqlalchemy.exc import DataError, OperationalError
+
+from fake_imap import make_message
+from services import email_ingest, imap_sync
+from utils.email_monitor import EmailMonitor, SyncCheckpoint
+
+
+def append(mailbox, *titles, folder='INBOX'):
+    for title in titles:
+        index = len(mailbox.messages(folder)) + 1
+        mailbox.append(folder, make_message(index, title, f"Nội dung của {title}", 'sender@example.com'))
+
+
+def test_sync_resumes_from_checkpoint(monitor, mailbox, server):
+    first = monitor.sync('INBOX')
+    assert first.full_resync
+    assert first.checkpoint == SyncCheckpoint(1, 1)
+    assert [email["id"] for email in first.emails] == ['1']
+
+    append(mailbox, "sync-a", "sync-b")
+    second = monitor.sync('INBOX', first.checkpoint)
+    assert not second.full_resync
+    assert [email["subject"] for email in second.emails] == ["sync-b", "sync-a"]
+    assert second.checkpoint == SyncCheckpoint(1, 3)
+
+
+def test_sync_uses_uidnext_when_nothing_is_new(monitor, server):
+    checkpoint = monitor.sync('INBOX').checkpoint
+    server.reset_stats()
+    result = monitor.sync('INBOX', checkpoint)
+    assert result.emails == [] and result.checkpoint == checkpoint
+    # Chỉ một lệnh SELECT, không SEARCH hay FETCH
+    assert server.commands['SELECT'] == 1
+    assert server.commands['UID SEARCH'] == 0
+    assert server.commands['UID FETCH'] == 0
+
+
+def test_sync_limit_takes_oldest_new_emails_first(monitor, mailbox):
+    checkpoint = monitor.sync('INBOX').checkpoint
+    append(mailbox, "limit-2", "limit-3", "limit-4")
+    result = monitor.sync('INBOX', checkpoint, limit=2)
+    assert sorted(email["subject"] for email in result.emails) == ["limit-2", "limit-3"]
+    assert result.checkpoint.last_uid == 3
+    result = monitor.sync('INBOX', result.checkpoint, limit=2)
+    assert [email["subject"] for email in result.emails] == ["limit-4"]
+
+
+def test_uidvalidity_change_forces_full_resync(monitor, mailbox):
+    checkpoint = monitor.sync('INBOX').checkpoint
+    # Thư mục được tạo lại: UID cũ không còn giá trị
+    mailbox.add_folder('INBOX', uidvalidity=7)
+    append(mailbox, "recreated-1", "recreated-2")
+    result = monitor.sync('INBOX', checkpoint)
+    assert result.full_resync
+    assert result.checkpoint == SyncCheckpoint(7, 2)
+    assert len(result.emails) == 2
+
+
+@pytest.fixture
+def account_monitor(request, server):
+    """Monitor với tên tài khoản riêng cho mỗi test (checkpoint lưu trong database dùng chung)"""
+    monitor = EmailMonitor(f"{request.node.name}@example.com", 'secret', imap_server='127.0.0.1',
+                           imap_port=server.port, use_ssl=False)
+    yield monitor
+    monitor.disconnect()
+
+
+@pytest.fixture
+def failing_writes(monkeypatch):
+    """Ghi lỗi vĩnh viễn cho email có BAD trong tiêu đề, lỗi tạm thời cho FLAKY khi transient bật"""
+    real = email_ingest._write_rows
+    mode = {"transient": True}
+
+    def write(db, rows, codec):
+        for row in rows:
+            if "BAD" in row["title"]:
+                raise DataError("INSERT", {}, Exception("Data too long"))
+            if "FLAKY" in row["title"] and mode["transient"]:
+                raise OperationalError("INSERT", {}, Exception("Deadlock found"))
+        return real(db, rows, codec)
+
+    monkeypatch.setattr(email_ingest, '_write_rows', write)
+    return mode
+
+
+def test_sync_folder_skips_permanently_failing_emails(db, analyzer, account_monitor, mailbox, failing_writes):
+    append(mailbox, "perm-a", "perm-BAD", "perm-b", folder='Permanent')
+    result = imap_sync.sync_folder(db, analyzer, account_monitor, folder='Permanent')
+    assert (result["fetched"], result["inserted"], result["failed"], result["retryable"]) == (3, 2, 1, 0)
+    # Email lỗi vĩnh viễn không giữ checkpoint lại
+    assert result["last_uid"] == 3
+    assert imap_sync.load_checkpoint(db, account_monitor.email_address, 'Permanent') == SyncCheckpoint(1, 3)
+
+    again = imap_sync.sync_folder(db, analyzer, account_monitor, folder='Permanent')
+    assert again["fetched"] == 0
+
+
+def test_sync_folder_retries_from_first_transient_failure(db, analyzer, account_monitor, mailbox, failing_writes):
+    append(mailbox, "retry-a", folder='Retry')
+    assert imap_sync.sync_folder(db, analyzer, account_monitor, folder='Retry')["inserted"] == 1
+
+    append(mailbox, "retry-b", "retry-FLAKY", "retry-c", folder='Retry')
+    result = imap_sync.sync_folder(db, analyzer, account_monitor, folder='Retry')
+    # Lỗi tạm thời được báo cho cả lô: checkpoint dừng ngay trước email đầu tiên của lô
+    assert (result["fetched"], result["inserted"], result["retryable"]) == (3, 0, 3)
+    assert result["last_uid"] == 1
+    assert imap_sync.load_checkpoint(db, account_monitor.email_address, 'Retry') == SyncCheckpoint(1, 1)
+
+    failing_writes["transient"] = False
+    result = imap_sync.sync_folder(db, analyzer, account_monitor, folder='Retry')
+    assert (result["fetched"], result["inserted"], result["failed"]) == (3, 3, 0)
+    assert result["last_uid"] == 4
+
+
+def test_sync_folder_saves_new_uidvalidity(db, analyzer, account_monitor, mailbox):
+    append(mailbox, "uidvalidity-old", folder='Recreated')
+    imap_sync.sync_folder(db, analyzer, account_monitor, folder='Recreated')
+    mailbox.add_folder('Recreated', uidvalidity=9)
+    append(mailbox, "uidvalidity-old", "uidvalidity-new", folder='Recreated')
+    result = imap_sync.sync_folder(db, analyzer, account_monitor, folder='Recreated')
+    assert result["full_resync"]
+    # Email cũ lấy lại sau khi đồng bộ lại từ đầu bị loại như email trùng lặp
+    assert (result["fetched"], result["inserted"], result["duplicates"]) == (2, 1, 1)
+    assert imap_sync.load_checkpoint(db, account_monitor.email_address, 'Recreated') == SyncCheckpoint(9, 2)
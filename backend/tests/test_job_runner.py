@@ -0,0 +1,68 @@
+import threading
+import time
+
+from database.session import SessionLocal
+from models.job import Job
+from services.job_runner import JobRunner
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def job_status(job_id):
+    db = SessionLocal()
+    try:
+        return db.get(Job, job_id).status
+    finally:
+        db.close()
+
+
+def test_slow_job_without_progress_is_not_claimed_twice(db):
+    runs = []
+    lock = threading.Lock()
+
+    def slow(params, context):
+        # Chạy lâu hơn stale_after mà không báo cáo tiến độ
+        with lock:
+            runs.append(context.worker)
+        time.sleep(1.5)
+        return {"slept": True}
+
+    runner = JobRunner(SessionLocal, workers=2, poll_interval=0.05, stale_after=0.6)
+    runner.register("test-slow", slow)
+    job = runner.enqueue(db, "test-slow")
+    runner.start()
+    try:
+        assert wait_for(lambda: job_status(job.id) == 'completed')
+    finally:
+        runner.stop()
+
+    assert len(runs) == 1
+    db.expire_all()
+    stored = db.get(Job, job.id)
+    assert stored.result == {"slept": True}
+    assert stored.worker == runs[0]
+
+
+def test_stale_run_cannot_overwrite_the_new_claim(db):
+    runner = JobRunner(SessionLocal, workers=0)
+    job = runner.enqueue(db, "test-takeover")
+    db.query(Job).filter(Job.id == job.id).update({"status": 'running', "worker": "other-host:1/job-worker-0"})
+    db.commit()
+
+    # Lần chạy cũ (đã bị đưa lại vào hàng đợi và worker khác nhận) không được ghi gì
+    assert runner._update(job.id, "this-host:2/job-worker-0", processed=5) is True
+    assert runner._finish(job.id, "this-host:2/job-worker-0", 'completed', result={"stale": True}) is False
+    db.expire_all()
+    stored = db.get(Job, job.id)
+    assert (stored.status, stored.processed, stored.result) == ('running', 0, None)
+
+    assert runner._finish(job.id, "other-host:1/job-worker-0", 'completed', result={"ok": True}) is True
+    db.expire_all()
+    assert db.get(Job, job.id).status == 'completed'
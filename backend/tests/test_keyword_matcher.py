@@ -0,0 +1,41 @@
+import pytest
+
+from services.keyword_matcher import normalize_text
+
+PARAGRAPH = (
+    "Dear customer, thank you for reading our weekly newsletter about gardening, cooking and travel. "
+    "Chúng tôi gửi đến bạn bản tin hàng tuần với các bài viết mới nhất về du lịch và ẩm thực. "
+    "Please click here to read more and don't miss the limited time discount for subscribers. "
+)
+
+
+def legacy_scan(analyzer, title, content):
+    """Cách quét từ khóa trước khi có KeywordMatcher (mỗi từ khóa một lần `in`)"""
+    text = (title + content).lower()
+    return (
+        any(word in text for word in analyzer.rules.urgency_words),
+        any(phrase in text for phrase in analyzer.rules.phishing_phrases),
+        sum(1 for word in analyzer.rules.spam_words if word in text),
+    )
+
+
+def matcher_scan(analyzer, title, content):
+    hits = analyzer.rules.keyword_matcher.scan(normalize_text(title + content), normalized=True)
+    return hits['urgency'].count > 0, hits['phishing'].count > 0, hits['spam'].count
+
+
+@pytest.mark.parametrize('size', [0, 1_000, 10_000, 100_000])
+def test_matcher_matches_legacy_scan_on_newsletter(analyzer, size):
+    content = (PARAGRAPH * (size // len(PARAGRAPH) + 1))[:size]
+    assert matcher_scan(analyzer, "Weekly newsletter", content) == legacy_scan(analyzer, "Weekly newsletter", content)
+
+
+def test_matcher_matches_legacy_scan_on_corpus(analyzer, corpus):
+    for item in corpus:
+        assert matcher_scan(analyzer, item.title, item.content) == legacy_scan(analyzer, item.title, item.content), item.title
+
+
+def test_matcher_counts_each_keyword_once(analyzer):
+    word = sorted(analyzer.rules.spam_words)[0]
+    content = f"{word} {word.upper()} {word}"
+    assert matcher_scan(analyzer, "", content) == legacy_scan(analyzer, "", content)
@@ -0,0 +1,76 @@
+import pytest
+
+from services.email_analyzer import EmailAnalyzer
+from services.rule_set import StaticRuleSource
+
+FILLER = "Bản tin hàng tuần về du lịch và ẩm thực, cảm ơn bạn đã theo dõi. " * 20
+
+
+@pytest.fixture(scope='module')
+def lazy_analyzer():
+    analyzer = EmailAnalyzer(StaticRuleSource())
+    analyzer.scan_budget = 4096
+    yield analyzer
+    analyzer.close()
+
+
+def test_lazy_result_agrees_with_full_analysis(lazy_analyzer, corpus):
+    for item in corpus:
+        full = lazy_analyzer.analyze_email(item.title, item.content, item.sender, lazy=False)
+        lazy = lazy_analyzer.analyze_email(item.title, item.content, item.sender, lazy=True)
+        assert (lazy['category'], lazy['level']) == (full['category'], full['level']), item.title
+        if not lazy['short_circuited']:
+            assert lazy == full, item.title
+        else:
+            # Dừng sớm: điểm là giá trị tối thiểu của kết quả đầy đủ
+            assert lazy['confidence_score'] <= full['confidence_score']
+
+
+def test_stops_before_checking_urls_once_result_is_certain(lazy_analyzer, monkeypatch):
+    checked = []
+    monkeypatch.setattr(lazy_analyzer, '_is_suspicious_url', lambda url, rules=None: checked.append(url) or True)
+    content = "Please verify your account immediately. " + " ".join(
+        f"http://login{i}.example.com/verify" for i in range(50))
+    result = lazy_analyzer.analyze_email("Security alert", content, "alerts@secure-verify.xyz", lazy=True)
+    assert (result['category'], result['level']) == ('phishing', 'critical')
+    assert result['short_circuited'] is True
+    assert checked == []
+
+    # Có cụm từ lừa đảo nhưng người gửi bình thường: dừng ở URL đáng ngờ đầu tiên
+    result = lazy_analyzer.analyze_email("Security alert", content, "it@company.vn", lazy=True)
+    assert result['category'] == 'phishing' and result['short_circuited'] is True
+    assert len(checked) == 1
+
+
+def test_huge_plain_body_scans_head_and_tail_only(lazy_analyzer):
+    middle = FILLER * 200 + "verify your account" + FILLER * 200
+    result = lazy_analyzer.analyze_email("Bản tin", middle, "news@company.vn", lazy=True)
+    assert result['short_circuited'] is True
+    assert result['suspicious_indicators']['contains_phishing_phrases'] is False
+    assert lazy_analyzer.analyze_email("Bản tin", middle, "news@company.vn", lazy=False)[
+        'suspicious_indicators']['contains_phishing_phrases'] is True
+
+    tail = FILLER * 400 + "Please verify your account at http://secure-verify.xyz/login"
+    result = lazy_analyzer.analyze_email("Bản tin", tail, "news@company.vn", lazy=True)
+    assert result['category'] == 'phishing' and result['short_circuited'] is True
+
+
+def test_huge_html_body_is_bounded(lazy_analyzer):
+    html = "<html><body>" + ("<div><p>" + FILLER + "</p></div>") * 300 + "</body></html>"
+    result = lazy_analyzer.analyze_email("Bản tin", html, "news@company.vn", lazy=True)
+    assert result['short_circuited'] is True
+    assert result['category'] == 'safe'
+    small = lazy_analyzer.analyze_email("Bản tin", "<html><body><p>Xin chào</p></body></html>", "news@company.vn",
+                                        lazy=True)
+    assert small['short_circuited'] is False
+
+
+def test_analyze_endpoint_lazy_parameter(client):
+    payload = {"title": "Security alert", "content": "Please verify your account immediately",
+               "sender": "alerts@secure-verify.xyz"}
+    lazy = client.post('/api/emails/analyze?lazy=true', json=payload).json()
+    full = client.post('/api/emails/analyze?lazy=false', json=payload).json()
+    assert lazy['success'] and full['success']
+    assert lazy['data']['short_circuited'] is True
+    assert full['data']['short_circuited'] is False
+    assert lazy['data']['category'] == full['data']['category'] == 'phishing'
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from services.lookalike_index import LookalikeIndex, deletions, edit_distance, fold_homoglyphs, registrable_labels
+
+BRANDS = ["paypal.com", "microsoft.com", "google.com", "vietcombank.com.vn", "apple.com", "amazon.com"]
+
+
+@pytest.fixture(scope='module')
+def index():
+    return LookalikeIndex(BRANDS)
+
+
+def test_fold_homoglyphs():
+    # Chữ а Cyrillic và số 1
+    assert fold_homoglyphs("PаyPa1") == "paypal"
+    assert fold_homoglyphs("rnicrosoft") == fold_homoglyphs("microsoft")
+    assert fold_homoglyphs("g00gle") == fold_homoglyphs("google")
+    assert fold_homoglyphs("vіetcombаnk") == fold_homoglyphs("vietcombank")
+
+
+def test_registrable_labels():
+    assert registrable_labels("login.paypal.com") == ["login", "paypal"]
+    assert registrable_labels("vietcombank.com.vn") == ["vietcombank"]
+    assert registrable_labels("localhost") == ["localhost"]
+
+
+def test_edit_distance_and_deletions():
+    assert edit_distance("paypal", "paypal", 1) == 0
+    assert edit_distance("paypa", "paypal", 1) == 1
+    assert edit_distance("papyal", "paypal", 1) == 1
+    assert edit_distance("pyapl", "paypal", 1) == 2
+    assert deletions("abc", 1) == {"abc", "bc", "ac", "ab"}
+
+
+def test_brand_domains_and_unrelated_domains_are_not_flagged(index):
+    for domain in ("paypal.com", "www.paypal.com", "login.microsoft.com", "vietcombank.com.vn",
+                   "example.com", "github.com", "gmail.com"):
+        assert index.match(domain) is None, domain
+
+
+@pytest.mark.parametrize("domain, brand, kind", [
+    ("paypal.net", "paypal.com", "brand"),
+    ("pаypal.com", "paypal.com", "homoglyph"),
+    ("xn--pypal-4ve.com", "paypal.com", "homoglyph"),
+    ("rnicrosoft.com", "microsoft.com", "homoglyph"),
+    ("g00gle.com", "google.com", "homoglyph"),
+    ("paypal-secure.com", "paypal.com", "brand"),
+    ("securepaypalupdate.com", "paypal.com", "embedded"),
+    ("paypall.com", "paypal.com", "embedded"),
+    ("vietcombank-online.vn", "vietcombank.com.vn", "brand"),
+])
+def test_homoglyph_and_embedded_lookalikes(index, domain, brand, kind):
+    match = index.match(domain)
+    assert match is not None and (match.brand, match.kind) == (brand, kind)
+
+
+@pytest.mark.parametrize("domain, brand", [
+    ("payypal.com", "paypal.com"),    # thêm ký tự
+    ("paypl.com", "paypal.com"),      # xóa ký tự
+    ("paypol.com", "paypal.com"),     # thay ký tự
+    ("papyal.com", "paypal.com"),     # đảo hai ký tự
+    ("micosoft.com", "microsoft.com"),
+    ("vietconbank.vn", "vietcombank.com.vn"),
+])
+def test_one_edit_typos(index, domain, brand):
+    match = index.match(domain)
+    assert match is not None and match.kind == 'typo' and match.distance == 1
+    assert match.brand == brand
+
+
+def test_short_names_require_exact_match(index):
+    # Tên ngắn (<= 5 ký tự) không cho phép lỗi chính tả để tránh báo nhầm
+    assert index.match("appie.com").kind == 'homoglyph'
+    assert index.match("apxle.com") is None
+    assert index.match("amazzon.com").kind == 'typo'
+
+
+def test_lookup_cost_does_not_grow_with_brand_count():
+    small = LookalikeIndex(BRANDS)
+    large = LookalikeIndex(BRANDS + [f"brand{i:05d}partner.com" for i in range(5000)])
+    assert len(large) == len(small) + 5000
+    domains = ["payypal.com", "example.org", "secure-login-update.net", "rnicrosoft.com"] * 50
+
+    def timed(target):
+        start = time.perf_counter()
+        for domain in domains:
+            target.match(domain)
+        return (time.perf_counter() - start) / len(domains)
+
+    # Lấy lần đo nhanh nhất để không tính thời gian chờ do các thread khác của phiên test
+    assert min(timed(large) for _ in range(5)) < 0.001
+    # Nhiều thương hiệu cách hai lần sửa, chỉ brand00042partner cách một lần
+    match = large.match("brand00042partnr.com")
+    assert (match.brand, match.distance) == ("brand00042partner.com", 1)
@@ -0,0 +1,181 @@
+import socket
+import threading
+import time
+from collections import Counter
+
+import pytest
+from sqlalchemy.exc import DataError
+
+from database.session import SessionLocal
+from fake_imap import FakeIMAPServer, FakeMailbox, make_message
+from services import email_ingest
+from services.mailbox_monitor import ImapAccount, MailboxMonitorService
+from utils.email_monitor import EmailMonitor
+
+
+@pytest.fixture
+def open_connections(monkeypatch):
+    """Đếm số kết nối IMAP đang mở cùng lúc theo tên server, phía client"""
+    lock = threading.Lock()
+    active, peak = Counter(), Counter()
+    connect, disconnect = EmailMonitor.connect, EmailMonitor.disconnect
+
+    def counting_connect(self):
+        with lock:
+            active[self.imap_server] += 1
+            peak[self.imap_server] = max(peak[self.imap_server], active[self.imap_server])
+        ok = connect(self)
+        if not self.connected:
+            with lock:
+                active[self.imap_server] -= 1
+        return ok
+
+    def counting_disconnect(self):
+        was_connected = self.connected
+        disconnect(self)
+        if was_connected:
+            with lock:
+                active[self.imap_server] -= 1
+
+    monkeypatch.setattr(EmailMonitor, 'connect', counting_connect)
+    monkeypatch.setattr(EmailMonitor, 'disconnect', counting_disconnect)
+    return peak
+
+
+def fill(mailbox, folder, count=2):
+    for index in range(count):
+        mailbox.append(folder, make_message(index, f"{folder} #{index}", f"Nội dung {folder} {index}",
+                                            'sender@example.com'))
+
+
+def wait_for(predicate, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(mailbox):
+        server = FakeIMAPServer(mailbox).start()
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.stop()
+
+
+def test_connection_limit_per_server_and_reuse(analyzer, servers, open_connections):
+    mailbox = FakeMailbox()
+    busy, quiet = servers(mailbox), servers(mailbox)
+    accounts = []
+    for index in range(3):
+        fill(mailbox, f"limit-box{index}")
+        accounts.append(ImapAccount(f"limit{index}@example.com", 'secret', server='127.0.0.1', port=busy.port,
+                                    use_ssl=False, folders=(f"limit-box{index}",)))
+    fill(mailbox, "limit-solo")
+    # Tên server khác ('localhost') được tính giới hạn riêng
+    accounts.append(ImapAccount("solo@example.com", 'secret', server='localhost', port=quiet.port,
+                                use_ssl=False, folders=("limit-solo",)))
+
+    service = MailboxMonitorService(accounts, analyzer, SessionLocal, max_connections=4,
+                                    max_connections_per_server=1, poll_interval=0.2, limit=0)
+    service.start()
+    try:
+        assert wait_for(lambda: all(health["inserted"] == 2 for health in service.health_report().values()))
+        assert wait_for(lambda: quiet.commands['SELECT'] >= 4)
+    finally:
+        service.stop()
+
+    # Không bao giờ có hai kết nối cùng lúc tới một server
+    assert open_connections['127.0.0.1'] == 1
+    assert open_connections['localhost'] == 1
+    # Ba hộp thư chia nhau một kết nối: mỗi lần đổi hộp thư phải đăng nhập lại
+    assert busy.commands['LOGIN'] >= 3
+    # Hộp thư một mình trên server dùng lại kết nối đã đăng nhập cho mọi lần đồng bộ
+    assert quiet.commands['LOGIN'] == 1
+    assert all(health["status"] == 'ok' for health in service.health_report().values())
+
+
+def test_failing_account_backs_off_while_others_continue(analyzer, servers):
+    mailbox = FakeMailbox()
+    fill(mailbox, "backoff-good")
+    server = servers(mailbox)
+    good = ImapAccount("backoff-good@example.com", 'secret', server='127.0.0.1', port=server.port,
+                       use_ssl=False, folders=("backoff-good",))
+    bad = ImapAccount("backoff-bad@example.com", 'secret', server='127.0.0.1', port=closed_port(),
+                      use_ssl=False, folders=("INBOX",))
+    service = MailboxMonitorService([good, bad], analyzer, SessionLocal, max_connections=2,
+                                    max_connections_per_server=2, poll_interval=0.2, limit=0)
+    attempts = Counter()
+    sync = service._sync
+
+    def counting_sync(task, monitor, reused):
+        attempts[task.account.email] += 1
+        return sync(task, monitor, reused)
+
+    service._sync = counting_sync
+    service.start()
+    try:
+        time.sleep(3.5)
+    finally:
+        service.stop()
+
+    report = service.health_report()
+    # Thử lại sau 1, 2 giây...: 3 lần trong 3,5 giây, không thử liên tục
+    assert 2 <= attempts[bad.email] <= 3
+    assert report[bad.email]["status"] == 'error'
+    assert report[bad.email]["consecutive_failures"] == attempts[bad.email]
+    assert attempts[good.email] >= 5
+    assert report[good.email]["status"] == 'ok'
+
+
+def test_account_degraded_when_emails_fail_to_store(analyzer, servers, monkeypatch):
+    real = email_ingest._write_rows
+
+    def write(db, rows, codec):
+        if any("BAD" in row["title"] for row in rows):
+            raise DataError("INSERT", {}, Exception("Data too long"))
+        return real(db, rows, codec)
+
+    monkeypatch.setattr(email_ingest, '_write_rows', write)
+    mailbox = FakeMailbox()
+    fill(mailbox, "degraded-box")
+    mailbox.append("degraded-box", make_message(5, "degraded BAD", "Nội dung", 'sender@example.com'))
+    server = servers(mailbox)
+    account = ImapAccount("degraded@example.com", 'secret', server='127.0.0.1', port=server.port,
+                          use_ssl=False, folders=("degraded-box",))
+    service = MailboxMonitorService([account], analyzer, SessionLocal, max_connections=1,
+                                    poll_interval=0.2, limit=0)
+    statuses = []
+    finish = service._finish
+
+    def recording_finish(task, monitor, result, error):
+        finish(task, monitor, result, error)
+        statuses.append((time.monotonic(), service.health[account.email].status))
+
+    service._finish = recording_finish
+    service.start()
+    try:
+        assert wait_for(lambda: len(statuses) >= 2)
+    finally:
+        service.stop()
+
+    (first_at, first), (second_at, second) = statuses[:2]
+    assert first == 'degraded'
+    # Lần sau chỉ sau thời gian chờ (1 giây), checkpoint đã qua email lỗi nên đồng bộ thành công
+    assert second_at - first_at >= 0.9
+    assert second == 'ok'
+    assert service.health[account.email].inserted == 2
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pytest
+
+from models.email import Email
+from utils.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+# Mới hơn mọi email khác trong database test nên luôn nằm ở đầu danh sách
+SAME_TIME = datetime(2099, 1, 1, 8, 30)
+
+
+def add_email(db, title, category='pagination', received_time=SAME_TIME) -> int:
+    email = Email(title=title, content=title, from_email='a@example.com', to_email='b@example.com',
+                  received_time=received_time, category=category)
+    db.add(email)
+    db.commit()
+    return email.id
+
+
+@pytest.fixture
+def emails(db):
+    """Năm email cùng received_time, ba email thuộc danh mục 'pagination', hai email 'pagination-other'"""
+    ids = [add_email(db, f"Page {index}", 'pagination' if index % 2 == 0 else 'pagination-other')
+           for index in range(5)]
+    yield ids
+    db.query(Email).filter(Email.category.in_(('pagination', 'pagination-other'))).delete()
+    db.commit()
+
+
+def walk(client, on_page=None, **params):
+    """Đi hết các trang theo next_cursor, trả về id theo thứ tự nhận được"""
+    ids, cursor, pages = [], "", 0
+    while True:
+        response = client.get('/api/emails/', params={**params, "cursor": cursor})
+        assert response.status_code == 200
+        page = response.json()
+        ids.extend(item["id"] for item in page["items"])
+        pages += 1
+        if on_page:
+            on_page(pages)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(SAME_TIME, 42)) == (SAME_TIME, 42)
+    for cursor in ("not-a-cursor", "", encode_cursor(SAME_TIME, 1)[:-3], "WzFd"):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor)
+
+
+def test_equal_received_time_pages_by_id(client, emails):
+    ids = walk(client, limit=2)
+    # Cùng received_time: thứ tự do id quyết định, không phần tử nào lặp lại hay bị bỏ
+    assert ids[:5] == sorted(emails, reverse=True)
+    assert len(ids) == len(set(ids))
+
+    ids = walk(client, limit=2, category='pagination')
+    assert ids == sorted(emails[::2], reverse=True)
+
+
+def test_new_email_between_pages_is_not_duplicated_or_skipped(client, db, emails):
+    added = []
+
+    def insert(pages):
+        if pages == 1:
+            # Email mới đến sau khi đã đọc trang đầu: cùng thời điểm (id lớn hơn) và mới hơn
+            added.append(add_email(db, "Late same time"))
+            added.append(add_email(db, "Late newer", received_time=datetime(2099, 1, 2)))
+
+    ids = walk(client, insert, limit=2, category='pagination')
+    assert ids == sorted(emails[::2], reverse=True)
+    # Trang đầu mới thấy được các email đến sau
+    assert walk(client, limit=2, category='pagination') == [added[1], added[0]] + ids
+
+
+def test_malformed_cursor_is_rejected(client):
+    for cursor in ("not-a-cursor", "WzFd", encode_cursor(SAME_TIME, 1)[:-3]):
+        response = client.get('/api/emails/', params={"cursor": cursor})
+        assert response.status_code == 400
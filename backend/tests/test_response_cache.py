@@ -0,0 +1,147 @@
+import pytest
+from starlette.requests import Request
+
+from fake_redis import FakeRedis
+from routes import emails as email_routes
+from utils.response_cache import MemoryBackend, RedisBackend, ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def request(etag=None):
+    headers = [(b'if-none-match', etag.encode('ascii'))] if etag else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': headers, 'query_string': b''})
+
+
+def test_redis_backend_get_set_and_ttl():
+    clock = Clock()
+    backend = RedisBackend(FakeRedis(clock))
+    assert backend.get('stats') is None
+    backend.set('stats', b'value', ttl=2.4)
+    assert backend.get('stats') == b'value'
+    clock.now += 1.9
+    assert backend.get('stats') == b'value'
+    clock.now += 0.2
+    assert backend.get('stats') is None
+
+
+def test_redis_backend_generation():
+    backend = RedisBackend(FakeRedis())
+    assert backend.generation() == 0
+    backend.bump_generation()
+    backend.bump_generation()
+    assert backend.generation() == 2
+
+
+@pytest.mark.parametrize('backend_factory', [MemoryBackend, lambda: RedisBackend(FakeRedis())])
+def test_cached_response_and_not_modified(backend_factory):
+    cache = ResponseCache(backend_factory(), ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"total": len(calls)}
+
+    first = cache.respond(request(), "stats", {"days": 7}, compute)
+    second = cache.respond(request(), "stats", {"days": 7}, compute)
+    assert first.body == second.body == b'{"total":1}'
+    assert first.headers['etag'] == second.headers['etag']
+
+    not_modified = cache.respond(request(first.headers['etag']), "stats", {"days": 7}, compute)
+    assert not_modified.status_code == 304
+    assert not_modified.body == b''
+    assert cache.respond(request('W/' + first.headers['etag']), "stats", {"days": 7}, compute).status_code == 304
+    assert cache.respond(request('"other"'), "stats", {"days": 7}, compute).status_code == 200
+    assert len(calls) == 1
+    assert cache.stats()['not_modified'] == 2
+
+    # Tham số khác là khóa khác
+    cache.respond(request(), "stats", {"days": 30}, compute)
+    assert len(calls) == 2
+
+
+def test_generation_bump_invalidates_other_instances():
+    # Hai worker dùng chung một Redis
+    shared = FakeRedis()
+    worker_a = ResponseCache(RedisBackend(shared), ttl=60)
+    worker_b = ResponseCache(RedisBackend(shared), ttl=60)
+    values = iter(range(10))
+
+    first = worker_a.respond(request(), "stats", {}, lambda: {"value": next(values)})
+    assert worker_b.respond(request(), "stats", {}, lambda: {"value": next(values)}).body == first.body
+
+    worker_b.invalidate()
+    after = worker_a.respond(request(first.headers['etag']), "stats", {}, lambda: {"value": next(values)})
+    assert after.status_code == 200
+    assert after.body == b'{"value":1}'
+
+
+def test_backend_errors_fall_back_to_compute():
+    class Broken:
+        def get(self, key):
+            raise ConnectionError("down")
+
+        def set(self, key, value, ex=None):
+            raise ConnectionError("down")
+
+        def incr(self, key):
+            raise ConnectionError("down")
+
+    cache = ResponseCache(RedisBackend(Broken()), ttl=60)
+    response = cache.respond(request(), "stats", {}, lambda: {"ok": True})
+    assert response.status_code == 200 and response.body == b'{"ok":true}'
+    cache.invalidate()
+
+
+@pytest.fixture
+def shared_cache(monkeypatch):
+    cache = ResponseCache(RedisBackend(FakeRedis()), ttl=60)
+    monkeypatch.setattr(email_routes, 'response_cache', cache)
+    return cache
+
+
+def test_stats_endpoint_etag_and_ingest_invalidation(client, shared_cache):
+    first = client.get('/api/emails/stats')
+    assert first.status_code == 200
+    assert client.get('/api/emails/stats', headers={'If-None-Match': first.headers['etag']}).status_code == 304
+
+    generation = shared_cache.backend.generation()
+    response = client.post('/api/emails/bulk', content=(
+        b'{"title": "Cache test", "content": "hello", "from_email": "a@example.com", '
+        b'"to_email": "b@example.com", "received_time": "2024-02-01T10:00:00"}\n'
+    ))
+    assert response.json()['inserted'] == 1
+    assert shared_cache.backend.generation() == generation + 1
+
+    after = client.get('/api/emails/stats', headers={'If-None-Match': first.headers['etag']})
+    assert after.status_code == 200
+    assert after.json()['total'] == first.json()['total'] + 1
+
+
+def test_analyze_batch_job_invalidates_after_each_chunk(db, shared_cache):
+    from datetime import datetime
+    from models.email import Email
+
+    db.add(Email(title='Pending', content='Verify your account immediately', from_email='a@example.com',
+                 to_email='b@example.com', received_time=datetime(2024, 2, 2), category='unknown'))
+    db.commit()
+
+    class Context:
+        processed = 0
+        failed = 0
+
+        def set_total(self, total):
+            pass
+
+        def report(self, processed=0, failed=0):
+            return True
+
+    generation = shared_cache.backend.generation()
+    email_routes.run_analyze_batch_job({}, Context())
+    assert shared_cache.backend.generation() > generation
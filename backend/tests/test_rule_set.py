@@ -0,0 +1,102 @@
+import json
+import threading
+
+from database.session import SessionLocal
+from models.rule_set import RuleSetRecord
+from services.email_analyzer import EmailAnalyzer
+from services.rule_set import DEFAULT_RULES, DatabaseRuleSource, FileRuleSource, RuleSet, StaticRuleSource
+
+SPAM = ("Ưu đãi", "Mua ngay sản phẩm zorblax giá sốc", "shop@example.com")
+
+
+def spam_hits(analyzer) -> int:
+    return analyzer.rules.keyword_matcher.scan(SPAM[1].lower())['spam'].count
+
+
+def test_rule_set_defaults_and_fingerprint():
+    rules = RuleSet({'spam_words': ['zorblax']})
+    assert rules.spam_words == ('zorblax',)
+    assert rules.phishing_domains == tuple(DEFAULT_RULES['phishing_domains'])
+    # Không khai báo phiên bản: dùng mã băm nội dung, ổn định giữa các lần dựng
+    assert rules.version == rules.fingerprint == RuleSet({'spam_words': ['zorblax']}).fingerprint
+    assert rules.fingerprint != RuleSet({}).fingerprint
+    assert RuleSet({}, version='2024.1').version == '2024.1'
+
+
+def test_file_source_reloads_latest_version(tmp_path):
+    (tmp_path / "rules-0001.json").write_text(json.dumps({'version': 'v1', 'spam_words': ['free']}))
+    analyzer = EmailAnalyzer(FileRuleSource(str(tmp_path)))
+    try:
+        assert analyzer.rules_version == 'v1'
+        assert spam_hits(analyzer) == 0
+        assert analyzer.reload_rules() is False
+
+        (tmp_path / "rules-0002.json").write_text(json.dumps({'spam_words': ['zorblax']}), encoding='utf-8')
+        old_rules = analyzer.rules
+        assert analyzer.reload_rules() is True
+        # Không có khóa version: phiên bản là tên file
+        assert analyzer.rules_version == 'rules-0002'
+        assert spam_hits(analyzer) == 1
+        # RuleSet cũ không bị sửa, lời gọi đang dùng nó vẫn thấy quy tắc cũ
+        assert old_rules.spam_words == ('free',)
+        assert analyzer.reload_rules() is False
+    finally:
+        analyzer.close()
+
+
+def test_database_source_uses_latest_active_record():
+    db = SessionLocal()
+    try:
+        db.add(RuleSetRecord(version='test-db-1', rules={'spam_words': ['free']}))
+        db.commit()
+        analyzer = EmailAnalyzer(DatabaseRuleSource(SessionLocal, RuleSetRecord))
+        assert analyzer.rules_version == 'test-db-1'
+
+        inactive = RuleSetRecord(version='test-db-2', rules={'spam_words': ['zorblax']}, is_active=False)
+        db.add(inactive)
+        db.commit()
+        assert analyzer.reload_rules() is False
+
+        inactive.is_active = True
+        db.commit()
+        assert analyzer.reload_rules() is True
+        assert analyzer.rules_version == 'test-db-2'
+        assert spam_hits(analyzer) == 1
+        analyzer.close()
+    finally:
+        db.query(RuleSetRecord).filter(RuleSetRecord.version.like('test-db-%')).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+def test_analysis_during_reload_uses_one_rule_set():
+    first = {'spam_words': ['zorblax'], 'urgency_words': ['zorblax']}
+    second = {'spam_words': ['sốc'], 'urgency_words': []}
+    source = StaticRuleSource(first, 'first')
+    analyzer = EmailAnalyzer(source)
+    expected = {
+        'first': analyzer.analyze_email(*SPAM),
+        'second': EmailAnalyzer(StaticRuleSource(second, 'second')).analyze_email(*SPAM),
+    }
+    assert expected['first'] != expected['second']
+    errors, stop = [], threading.Event()
+
+    def analyze():
+        while not stop.is_set():
+            result = analyzer.analyze_email(*SPAM)
+            if result not in expected.values():
+                errors.append(result)
+
+    threads = [threading.Thread(target=analyze) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    try:
+        for index in range(20):
+            source.rules, source.version = (second, 'second') if index % 2 == 0 else (first, 'first')
+            assert analyzer.reload_rules() is True
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert errors == []
+    analyzer.close()
@@ -26,6 +26,14 @@ export default {
     return apiClient.get(url);
   },
 
+  /**
+   * Lấy chi tiết một email (gồm nội dung và chi tiết phân tích)
+   * @param {number} id - ID của email
+   */
+  getEmail(id) {
+    return apiClient.get(`/emails/${id}`);
+  },
+
   /**
    * Phân tích một email
    * @param {Object} data - Thông tin email cần phân tích
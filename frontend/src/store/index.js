@@ -86,6 +86,16 @@ export default new Vuex.Store({
       }
     },
     
+    async fetchEmail(context, id) {
+      try {
+        const response = await emailApi.getEmail(id)
+        return response.data
+      } catch (error) {
+        console.error('Error fetching email:', error)
+        return null
+      }
+    },
+    
     async analyzeBatch({ commit }, limit) {
       commit('SET_PROCESSING_BATCH', true)
       try {